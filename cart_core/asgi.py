@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cart_core.settings')
+# Read by the settings: no persistent database connections under ASGI
+os.environ.setdefault('CART_ASGI', '1')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.CART_SWEEPER_IN_PROCESS:
+    from models.sweeper_service import SweeperService
+    SweeperService.start_scheduler()
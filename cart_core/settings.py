@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,11 +49,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'models.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'models.middleware.DatabaseRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -80,13 +83,79 @@ WSGI_APPLICATION = 'cart_core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Reuse connections between requests; checked before reuse. cart_core.asgi
+# sets CART_ASGI: under ASGI every request runs in its own thread context, so
+# a kept connection is never reused and only holds a slot open.
+CONN_MAX_AGE = 0 if os.environ.get('CART_ASGI') else 60
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        # A file rather than the in-memory default, so tests can write from several threads
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    },
 }
 
+# Uncomment to send catalog and order-history reads to a read replica (see
+# models/db_router.py). Locally a second SQLite file, refreshed from the
+# primary with `manage.py sync_replica`, stands in for it.
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': BASE_DIR / 'db.replica.sqlite3',
+#     'CONN_MAX_AGE': CONN_MAX_AGE,
+#     'CONN_HEALTH_CHECKS': True,
+#     'TEST': {'MIRROR': 'default'},
+# }
+
+DATABASE_ROUTERS = ['models.db_router.ReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica'
+# URL names whose GET requests may read from the replica
+DATABASE_REPLICA_VIEWS = [
+    'part-list', 'part-search', 'part-detail', 'category-list', 'car-list', 'car-parts',
+    'order-list', 'order-detail', 'order-invoice', 'async-part-list',
+]
+# Seconds a user's reads stay on the primary after they write
+DATABASE_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Swap the catalog backend for 'django.core.cache.backends.redis.RedisCache'
+# with LOCATION 'redis://host:6379' to share it between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+CATALOG_CACHE_ALIAS = 'catalog'
+# Seconds a catalog page or part payload stays cached
+CATALOG_CACHE_TIMEOUT = 300
+# Seconds the category listing (with its stock counts) stays cached
+CATEGORY_LIST_CACHE_TIMEOUT = 60
+
+# Resolved API tokens, with their user (see models/authentication.py). Each
+# process only drops its own entries, so with more than one worker use a
+# shared backend here; otherwise a revoked token or deactivated user keeps
+# working on the other workers for up to AUTH_TOKEN_CACHE_TIMEOUT seconds.
+AUTH_TOKEN_CACHE_ALIAS = 'auth'
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -142,7 +211,7 @@ DEFAULT_FROM_EMAIL = 'popf3592@gmail.com'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',  
-        'rest_framework.authentication.TokenAuthentication',    
+        'models.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated', 
@@ -150,3 +219,30 @@ REST_FRAMEWORK = {
 }
 
 AUTH_USER_MODEL = 'models.Person'
+
+# Seconds a cart keeps its reserved stock before it is returned to inventory
+CART_RESERVATION_TTL = 30 * 60
+
+# Seconds without changes after which a cart is abandoned: its reservations are
+# released, then its lines and the cart are deleted (see models/sweeper_service.py)
+CART_ABANDON_AFTER = 24 * 60 * 60
+SWEEPER_CHUNK_SIZE = 1000
+# Run the sweeper on a thread of each web process instead of `manage.py sweep_carts`
+CART_SWEEPER_IN_PROCESS = False
+CART_SWEEPER_INTERVAL = 5 * 60
+
+# Per-request query, DB time, serializer time and latency metrics, served at
+# /cart/metrics/ and in Server-Timing headers (see models/middleware.py)
+INSTRUMENTATION_ENABLED = False
+# Share of requests measured; lower it to cut the overhead in production
+INSTRUMENTATION_SAMPLE_RATE = 1.0
+INSTRUMENTATION_SERVER_TIMING = True
+# Repeats of one SQL shape in a request that are logged as a likely N+1
+INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = 5
+
+# How Order.order_code is generated (see models/order_codes.py)
+ORDER_CODE_GENERATOR = 'models.order_codes.PrimaryKeyOrderCodeGenerator'
+# Key of the primary-key order code permutation (SECRET_KEY when unset). Order
+# codes identify orders to the payment webhook, so keep it secret, and keep it
+# fixed once orders exist: changing it can give new orders the codes of old ones.
+ORDER_CODE_SECRET = SECRET_KEY
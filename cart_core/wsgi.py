@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cart_core.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.CART_SWEEPER_IN_PROCESS:
+    from models.sweeper_service import SweeperService
+    SweeperService.start_scheduler()
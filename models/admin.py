@@ -1,9 +1,101 @@
+import json
+import re
+
 from django.contrib import admin
-from .models import PartUnified, Cart, CartItem, Order, Person
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+from .models import (
+    PartCategory, PartUnified, Cart, CartItem, Order, OrderItem, Person, StockReservation, Car, OutboxMessage, PaymentEvent,
+)
+from .search_service import PartSearchService
+
+# A single word with a digit in it is searched as a part code prefix
+CODE_SEARCH = re.compile(r'\S*\d\S*')
+
+
+def estimated_count(queryset):
+    """
+    Row count of the queryset according to the planner statistics, or None
+    when the database has none: pg_class (or EXPLAIN for filtered querysets)
+    on PostgreSQL, sqlite_stat1 (written by ANALYZE) for whole tables on SQLite.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    filtered = bool(queryset.query.where) or queryset.query.distinct
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                if not filtered:
+                    cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+                    row = cursor.fetchone()
+                    # -1 until the table is first analyzed
+                    return row[0] if row and row[0] >= 0 else None
+                sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                return int(plan[0]['Plan']['Plan Rows'])
+            if connection.vendor == 'sqlite' and not filtered:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+    except DatabaseError:
+        # sqlite_stat1 does not exist before the first ANALYZE
+        return None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Changelist paginator for large tables.
+
+    Counts of ``estimate_threshold`` rows or more are taken from
+    estimated_count() instead of a COUNT(*) over the table, so the last
+    pages may be off by the error of the statistics. Pages past
+    ``deferred_join_offset`` rows are loaded with a deferred join: the
+    OFFSET walks primary keys only and full rows are read for the page alone.
+    """
+    estimate_threshold = 10000
+    deferred_join_offset = 1000
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            estimate = estimated_count(self.object_list)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        if bottom < self.deferred_join_offset or not isinstance(self.object_list, QuerySet):
+            return super().page(number)
+        ids = list(self.object_list.values_list('pk', flat=True)[bottom:bottom + self.per_page])
+        return self._get_page(self.object_list.filter(pk__in=ids), number, self)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin for tables that grow with traffic: no second unfiltered
+    COUNT(*) per changelist and estimated counts for large results.
+    """
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+
+@admin.register(PartCategory)
+class PartCategoryAdmin(admin.ModelAdmin):
+    list_display = ('title', 'url', 'part_count', 'in_stock_count')
+    search_fields = ('title',)
+    readonly_fields = ('part_count', 'in_stock_count')
 
 
 @admin.register(PartUnified)
-class PartUnifiedAdmin(admin.ModelAdmin):
+class PartUnifiedAdmin(LargeTableAdmin):
     list_display = (
         'name', 
         'commercial_code', 
@@ -17,8 +109,10 @@ class PartUnifiedAdmin(admin.ModelAdmin):
     list_filter = (
         'part_type', 
         'turnover', 
-        'category_title'
+        # Choices come from the category table, not a DISTINCT over the parts
+        'category'
     )
+    # Searched by get_search_results() through the indexes, not icontains
     search_fields = (
         'name', 
         'commercial_code', 
@@ -26,7 +120,9 @@ class PartUnifiedAdmin(admin.ModelAdmin):
         'category_title',
         'description'
     )
-    readonly_fields = ('image_preview',)
+    search_help_text = "A code (or its beginning), or words of the name, category or description."
+    readonly_fields = ('image_preview', 'category_title')
+    autocomplete_fields = ('category',)
     fieldsets = (
         ("Part Details", {
             'fields': (
@@ -36,7 +132,7 @@ class PartUnifiedAdmin(admin.ModelAdmin):
         }),
         ("Category Details", {
             'fields': (
-                'category_title', 'category_url', 'category_description'
+                'category', 'category_title'
             )
         }),
         ("Images", {
@@ -56,47 +152,125 @@ class PartUnifiedAdmin(admin.ModelAdmin):
         return "No Images"
     image_preview.short_description = "Image Preview"
 
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if CODE_SEARCH.fullmatch(term):
+            return PartSearchService.match_code_prefix(queryset, term), False
+        return PartSearchService.match(queryset, term), False
+
+
+@admin.register(Car)
+class CarAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name')
+    search_fields = ('normalized_name',)
+    readonly_fields = ('normalized_name',)
+
+    def save_model(self, request, obj, form, change):
+        from .compatibility_service import CompatibilityService
+        obj.normalized_name = CompatibilityService.normalize(obj.name)
+        super().save_model(request, obj, form, change)
+
 
 
 
 
 
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
+class CartItemAdmin(LargeTableAdmin):
     list_display = ('id', 'cart', 'part', 'quantity', 'total_price')
-    list_filter = ('cart', 'part')
-    search_fields = ('part__name', 'cart__user__username')
+    # No list_filter on cart or part: it would list every cart and every part
+    search_fields = ('=cart__user__username', '=part__commercial_code')
     raw_id_fields = ('cart', 'part')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_parts().select_related('cart__user')
+
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 0
     readonly_fields = ('total_price',)
+    raw_id_fields = ('part',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_parts()
 
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'created_at', 'total_price_display')
+    list_select_related = ('user',)
     search_fields = ('user__username',)
+    autocomplete_fields = ('user',)
     inlines = [CartItemInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
     def total_price_display(self, obj):
         return obj.total_price()
     total_price_display.short_description = "Total Price"
+    total_price_display.admin_order_field = 'total_amount'
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(LargeTableAdmin):
+    list_display = ('id', 'cart', 'part', 'quantity', 'expires_at')
+    list_filter = ('expires_at',)
+    list_select_related = ('cart__user', 'part')
+    raw_id_fields = ('cart', 'part')
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    can_delete = False
+    fields = ('part', 'part_name', 'unit_price', 'quantity')
+    readonly_fields = fields
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('part')
+
+    def has_add_permission(self, request, obj=None):
+        # Order lines are a snapshot taken at checkout
+        return False
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'total_price', 'created_at')
-    list_filter = ('created_at',)
-    search_fields = ('user__username',)
-    filter_horizontal = ('items',)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'order_code', 'user', 'total_price', 'order_status', 'post_type', 'created_at')
+    list_filter = ('order_status', 'post_type', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('=order_code', 'user__username')
+    ordering = ('-created_at',)
+    raw_id_fields = ('user',)
+    inlines = [OrderItemInline]
+
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(LargeTableAdmin):
+    list_display = ('idempotency_key', 'order', 'status', 'outcome', 'received_at')
+    list_filter = ('outcome',)
+    list_select_related = ('order__user',)
+    search_fields = ('=idempotency_key', '=order__order_code')
+    raw_id_fields = ('order',)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(LargeTableAdmin):
+    list_display = ('id', 'channel', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'channel')
+    search_fields = ('recipient',)
+    raw_id_fields = ('order',)
+    readonly_fields = ('created_at', 'sent_at')
 
 
 
 @admin.register(Person)
-class PersonAdmin(admin.ModelAdmin):
+class PersonAdmin(LargeTableAdmin):
     list_display = ('full_name', 'phone_number', 'email', 'postal_code', 'created_at')
     search_fields = ('full_name', 'phone_number', 'email', 'postal_code')
     list_filter = ('created_at',)
@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import post_delete, post_save, pre_delete
 
 
 class ModelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'models'
+
+    def ready(self):
+        from .category_service import sync_category
+        from .compatibility_service import sync_part_compatibility
+        from .cache_service import invalidate_part_cache
+        from .authentication import check_token_cache, invalidate_token_cache, invalidate_user_tokens
+        from rest_framework.authtoken.models import Token
+        part_model = self.get_model('PartUnified')
+        post_save.connect(sync_category, sender=self.get_model('PartCategory'))
+        pre_delete.connect(sync_category, sender=self.get_model('PartCategory'))
+        post_save.connect(sync_part_compatibility, sender=part_model)
+        post_save.connect(invalidate_part_cache, sender=part_model)
+        post_delete.connect(invalidate_part_cache, sender=part_model)
+        post_save.connect(invalidate_token_cache, sender=Token)
+        post_delete.connect(invalidate_token_cache, sender=Token)
+        post_save.connect(invalidate_user_tokens, sender=self.get_model('Person'))
+        checks.register(check_token_cache, checks.Tags.security, deploy=True)
@@ -0,0 +1,182 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import APIException, NotAuthenticated, PermissionDenied
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+
+from .models import PartUnified, CartItem, Order
+from .authentication import CachedTokenAuthentication
+from .serializers import serialize_parts
+from .cart_service import CartService
+from .inventory_service import InsufficientStockError
+from .payment_service import PaymentService
+from .cache_service import CatalogCacheService
+from .metrics_service import serialization
+from .views import (
+    KeysetPagination, cart_payload, get_part_fields, make_etag, etag_matches, validate_payment_status,
+    webhook_payload,
+)
+
+
+@serialization
+def json_response(data, status=200, headers=None):
+    return JsonResponse(data, status=status, headers=headers, json_dumps_params={'ensure_ascii': False})
+
+
+def conditional_json_response(request, etag, data):
+    if etag_matches(request, etag):
+        return HttpResponse(status=304, headers={'ETag': etag})
+    return json_response(data, headers={'ETag': etag})
+
+
+async def authenticate(request):
+    """
+    Resolve the user the same way as the DRF defaults: session first, then
+    ``Authorization: Token ...``. Returns None for anonymous requests.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        # Like SessionAuthentication, only session requests need a CSRF token
+        SessionAuthentication().enforce_csrf(request)
+        return user
+
+    header = request.headers.get('Authorization', '').split()
+    if len(header) == 2 and header[0] == 'Token':
+        token = await CachedTokenAuthentication.aget_token(header[1])
+        if token and token.user.is_active:
+            return token.user
+    return None
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of APIView for the ASGI request path.
+
+    Wraps the request in a DRF Request for ``query_params`` and ``data``,
+    authenticates it without leaving the event loop and renders DRF
+    exceptions as JSON. Handlers build their responses with json_response.
+    """
+    permission_required = True
+    parsers = [JSONParser(), FormParser(), MultiPartParser()]
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Authentication enforces CSRF for session users itself
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, parsers=self.parsers)
+        try:
+            request.user = await authenticate(request)
+            if self.permission_required and request.user is None:
+                # 403 like APIView, since session auth sends no WWW-Authenticate
+                raise PermissionDenied(NotAuthenticated.default_detail)
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                return await self.http_method_not_allowed(request, *args, **kwargs)
+            return await handler(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            return json_response(detail, status=exc.status_code)
+        except Http404:
+            return json_response({'detail': 'Not found.'}, status=404)
+
+
+class AsyncPartUnifiedListView(AsyncAPIView):
+    """
+    Async catalog list. Always uses KeysetPagination, so no COUNT(*) or
+    OFFSET is issued; accepts the same cursor and field parameters.
+    """
+    permission_required = False
+
+    async def get(self, request):
+        fields = get_part_fields(request)
+        key = await CatalogCacheService.apage_key(request)
+        data = await CatalogCacheService.aget_page(request, lambda: self.build_page(request, fields))
+        etag = make_etag(key, [(row['id'], row.get('inventory')) for row in data['results']])
+        return conditional_json_response(request, etag, data)
+
+    async def build_page(self, request, fields):
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(PartUnified.objects.with_fields(fields), request)
+        return paginator.get_paginated_response(serialize_parts(page, fields)).data
+
+
+class AsyncCartView(AsyncAPIView):
+    """
+    Async cart read (GET) and add (POST).
+    """
+
+    async def post(self, request):
+        part_id = request.data.get('part_id')
+        try:
+            quantity = int(request.data.get('quantity', 1))
+        except (TypeError, ValueError):
+            return json_response({'error': 'Quantity must be at least 1.'}, status=400)
+        if quantity < 1:
+            return json_response({'error': 'Quantity must be at least 1.'}, status=400)
+
+        part = await PartUnified.objects.only('id').filter(id=part_id).afirst()
+        if part is None:
+            raise Http404
+
+        try:
+            await CartService.aadd_to_cart(request.user, part, quantity=quantity)
+        except InsufficientStockError:
+            return json_response({'error': 'Not enough stock available.'}, status=400)
+
+        return json_response({'message': f'{quantity} عدد از محصول به سبد خرید اضافه شد.'}, status=201)
+
+    async def get(self, request):
+        part_fields = get_part_fields(request)
+        cart = await CartService.aget_or_create_cart(request.user)
+
+        stock = None
+        if 'inventory' in part_fields:
+            stock = [row async for row in cart.items.order_by('id').values_list('part_id', 'part__inventory')]
+        etag = make_etag('cart', cart.pk, cart.revision, await CatalogCacheService.aversion(), part_fields, stock)
+        if etag_matches(request, etag):
+            return HttpResponse(status=304, headers={'ETag': etag})
+
+        summary = await CartService.aget_cart_summary(request.user, part_fields, cart=cart)
+        return json_response(cart_payload(summary, part_fields), headers={'ETag': etag})
+
+
+class AsyncDeleteCartItemView(AsyncAPIView):
+
+    async def delete(self, request, item_id):
+        item = await CartItem.objects.filter(id=item_id, cart__user=request.user).afirst()
+        if item is None:
+            raise Http404
+        await CartService.adelete_item(item)
+        return json_response({'message': 'آیتم با موفقیت حذف شد.'}, status=204)
+
+
+class AsyncClearCartView(AsyncAPIView):
+
+    async def delete(self, request):
+        await CartService.aclear_cart(request.user)
+        return json_response({'message': 'سبد خرید با موفقیت پاک شد.'}, status=204)
+
+
+class AsyncPaymentWebhookView(AsyncAPIView):
+    """
+    Async payment webhook. PaymentService runs in a thread because it uses
+    a transaction; the invoice is rendered later by the outbox worker.
+    """
+
+    async def post(self, request):
+        key = request.headers.get('Idempotency-Key') or request.data.get('event_id')
+        payment_status = request.data.get('status')
+        validate_payment_status(payment_status)
+        try:
+            order, outcome = await sync_to_async(PaymentService.handle_callback)(
+                request.data.get('order_code'), payment_status, key
+            )
+        except Order.DoesNotExist:
+            raise Http404
+        return json_response(webhook_payload(request, order, outcome))
@@ -0,0 +1,148 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps resolved tokens, with their user, in the
+    AUTH_TOKEN_CACHE_ALIAS cache for AUTH_TOKEN_CACHE_TIMEOUT seconds, so a
+    warm request authenticates without a query.
+
+    Only the user fields in USER_FIELDS are cached; the password hash and
+    the personal details are not, and are loaded on first access.
+
+    Entries are dropped when the token is deleted or its user is saved.
+    Changes made with QuerySet.update() bypass the signals and are only
+    seen once the entry expires.
+
+    The entries are only dropped from the cache of the process that made
+    the change. With a per-process backend such as LocMemCache, a deleted
+    token or a deactivated user still authenticates on the other workers
+    until their entry expires, so multi-process deployments should point
+    AUTH_TOKEN_CACHE_ALIAS at a shared cache (``check_token_cache`` warns
+    under ``check --deploy``).
+    """
+    USER_FIELDS = ('id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser')
+
+    @staticmethod
+    def cache():
+        return caches[getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def timeout():
+        return getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 60)
+
+    @staticmethod
+    def cache_key(key):
+        # Raw tokens are not written to the cache
+        return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def dump(token):
+        user = token.user
+        return {
+            'db': token._state.db,
+            'user': {name: getattr(user, name) for name in CachedTokenAuthentication.USER_FIELDS},
+        }
+
+    @staticmethod
+    def load(key, entry):
+        model = get_user_model()
+        # from_db takes the loaded fields in model order
+        names = [f.attname for f in model._meta.concrete_fields if f.attname in entry['user']]
+        user = model.from_db(entry['db'], names, [entry['user'][name] for name in names])
+        token = Token.from_db(entry['db'], ['key', 'user_id'], [key, user.pk])
+        token.user = user
+        return token
+
+    @staticmethod
+    def query(key):
+        return Token.objects.select_related('user').only(
+            'key', 'user_id', *[f'user__{name}' for name in CachedTokenAuthentication.USER_FIELDS]
+        ).filter(key=key)
+
+    @staticmethod
+    def get_token(key):
+        """
+        The token with its user loaded, or None if it does not exist.
+        """
+        cache = CachedTokenAuthentication.cache()
+        cache_key = CachedTokenAuthentication.cache_key(key)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return CachedTokenAuthentication.load(key, entry)
+        token = CachedTokenAuthentication.query(key).first()
+        if token is not None:
+            cache.set(cache_key, CachedTokenAuthentication.dump(token), CachedTokenAuthentication.timeout())
+        return token
+
+    @staticmethod
+    async def aget_token(key):
+        cache = CachedTokenAuthentication.cache()
+        cache_key = CachedTokenAuthentication.cache_key(key)
+        entry = await cache.aget(cache_key)
+        if entry is not None:
+            return CachedTokenAuthentication.load(key, entry)
+        token = await CachedTokenAuthentication.query(key).afirst()
+        if token is not None:
+            await cache.aset(cache_key, CachedTokenAuthentication.dump(token), CachedTokenAuthentication.timeout())
+        return token
+
+    @staticmethod
+    def invalidate(*keys):
+        CachedTokenAuthentication.cache().delete_many(
+            [CachedTokenAuthentication.cache_key(key) for key in keys]
+        )
+
+    def authenticate_credentials(self, key):
+        token = self.get_token(key)
+        if token is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
+
+
+def invalidate_token_cache(sender, instance, **kwargs):
+    """
+    post_save / post_delete handler for Token.
+    """
+    key = instance.key
+    transaction.on_commit(lambda: CachedTokenAuthentication.invalidate(key))
+
+
+def invalidate_user_tokens(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    post_save handler for the user model: cached tokens carry a copy of its flags.
+    """
+    # A new user has no token yet; logging in only touches last_login
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    keys = list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+    if keys:
+        transaction.on_commit(lambda: CachedTokenAuthentication.invalidate(*keys))
+
+
+def check_token_cache(app_configs, **kwargs):
+    """
+    Deploy check: revoking a token must reach every worker.
+    """
+    alias = getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', 'default')
+    if not isinstance(caches[alias], LocMemCache) or not CachedTokenAuthentication.timeout():
+        return []
+    return [checks.Warning(
+        f"The '{alias}' token cache is local to each process: a deleted token or an inactive "
+        f"user keeps authenticating on other workers for up to AUTH_TOKEN_CACHE_TIMEOUT seconds.",
+        hint="Point AUTH_TOKEN_CACHE_ALIAS at a shared cache (e.g. Redis), or set AUTH_TOKEN_CACHE_TIMEOUT = 0.",
+        id='models.W001',
+    )]
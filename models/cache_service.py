@@ -0,0 +1,210 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .db_router import primary_reads
+from .models import PartUnified
+
+
+class CatalogCacheService:
+    """
+    Read-through cache for catalog pages and part payloads.
+
+    Page keys embed a catalog version that is bumped whenever a part is
+    saved or deleted, so every cached page is dropped at once without
+    tracking which pages held the part. Part keys are deleted one by one.
+    Stock changes far more often than the rest of a part, so cached
+    payloads are always served with ``inventory`` read fresh from the
+    database instead of being invalidated on every add-to-cart.
+
+    Misses are built from the primary: a page rebuilt from a lagging
+    replica right after an invalidation would be cached under the new
+    version and keep serving the old data until it expires.
+    """
+    version_key = 'catalog:version'
+    hits_key = 'catalog:hits'
+    misses_key = 'catalog:misses'
+
+    @staticmethod
+    def cache():
+        return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def timeout():
+        return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+    @staticmethod
+    def version():
+        cache = CatalogCacheService.cache()
+        version = cache.get(CatalogCacheService.version_key)
+        if version is None:
+            # Start from the clock so pages cached under an evicted version never match again
+            cache.add(CatalogCacheService.version_key, int(time.time() * 1000), None)
+            version = cache.get(CatalogCacheService.version_key)
+        return version
+
+    @staticmethod
+    def page_key(request):
+        url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return f'catalog:page:{CatalogCacheService.version()}:{url}'
+
+    @staticmethod
+    def part_key(part_id):
+        return f'catalog:part:{part_id}'
+
+    @staticmethod
+    def get_page(request, build):
+        """
+        Return the cached response data for this catalog URL, calling
+        ``build()`` on a miss. ``build`` returns a dict with a ``results`` list.
+        """
+        key = CatalogCacheService.page_key(request)
+        data = CatalogCacheService._get_or_build(key, build)
+        CatalogCacheService.overlay_inventory(data['results'])
+        return data
+
+    @staticmethod
+    def get_part(part_id, build):
+        """
+        Return the cached payload of one part, calling ``build()`` on a miss.
+        ``build`` returns None when the part does not exist.
+        """
+        data = CatalogCacheService._get_or_build(CatalogCacheService.part_key(part_id), build)
+        if data is not None:
+            CatalogCacheService.overlay_inventory([data])
+        return data
+
+    @staticmethod
+    def _get_or_build(key, build):
+        cache = CatalogCacheService.cache()
+        data = cache.get(key)
+        if data is not None:
+            CatalogCacheService._count(CatalogCacheService.hits_key)
+            return data
+        CatalogCacheService._count(CatalogCacheService.misses_key)
+        with primary_reads():
+            data = build()
+        if data is not None:
+            cache.set(key, data, CatalogCacheService.timeout())
+        return data
+
+    @staticmethod
+    def overlay_inventory(rows):
+        """
+        Replace the cached ``inventory`` of the rows with the current value.
+        """
+        rows = [row for row in rows if 'inventory' in row]
+        if not rows:
+            return
+        stock = dict(
+            PartUnified.objects.filter(pk__in=[row['id'] for row in rows]).values_list('id', 'inventory')
+        )
+        for row in rows:
+            row['inventory'] = stock.get(row['id'], row['inventory'])
+
+    # Async counterparts of the read path, for the ASGI catalog view
+
+    @staticmethod
+    async def aversion():
+        cache = CatalogCacheService.cache()
+        version = await cache.aget(CatalogCacheService.version_key)
+        if version is None:
+            await cache.aadd(CatalogCacheService.version_key, int(time.time() * 1000), None)
+            version = await cache.aget(CatalogCacheService.version_key)
+        return version
+
+    @staticmethod
+    async def apage_key(request):
+        url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return f'catalog:page:{await CatalogCacheService.aversion()}:{url}'
+
+    @staticmethod
+    async def aget_page(request, build):
+        """
+        Async get_page; ``build`` is a coroutine function.
+        """
+        key = await CatalogCacheService.apage_key(request)
+        cache = CatalogCacheService.cache()
+        data = await cache.aget(key)
+        if data is not None:
+            await CatalogCacheService._acount(CatalogCacheService.hits_key)
+        else:
+            await CatalogCacheService._acount(CatalogCacheService.misses_key)
+            with primary_reads():
+                data = await build()
+            await cache.aset(key, data, CatalogCacheService.timeout())
+        await CatalogCacheService.aoverlay_inventory(data['results'])
+        return data
+
+    @staticmethod
+    async def aoverlay_inventory(rows):
+        rows = [row for row in rows if 'inventory' in row]
+        if not rows:
+            return
+        stock = {
+            part_id: inventory async for part_id, inventory in
+            PartUnified.objects.filter(pk__in=[row['id'] for row in rows]).values_list('id', 'inventory')
+        }
+        for row in rows:
+            row['inventory'] = stock.get(row['id'], row['inventory'])
+
+    @staticmethod
+    async def _acount(key):
+        cache = CatalogCacheService.cache()
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            if not await cache.aadd(key, 1, None):
+                await cache.aincr(key)
+
+    @staticmethod
+    def invalidate_part(part_id):
+        CatalogCacheService.cache().delete(CatalogCacheService.part_key(part_id))
+        CatalogCacheService.invalidate_pages()
+
+    @staticmethod
+    def invalidate_parts(part_ids):
+        CatalogCacheService.cache().delete_many([CatalogCacheService.part_key(part_id) for part_id in part_ids])
+        CatalogCacheService.invalidate_pages()
+
+    @staticmethod
+    def invalidate_pages():
+        cache = CatalogCacheService.cache()
+        try:
+            cache.incr(CatalogCacheService.version_key)
+        except ValueError:
+            cache.add(CatalogCacheService.version_key, int(time.time() * 1000), None)
+
+    @staticmethod
+    def _count(key):
+        cache = CatalogCacheService.cache()
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, 1, None):
+                cache.incr(key)
+
+    @staticmethod
+    def stats():
+        cache = CatalogCacheService.cache()
+        hits = cache.get(CatalogCacheService.hits_key, 0)
+        misses = cache.get(CatalogCacheService.misses_key, 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+            'version': CatalogCacheService.version(),
+        }
+
+
+def invalidate_part_cache(sender, instance, **kwargs):
+    """
+    post_save / post_delete handler for PartUnified. Runs after commit so a
+    page rebuilt from the old data mid-transaction is dropped as well.
+    """
+    part_id = instance.pk
+    transaction.on_commit(lambda: CatalogCacheService.invalidate_part(part_id))
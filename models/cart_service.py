@@ -1,54 +1,220 @@
-from django.core.mail import send_mail
-from django.conf import settings
-from .models import Cart, CartItem, Order
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Cart, CartItem, Order, OrderItem
+from .inventory_service import InventoryService, InsufficientStockError
+from .notification_service import NotificationService
 
 
 class CartService:
     @staticmethod
     def get_or_create_cart(user):
+        # unique_cart_per_user turns a racing create into a lookup of the winner
         cart, _ = Cart.objects.get_or_create(user=user)
         return cart
 
+    @staticmethod
+    def touch(cart):
+        """
+        Record a change to the cart by bumping its revision.
+        """
+        Cart.objects.filter(pk=getattr(cart, 'pk', cart)).update(
+            revision=F('revision') + 1, updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def get_cart_summary(user, part_fields=None, cart=None):
+        """
+        Load the user's cart with its items and parts, plus DB-side totals.
+        Uses a fixed number of queries regardless of the number of items.
+        """
+        cart = cart or CartService.get_or_create_cart(user)
+        items = list(cart.items.with_parts(part_fields).order_by('id'))
+        totals = cart.items.totals()
+        return {
+            'cart': cart,
+            'items': items,
+            'total_price': totals['total_price'],
+            'item_count': totals['item_count'],
+        }
+
     @staticmethod
     def add_to_cart(user, part, quantity=1):
+        """
+        Reserve stock for the part and add it to the user's cart.
+        Raises InsufficientStockError when the part is out of stock.
+        """
+        cart = CartService.get_or_create_cart(user)
+        with transaction.atomic():
+            # Bumping the revision first locks the cart row, so concurrent
+            # adds to the same cart cannot both insert the line
+            CartService.touch(cart)
+            if not InventoryService.reserve(cart, part.pk, quantity):
+                raise InsufficientStockError("Not enough stock available.")
+
+            # One UPDATE for an existing line; unique_cart_item_per_part guards the insert
+            if not CartItem.objects.filter(cart=cart, part=part).update(quantity=F('quantity') + quantity):
+                CartItem.objects.create(cart=cart, part=part, quantity=quantity)
+
+    @staticmethod
+    def apply_changes(user, changes, part_fields=None):
+        """
+        Apply a batch of cart operations in a single transaction and return
+        the resulting cart summary.
+
+        ``changes`` is a list of dicts with ``op`` ('add', 'set' or 'remove'),
+        ``part_id`` and ``quantity``; operations on the same part apply in
+        order. Stock for every line is reserved at once, so the cost does not
+        grow with the number of lines. Raises InsufficientStockError, without
+        changing anything, if any part is short.
+        """
         cart = CartService.get_or_create_cart(user)
-        item, created = CartItem.objects.get_or_create(cart=cart, part=part)
-        if not created:
-            item.quantity += quantity
-        else:
-            item.quantity = quantity
-        item.save()
-        return item
+        part_ids = {change['part_id'] for change in changes}
+
+        with transaction.atomic():
+            # Locks the cart row for the rest of the batch, as in add_to_cart
+            CartService.touch(cart)
+            lines = {
+                item.part_id: item
+                for item in cart.items.filter(part_id__in=part_ids).only('id', 'cart', 'part', 'quantity')
+            }
+            current = {part_id: lines[part_id].quantity if part_id in lines else 0 for part_id in part_ids}
+            target = dict(current)
+            for change in changes:
+                if change['op'] == 'add':
+                    target[change['part_id']] += change.get('quantity', 1)
+                elif change['op'] == 'set':
+                    target[change['part_id']] = change['quantity']
+                else:
+                    target[change['part_id']] = 0
+
+            InventoryService.adjust(cart, {
+                part_id: target[part_id] - current[part_id] for part_id in part_ids
+            })
+
+            created = [
+                CartItem(cart=cart, part_id=part_id, quantity=quantity)
+                for part_id, quantity in target.items() if quantity > 0 and part_id not in lines
+            ]
+            updated = []
+            for part_id, item in lines.items():
+                if 0 < target[part_id] != item.quantity:
+                    item.quantity = target[part_id]
+                    updated.append(item)
+            removed = [item.pk for part_id, item in lines.items() if target[part_id] == 0]
+
+            if created:
+                CartItem.objects.bulk_create(created)
+            if updated:
+                CartItem.objects.bulk_update(updated, ['quantity'])
+            if removed:
+                CartItem.objects.filter(pk__in=removed).delete()
+
+        return CartService.get_cart_summary(user, part_fields, cart=cart)
 
     @staticmethod
     def remove_from_cart(user, part):
         cart = CartService.get_or_create_cart(user)
-        CartItem.objects.filter(cart=cart, part=part).delete()
+        with transaction.atomic():
+            InventoryService.release(cart, part_ids=[part.pk])
+            CartItem.objects.filter(cart=cart, part=part).delete()
+            CartService.touch(cart)
+
+    @staticmethod
+    def delete_item(item):
+        """
+        Delete a single cart line and return its reserved stock.
+        """
+        with transaction.atomic():
+            InventoryService.release(item.cart_id, part_ids=[item.part_id])
+            item.delete()
+            CartService.touch(item.cart_id)
 
     @staticmethod
     def clear_cart(user):
         cart = CartService.get_or_create_cart(user)
-        cart.items.all().delete()
+        with transaction.atomic():
+            InventoryService.release(cart)
+            cart.items.all().delete()
+            CartService.touch(cart)
 
     @staticmethod
-    def finalize_order(user):
+    def finalize_order(user, post_type='post', delivery_date=None):
+        """
+        Turn the user's cart into an Order in a single transaction.
+
+        Cart lines are copied into OrderItem rows with one bulk insert, the
+        total is summed in SQL over those OrderItem rows and the reserved
+        stock is handed over to the order. Raises ValueError if the cart is empty and
+        InsufficientStockError if an expired reservation cannot be renewed.
+        """
         cart = CartService.get_or_create_cart(user)
-        if not cart.items.exists():
-            raise ValueError("Cart is empty.")
+        with transaction.atomic():
+            # Lock the cart row before reading its lines, so a second checkout
+            # of the same cart waits and then finds it empty
+            CartService.touch(cart)
+            lines = list(cart.items.values_list('part_id', 'part__name', 'part__price', 'quantity'))
+            if not lines:
+                raise ValueError("Cart is empty.")
 
-        total = cart.total_price()
-        order = Order.objects.create(user=user, total_price=total)
-        order.items.set(cart.items.all())
-        order.save()
+            order = Order.objects.create(
+                user=user, total_price=0, post_type=post_type, delivery_date=delivery_date
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, part_id=part_id, part_name=name, unit_price=price, quantity=quantity)
+                for part_id, name, price, quantity in lines
+            ])
+            order.total_price = order.items.aggregate(total=Sum(F('unit_price') * F('quantity')))['total']
+            Order.objects.filter(pk=order.pk).update(total_price=order.total_price)
 
-        CartService.send_order_email(user, order)
-        CartService.clear_cart(user)
+            InventoryService.commit(cart, {part_id: quantity for part_id, _, _, quantity in lines})
+            cart.items.all().delete()
+            CartService.send_order_email(user, order)
 
         return order
 
     @staticmethod
     def send_order_email(user, order):
+        """
+        Queue the confirmation email; the outbox worker delivers it after commit.
+        """
         subject = f"Order Confirmation #{order.id}"
         message = f"Dear {user.username},\n\nYour order has been placed successfully.\nTotal price: {order.total_price}.\n\nThank you for shopping!"
-        recipient = [user.email]
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipient)
+        NotificationService.enqueue_email(user.email, subject, message)
+
+    # Async counterparts for the ASGI views. Reads use the async ORM; writes
+    # run in a thread because transactions are not supported in async code.
+
+    @staticmethod
+    async def aget_or_create_cart(user):
+        cart, _ = await Cart.objects.aget_or_create(user=user)
+        return cart
+
+    @staticmethod
+    async def aget_cart_summary(user, part_fields=None, cart=None):
+        cart = cart or await CartService.aget_or_create_cart(user)
+        items = [item async for item in cart.items.with_parts(part_fields).order_by('id')]
+        totals = await cart.items.atotals()
+        return {
+            'cart': cart,
+            'items': items,
+            'total_price': totals['total_price'],
+            'item_count': totals['item_count'],
+        }
+
+    @staticmethod
+    async def aadd_to_cart(user, part, quantity=1):
+        return await sync_to_async(CartService.add_to_cart)(user, part, quantity)
+
+    @staticmethod
+    async def aremove_from_cart(user, part):
+        await sync_to_async(CartService.remove_from_cart)(user, part)
+
+    @staticmethod
+    async def adelete_item(item):
+        await sync_to_async(CartService.delete_item)(item)
+
+    @staticmethod
+    async def aclear_cart(user):
+        await sync_to_async(CartService.clear_cart)(user)
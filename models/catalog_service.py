@@ -0,0 +1,209 @@
+import csv
+import json
+
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import PartUnified, StockReservation
+from .compatibility_service import CompatibilityService
+from .cache_service import CatalogCacheService
+from .category_service import CategoryService
+
+
+# Columns of an import/export file, in order
+CATALOG_FIELDS = [
+    'commercial_code', 'internal_code', 'name', 'price', 'cars', 'description',
+    'category_title', 'category_url', 'category_description', 'image_urls',
+    'part_type', 'turnover', 'inventory',
+]
+REQUIRED_FIELDS = ('commercial_code', 'internal_code', 'name', 'price')
+# Flat category fields of a file, stored on PartCategory
+CATEGORY_COLUMNS = {'category_url': F('category__url'), 'category_description': F('category__description')}
+UPDATE_FIELDS = [
+    name for name in CATALOG_FIELDS if name not in ('commercial_code', 'internal_code', *CATEGORY_COLUMNS)
+] + ['category']
+
+
+class CatalogRowError(ValueError):
+    """Raised for a row of a catalog file that cannot be imported."""
+
+
+class CatalogService:
+    """
+    Streaming import and export of PartUnified.
+
+    Files are read and written one row at a time and parts are upserted in
+    batches keyed by (commercial_code, internal_code), so memory use does
+    not depend on the size of the file or of the table.
+
+    The ``inventory`` of a file is the stock on hand. ``PartUnified.inventory``
+    is what is left after cart reservations, so the import subtracts the
+    quantity reserved for the part and the export adds it back. Rows without
+    an inventory value leave the stock of existing parts alone.
+    """
+
+    @staticmethod
+    def detect_format(path, format=None):
+        if format:
+            return format
+        return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+    @staticmethod
+    def read_rows(stream, format):
+        """
+        Yield one dict per record of a CSV or JSONL text stream.
+        """
+        if format == 'csv':
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Reported by parse_row so the row still counts for resuming
+                    yield None
+
+    @staticmethod
+    def parse_row(row):
+        """
+        Convert a raw file record into PartUnified field values.
+        """
+        if not isinstance(row, dict):
+            raise CatalogRowError("not a JSON object")
+        missing = [name for name in REQUIRED_FIELDS if row.get(name) in (None, '')]
+        if missing:
+            raise CatalogRowError(f"missing {', '.join(missing)}")
+
+        values = {name: row.get(name) for name in CATALOG_FIELDS}
+        try:
+            values['price'] = int(values['price'])
+            if values['inventory'] not in (None, ''):
+                values['inventory'] = int(values['inventory'])
+            else:
+                values['inventory'] = None
+        except (TypeError, ValueError):
+            raise CatalogRowError("price and inventory must be integers")
+
+        image_urls = values['image_urls']
+        if isinstance(image_urls, str):
+            image_urls = image_urls.strip()
+            if image_urls.startswith('['):
+                try:
+                    image_urls = json.loads(image_urls)
+                except ValueError:
+                    raise CatalogRowError("image_urls is not a JSON list")
+            else:
+                image_urls = [url for url in image_urls.split('|') if url] or None
+        values['image_urls'] = image_urls or None
+
+        values['cars'] = values['cars'] or ''
+        values['category_title'] = values['category_title'] or ''
+        values['category_url'] = values['category_url'] or ''
+        values['part_type'] = values['part_type'] or 'spare'
+        values['turnover'] = values['turnover'] or None
+        return values
+
+    @staticmethod
+    def upsert_batch(rows):
+        """
+        Insert or update a batch of parsed rows in one transaction.
+        Returns ``(created, updated)``.
+        """
+        # The last occurrence of a code pair in the batch wins
+        by_key = {(row['commercial_code'], row['internal_code']): row for row in rows}
+
+        with transaction.atomic():
+            CategoryService.resolve(by_key.values())
+            # Locked so no reservation changes the stock between here and the upsert
+            existing = {
+                (commercial_code, internal_code): part_id
+                for part_id, commercial_code, internal_code in PartUnified.objects.select_for_update().filter(
+                    commercial_code__in={key[0] for key in by_key}
+                ).values_list('id', 'commercial_code', 'internal_code')
+                if (commercial_code, internal_code) in by_key
+            }
+            CatalogService.subtract_reserved(by_key, existing)
+
+            parts = []
+            stocked = [values for values in by_key.values() if values['inventory'] is not None]
+            unstocked = [
+                {name: value for name, value in values.items() if name != 'inventory'}
+                for values in by_key.values() if values['inventory'] is None
+            ]
+            for batch, update_fields in (
+                (stocked, UPDATE_FIELDS),
+                (unstocked, [name for name in UPDATE_FIELDS if name != 'inventory']),
+            ):
+                if batch:
+                    parts += PartUnified.objects.bulk_create(
+                        [PartUnified(**values) for values in batch],
+                        update_conflicts=True,
+                        unique_fields=['commercial_code', 'internal_code'],
+                        update_fields=update_fields,
+                    )
+            # bulk writes skip post_save, so refresh the car index and cache here
+            CompatibilityService.sync_parts(parts)
+            CatalogCacheService.invalidate_pages()
+            for part in parts:
+                CatalogCacheService.cache().delete(CatalogCacheService.part_key(part.pk))
+
+        return len(by_key) - len(existing), len(existing)
+
+    @staticmethod
+    def subtract_reserved(by_key, existing):
+        """
+        Turn the stock on hand of the rows into available stock by taking
+        off what carts hold of the existing parts.
+        """
+        part_ids = [
+            existing[key] for key, values in by_key.items()
+            if key in existing and values['inventory'] is not None
+        ]
+        if not part_ids:
+            return
+        held = dict(
+            StockReservation.objects.filter(part_id__in=part_ids)
+            .values('part_id').annotate(total=Sum('quantity')).values_list('part_id', 'total')
+        )
+        for key, values in by_key.items():
+            if key in existing and values['inventory'] is not None:
+                values['inventory'] = max(values['inventory'] - held.get(existing[key], 0), 0)
+
+    @staticmethod
+    def export_rows(queryset=None, chunk_size=2000):
+        """
+        Yield every part as a dict of CATALOG_FIELDS, streaming from the database.
+        """
+        queryset = PartUnified.objects.all() if queryset is None else queryset
+        columns = [name for name in CATALOG_FIELDS if name not in CATEGORY_COLUMNS and name != 'inventory']
+        held = (
+            StockReservation.objects.filter(part=OuterRef('pk'))
+            .order_by().values('part').annotate(total=Sum('quantity')).values('total')
+        )
+        # Stock on hand, as the import expects it
+        on_hand = F('inventory') + Coalesce(Subquery(held, output_field=IntegerField()), 0)
+        rows = queryset.order_by('id').values(*columns, **CATEGORY_COLUMNS, on_hand=on_hand)
+        for values in rows.iterator(chunk_size=chunk_size):
+            values['inventory'] = values['on_hand']
+            yield {name: values[name] for name in CATALOG_FIELDS}
+
+    @staticmethod
+    def write_rows(stream, rows, format):
+        """
+        Write exported rows to a text stream. Returns the number of rows written.
+        """
+        count = 0
+        if format == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=CATALOG_FIELDS)
+            writer.writeheader()
+        for row in rows:
+            if format == 'csv':
+                row['image_urls'] = json.dumps(row['image_urls'], ensure_ascii=False) if row['image_urls'] else ''
+                writer.writerow(row)
+            else:
+                stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+        return count
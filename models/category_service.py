@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+
+from .models import PartCategory, PartUnified
+from .cache_service import CatalogCacheService
+
+CATEGORY_LIST_FIELDS = ('id', 'title', 'url', 'description', 'part_count', 'in_stock_count')
+
+
+class CategoryService:
+    """
+    Part categories and their counters.
+
+    ``part_count`` and ``in_stock_count`` are maintained by triggers on the
+    part table (migration 0010), so inventory changed with
+    ``QuerySet.update()`` (stock reservations) or bulk writes (catalog
+    import) is counted as well. The
+    update trigger only fires when a part changes category or its stock
+    crosses zero, so ordinary reservations never touch the category row.
+    Databases other than SQLite and PostgreSQL need ``recount()``.
+    """
+
+    @staticmethod
+    def recount(category_ids=None, using=DEFAULT_DB_ALIAS):
+        """
+        Recompute the counters from the parts, for every category or only
+        the given ones. Returns the number of categories updated.
+        """
+        def count(condition=Q()):
+            parts = (
+                PartUnified.objects.filter(condition, category=OuterRef('pk'))
+                .order_by().values('category').annotate(total=Count('id')).values('total')
+            )
+            return Coalesce(Subquery(parts, output_field=IntegerField()), 0)
+
+        categories = PartCategory.objects.using(using)
+        if category_ids is not None:
+            categories = categories.filter(pk__in=category_ids)
+        return categories.update(part_count=count(), in_stock_count=count(Q(inventory__gt=0)))
+
+    @staticmethod
+    def resolve(rows):
+        """
+        Create or update the categories named by parsed catalog rows and
+        replace their flat category fields with ``category_id``. The last row
+        of a title wins. Rows without a title get no category.
+        """
+        by_title = {}
+        for row in rows:
+            title = (row['category_title'] or '').strip()
+            row['category_title'] = title
+            url, description = row.pop('category_url', ''), row.pop('category_description', None)
+            if title:
+                by_title[title] = PartCategory(title=title, url=url or '', description=description or None)
+        if by_title:
+            PartCategory.objects.bulk_create(
+                list(by_title.values()), update_conflicts=True,
+                unique_fields=['title'], update_fields=['url', 'description'],
+            )
+        ids = dict(PartCategory.objects.filter(title__in=by_title).values_list('title', 'id'))
+        for row in rows:
+            row['category_id'] = ids.get(row['category_title'])
+        return rows
+
+    @staticmethod
+    def cache_key():
+        return f'catalog:categories:{CatalogCacheService.version()}'
+
+    @staticmethod
+    def listing():
+        """
+        Every category with its counters, cached for CATEGORY_LIST_CACHE_TIMEOUT
+        seconds (and dropped with the catalog pages when a category changes).
+        """
+        cache = CatalogCacheService.cache()
+        key = CategoryService.cache_key()
+        data = cache.get(key)
+        if data is None:
+            data = list(PartCategory.objects.order_by('title').values(*CATEGORY_LIST_FIELDS))
+            cache.set(key, data, getattr(settings, 'CATEGORY_LIST_CACHE_TIMEOUT', 60))
+        return data
+
+
+def sync_category(sender, instance, created=False, signal=None, **kwargs):
+    """
+    post_save / pre_delete handler for PartCategory: keep the title copied
+    onto its parts (cleared when the category is deleted) and drop cached
+    catalog pages and the cached payloads of its parts. Deletes are handled
+    before the parts are unlinked.
+    """
+    if created:
+        # A new category has no parts yet
+        transaction.on_commit(CatalogCacheService.invalidate_pages)
+        return
+    part_ids = list(instance.parts.values_list('id', flat=True))
+    if signal is post_save:
+        instance.parts.exclude(category_title=instance.title).update(category_title=instance.title)
+    else:
+        # The parts are unlinked next, and must not keep matching the old title
+        instance.parts.update(category_title='')
+    transaction.on_commit(lambda: CatalogCacheService.invalidate_parts(part_ids))
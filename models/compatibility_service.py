@@ -0,0 +1,108 @@
+import re
+
+from django.db import transaction
+
+from .models import Car, PartCompatibility, PartUnified
+
+
+# Separators used between car models in PartUnified.cars
+CARS_SEPARATOR = re.compile(r'[,،;|\n]+')
+
+
+class CompatibilityService:
+    """
+    Maintains the Car / PartCompatibility index built from PartUnified.cars,
+    so "which parts fit this car" is an index lookup instead of a LIKE scan.
+    """
+
+    @staticmethod
+    def normalize(name):
+        return ' '.join(name.split()).casefold()
+
+    @staticmethod
+    def parse_cars(text):
+        """
+        Split a ``cars`` text into ``{normalized_name: display_name}``.
+        """
+        cars = {}
+        for name in CARS_SEPARATOR.split(text or ''):
+            display = ' '.join(name.split())
+            if display:
+                cars.setdefault(CompatibilityService.normalize(display), display)
+        return cars
+
+    @staticmethod
+    def sync_parts(parts):
+        """
+        Rebuild the compatibility rows of the given parts from their ``cars`` text.
+        Costs a fixed number of queries per call regardless of the number of parts.
+        """
+        parts = list(parts)
+        if not parts:
+            return 0
+
+        wanted = {part.pk: CompatibilityService.parse_cars(part.cars) for part in parts}
+        names = {}
+        for cars in wanted.values():
+            for normalized, display in cars.items():
+                names.setdefault(normalized, display)
+
+        with transaction.atomic():
+            Car.objects.bulk_create(
+                [Car(name=display, normalized_name=normalized) for normalized, display in names.items()],
+                ignore_conflicts=True,
+            )
+            car_ids = dict(
+                Car.objects.filter(normalized_name__in=names).values_list('normalized_name', 'id')
+            )
+            PartCompatibility.objects.filter(part_id__in=wanted).delete()
+            rows = [
+                PartCompatibility(part_id=part_id, car_id=car_ids[normalized])
+                for part_id, cars in wanted.items()
+                for normalized in cars
+            ]
+            PartCompatibility.objects.bulk_create(rows, ignore_conflicts=True)
+        return len(rows)
+
+    @staticmethod
+    def rebuild(batch_size=2000):
+        """
+        Backfill the index for the whole catalog, streaming parts in batches.
+        """
+        total = 0
+        batch = []
+        for part in PartUnified.objects.only('id', 'cars').order_by('id').iterator(chunk_size=batch_size):
+            batch.append(part)
+            if len(batch) >= batch_size:
+                total += CompatibilityService.sync_parts(batch)
+                batch = []
+        total += CompatibilityService.sync_parts(batch)
+        return total
+
+    @staticmethod
+    def matching_cars(text):
+        """
+        Cars whose name contains ``text``; a scan over the small Car table only.
+        """
+        return Car.objects.filter(normalized_name__contains=CompatibilityService.normalize(text))
+
+    @staticmethod
+    def filter_parts(queryset, car):
+        """
+        Restrict a PartUnified queryset to parts compatible with ``car``,
+        either a Car id or a (partial) car name.
+        """
+        if isinstance(car, int):
+            compatible = PartCompatibility.objects.filter(car_id=car)
+        else:
+            compatible = PartCompatibility.objects.filter(car__in=CompatibilityService.matching_cars(car))
+        return queryset.filter(pk__in=compatible.values('part_id'))
+
+
+def sync_part_compatibility(sender, instance, update_fields=None, **kwargs):
+    """
+    post_save handler keeping the index current when a part is edited.
+    """
+    if update_fields is not None and 'cars' not in update_fields:
+        return
+    CompatibilityService.sync_parts([instance])
@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+_state = ContextVar('db_routing', default=None)
+
+
+def replica_alias():
+    """
+    Alias of the read replica, or None when none is configured.
+    """
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def pin_cache():
+    return caches[getattr(settings, 'DATABASE_PIN_CACHE_ALIAS', 'default')]
+
+
+def pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def pin_to_primary(user):
+    """
+    Send the user's reads to the primary for DATABASE_PIN_SECONDS, long
+    enough for the replica to catch up with what they just wrote.
+    """
+    pin_cache().set(pin_key(user.pk), True, getattr(settings, 'DATABASE_PIN_SECONDS', 5))
+
+
+class RoutingState:
+    """
+    What the router knows about the request being handled.
+    """
+    def __init__(self, request):
+        self.request = request
+        self.allow_replica = False
+        self.wrote = False
+        self._pinned = None
+
+    def user(self):
+        # DRF stores the user it authenticated on the Django request as well
+        user = getattr(self.request, 'user', None)
+        return user if user is not None and user.is_authenticated else None
+
+    def pinned(self):
+        user = self.user()
+        if user is None:
+            return False
+        if self._pinned is None or self._pinned[0] != user.pk:
+            self._pinned = (user.pk, bool(pin_cache().get(pin_key(user.pk))))
+        return self._pinned[1]
+
+
+def current_state():
+    return _state.get()
+
+
+def activate(request):
+    state = RoutingState(request)
+    return state, _state.set(state)
+
+
+def deactivate(token):
+    _state.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Read from the primary inside the block, even in a replica view. For
+    results that outlive the request, such as cached catalog pages, which
+    must not be built from a replica that has not caught up yet.
+    """
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    allowed, state.allow_replica = state.allow_replica, False
+    try:
+        yield
+    finally:
+        state.allow_replica = allowed
+
+
+class ReplicaRouter:
+    """
+    Send reads of the views listed in DATABASE_REPLICA_VIEWS (catalog and
+    order history) to the replica and everything else to the primary.
+
+    Reads stay on the primary once the request has written, and for a user
+    who wrote within the last DATABASE_PIN_SECONDS (read-your-writes). Users,
+    tokens and sessions are always read from the primary. Outside a request
+    (commands, workers) every query goes to the primary.
+    """
+    primary_apps = {'admin', 'auth', 'authtoken', 'contenttypes', 'sessions'}
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        state = _state.get()
+        if alias is None or state is None or not state.allow_replica or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in self.primary_apps or model._meta.label == settings.AUTH_USER_MODEL:
+            return DEFAULT_DB_ALIAS
+        if state.pinned():
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,235 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import PartUnified, StockReservation
+
+
+class InsufficientStockError(ValueError):
+    """Raised when a part does not have enough inventory for a reservation."""
+
+    def __init__(self, message="Not enough stock available.", part_ids=()):
+        super().__init__(message)
+        self.part_ids = list(part_ids)
+
+
+class _ReleaseConflict(Exception):
+    pass
+
+
+class _ShortStock(Exception):
+    pass
+
+
+class InventoryService:
+    """
+    Stock reservations for carts.
+
+    Inventory is decremented with a single conditional UPDATE
+    (``inventory >= quantity``) so concurrent adds can never oversell,
+    and the held quantity is recorded per cart so it can be returned.
+    """
+
+    @staticmethod
+    def reservation_ttl():
+        return timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 30 * 60))
+
+    @staticmethod
+    def take_stock(part_id, quantity):
+        """
+        Decrement the part's inventory if at least ``quantity`` is in stock.
+        """
+        return bool(PartUnified.objects.filter(
+            pk=part_id, inventory__gte=quantity
+        ).update(inventory=F('inventory') - quantity))
+
+    @staticmethod
+    def reserve(cart, part_id, quantity):
+        """
+        Take ``quantity`` units of the part for the cart.
+        Returns False when the part does not have enough stock.
+        """
+        expires_at = timezone.now() + InventoryService.reservation_ttl()
+
+        with transaction.atomic():
+            if not InventoryService.take_stock(part_id, quantity):
+                return False
+
+            reservations = StockReservation.objects.filter(cart=cart, part_id=part_id)
+            if reservations.update(quantity=F('quantity') + quantity, expires_at=expires_at):
+                return True
+
+            try:
+                with transaction.atomic():
+                    StockReservation.objects.create(
+                        cart=cart, part_id=part_id, quantity=quantity, expires_at=expires_at
+                    )
+            except IntegrityError:
+                # Another request created the row first; add to it instead.
+                reservations.update(quantity=F('quantity') + quantity, expires_at=expires_at)
+
+        return True
+
+    @staticmethod
+    def adjust(cart, deltas):
+        """
+        Change many reservations of the cart at once. ``deltas`` maps part id
+        to the change in quantity held by the cart.
+
+        All increases are taken from stock with one conditional UPDATE; if any
+        part is short (or does not exist) nothing is changed and
+        InsufficientStockError lists the short parts. Decreases return at
+        most the quantity still reserved.
+        """
+        deltas = {part_id: delta for part_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        expires_at = timezone.now() + InventoryService.reservation_ttl()
+        reservations = StockReservation.objects.filter(cart=cart)
+
+        with transaction.atomic():
+            reserved = dict(
+                reservations.select_for_update().filter(part_id__in=deltas).values_list('part_id', 'quantity')
+            )
+            take = {part_id: delta for part_id, delta in deltas.items() if delta > 0}
+            give = {
+                part_id: min(-delta, reserved.get(part_id, 0))
+                for part_id, delta in deltas.items() if delta < 0 and reserved.get(part_id)
+            }
+
+            if take:
+                amount = InventoryService._per_part(take)
+                try:
+                    # Roll back the parts that were decremented before reading
+                    # the stock, or they would be reported short as well
+                    with transaction.atomic():
+                        taken = PartUnified.objects.filter(pk__in=take, inventory__gte=amount).update(
+                            inventory=F('inventory') - amount
+                        )
+                        if taken != len(take):
+                            raise _ShortStock()
+                except _ShortStock:
+                    stock = dict(PartUnified.objects.filter(pk__in=take).values_list('id', 'inventory'))
+                    raise InsufficientStockError(
+                        part_ids=sorted(part_id for part_id, quantity in take.items() if stock.get(part_id, 0) < quantity)
+                    )
+            if give:
+                PartUnified.objects.filter(pk__in=give).update(
+                    inventory=F('inventory') + InventoryService._per_part(give)
+                )
+
+            held = {
+                part_id: reserved.get(part_id, 0) + take.get(part_id, 0) - give.get(part_id, 0)
+                for part_id in deltas
+            }
+            kept = [
+                StockReservation(cart_id=getattr(cart, 'pk', cart), part_id=part_id, quantity=quantity, expires_at=expires_at)
+                for part_id, quantity in held.items() if quantity > 0
+            ]
+            if kept:
+                StockReservation.objects.bulk_create(
+                    kept, update_conflicts=True, unique_fields=['cart', 'part'],
+                    update_fields=['quantity', 'expires_at'],
+                )
+            dropped = [part_id for part_id, quantity in held.items() if quantity <= 0 and part_id in reserved]
+            if dropped:
+                reservations.filter(part_id__in=dropped).delete()
+
+    @staticmethod
+    def _per_part(quantities):
+        """
+        CASE expression giving each part's quantity, for multi-row updates.
+        """
+        return Case(
+            *[When(pk=part_id, then=Value(quantity)) for part_id, quantity in quantities.items()],
+            output_field=IntegerField(),
+        )
+
+    @staticmethod
+    def release(cart, part_ids=None):
+        """
+        Return reserved stock of the cart to inventory.
+        If ``part_ids`` is given only those parts are released.
+        """
+        reservations = StockReservation.objects.filter(cart=cart).order_by('pk')
+        if part_ids is not None:
+            reservations = reservations.filter(part_id__in=part_ids)
+        restored = 0
+        while True:
+            released, units = InventoryService.release_chunk(reservations, 1000, skip_locked=False)
+            restored += units
+            if released < 1000:
+                return restored
+
+    @staticmethod
+    def release_chunk(reservations, chunk_size, skip_locked=True):
+        """
+        Release up to ``chunk_size`` of the given reservations in one short
+        transaction, with one DELETE and one UPDATE of the parts.
+        Returns ``(reservations, units)``.
+
+        With ``skip_locked`` rows held by a checkout or another sweeper are
+        left for the next run instead of being waited for.
+        """
+        with transaction.atomic():
+            if skip_locked and connection.features.has_select_for_update_skip_locked:
+                reservations = reservations.select_for_update(skip_locked=True)
+            else:
+                reservations = reservations.select_for_update()
+            rows = list(reservations.values_list('pk', 'part_id', 'quantity')[:chunk_size])
+            if not rows:
+                return 0, 0
+            pks = [pk for pk, _, _ in rows]
+            try:
+                with transaction.atomic():
+                    deleted, _ = StockReservation.objects.filter(pk__in=pks).delete()
+                    if deleted != len(rows):
+                        raise _ReleaseConflict()
+                    units = {}
+                    for _, part_id, quantity in rows:
+                        units[part_id] = units.get(part_id, 0) + quantity
+                    PartUnified.objects.filter(pk__in=units).update(
+                        inventory=F('inventory') + InventoryService._per_part(units)
+                    )
+                    return len(rows), sum(units.values())
+            except _ReleaseConflict:
+                # Some rows were released concurrently (backends without row locks);
+                # fall back to the row-by-row path, which restores each one exactly once
+                return len(rows), InventoryService._restore(StockReservation.objects.filter(pk__in=pks))
+
+    @staticmethod
+    def commit(cart, lines=None):
+        """
+        Drop the reservations of a checked-out cart without restoring stock;
+        the reserved units now belong to the order.
+
+        ``lines`` maps part id to the quantity being bought. Any quantity not
+        covered by a live reservation (e.g. it expired) is taken from stock
+        now, raising InsufficientStockError if it is no longer available.
+        """
+        reservations = StockReservation.objects.filter(cart=cart)
+        with transaction.atomic():
+            if lines:
+                # Locked so a concurrent release cannot return this stock meanwhile
+                reserved = dict(reservations.select_for_update().values_list('part_id', 'quantity'))
+                for part_id, quantity in lines.items():
+                    missing = quantity - reserved.get(part_id, 0)
+                    if missing > 0 and not InventoryService.take_stock(part_id, missing):
+                        raise InsufficientStockError("Not enough stock available.")
+            reservations.delete()
+
+    @staticmethod
+    def _restore(reservations):
+        restored = 0
+        with transaction.atomic():
+            for pk, part_id, quantity in reservations.values_list('pk', 'part_id', 'quantity'):
+                # Only the request that actually deletes the row gives the stock
+                # back, so concurrent releases cannot restore it twice.
+                deleted, _ = StockReservation.objects.filter(pk=pk).delete()
+                if deleted:
+                    PartUnified.objects.filter(pk=part_id).update(inventory=F('inventory') + quantity)
+                    restored += quantity
+        return restored
@@ -0,0 +1,138 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Prefetch
+from django.utils.html import escape
+
+from .models import Order, OrderItem
+
+
+class InvoiceService:
+    """
+    Invoices of orders, rendered as plain text or printable HTML.
+
+    An order is loaded with its user and lines in one prefetched query set,
+    lines are written one chunk at a time so large invoices can be streamed,
+    and the invoice of a paid order (which no longer changes) is cached.
+    """
+    formats = ('text', 'html')
+    content_types = {
+        'text': 'text/plain; charset=utf-8',
+        'html': 'text/html; charset=utf-8',
+    }
+    # Lines read per query when the lines were not prefetched
+    chunk_size = 500
+
+    @staticmethod
+    def cache():
+        return caches[getattr(settings, 'INVOICE_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def cache_key(order, format):
+        return f'invoice:{order.pk}:{format}'
+
+    @staticmethod
+    def load(queryset=None, **lookup):
+        """
+        Fetch an order with its user and lines for rendering.
+        """
+        queryset = Order.objects.all() if queryset is None else queryset
+        lines = OrderItem.objects.only('id', 'order', 'part_name', 'unit_price', 'quantity').order_by('id')
+        return queryset.select_related('user').prefetch_related(Prefetch('items', queryset=lines)).get(**lookup)
+
+    @staticmethod
+    def is_final(order):
+        return order.order_status == 'paied'
+
+    @staticmethod
+    def render(order, format='text'):
+        """
+        The whole invoice as a string, from the cache for paid orders.
+        """
+        return ''.join(InvoiceService.stream(order, format))
+
+    @staticmethod
+    def stream(order, format='text'):
+        """
+        Yield the invoice in chunks. A paid order's invoice is served from
+        the cache, or cached once it has been generated completely.
+        """
+        if format not in InvoiceService.formats:
+            raise ValueError(f"Unknown invoice format: {format}")
+        if not InvoiceService.is_final(order):
+            yield from InvoiceService.generate(order, format)
+            return
+
+        cache = InvoiceService.cache()
+        key = InvoiceService.cache_key(order, format)
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        for chunk in InvoiceService.generate(order, format):
+            chunks.append(chunk)
+            yield chunk
+        cache.set(key, ''.join(chunks), getattr(settings, 'INVOICE_CACHE_TIMEOUT', 24 * 60 * 60))
+
+    @staticmethod
+    def lines(order):
+        if 'items' in getattr(order, '_prefetched_objects_cache', {}):
+            return order.items.all()
+        return order.items.order_by('id').iterator(chunk_size=InvoiceService.chunk_size)
+
+    @staticmethod
+    def header(order):
+        return [
+            ("کد سفارش", order.order_code),
+            ("نام کاربر", order.user.username),
+            ("تاریخ ایجاد سفارش", order.created_at.strftime('%Y-%m-%d %H:%M:%S')),
+            ("نوع ارسال", order.get_post_type_display()),
+            ("تاریخ تحویل", order.delivery_date if order.delivery_date else 'تعریف نشده'),
+            ("مجموع قیمت", f"{order.total_price:,} تومان"),
+        ]
+
+    @staticmethod
+    def generate(order, format):
+        if format == 'html':
+            yield from InvoiceService.generate_html(order)
+        else:
+            yield from InvoiceService.generate_text(order)
+
+    @staticmethod
+    def generate_text(order):
+        lines = ["فاکتور سفارش"]
+        lines += [f"{label}: {value}" for label, value in InvoiceService.header(order)]
+        lines += ["", "آیتم‌ها:"]
+        yield "\n".join(lines) + "\n"
+
+        for item in InvoiceService.lines(order):
+            yield (
+                f"- {item.part_name} | تعداد: {item.quantity} | قیمت واحد: {item.unit_price:,} "
+                f"| قیمت کل: {item.total_price():,}\n"
+            )
+
+        yield "\nبا تشکر از خرید شما."
+
+    @staticmethod
+    def generate_html(order):
+        title = escape(f"فاکتور سفارش {order.order_code}")
+        yield (
+            '<!DOCTYPE html>\n<html lang="fa" dir="rtl"><head><meta charset="utf-8">'
+            f'<title>{title}</title>'
+            '<style>body{font-family:sans-serif}table{border-collapse:collapse;width:100%}'
+            'td,th{border:1px solid #999;padding:4px}@media print{a{display:none}}</style>'
+            f'</head><body><h1>{title}</h1><dl>'
+        )
+        yield ''.join(
+            f'<dt>{escape(label)}</dt><dd>{escape(value)}</dd>' for label, value in InvoiceService.header(order)
+        )
+        yield '</dl><table><tr><th>کالا</th><th>تعداد</th><th>قیمت واحد</th><th>قیمت کل</th></tr>'
+
+        for item in InvoiceService.lines(order):
+            yield (
+                f'<tr><td>{escape(item.part_name)}</td><td>{item.quantity}</td>'
+                f'<td>{item.unit_price:,}</td><td>{item.total_price():,}</td></tr>'
+            )
+
+        yield '</table><p>با تشکر از خرید شما.</p></body></html>'
@@ -0,0 +1,223 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.db.models import Q
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from models.admin import EstimatedCountPaginator, estimated_count
+from models.models import Cart, CartItem, Order, PartCategory, PartUnified, Person
+from models.search_service import PartSearchService
+
+
+BENCH_CODE_PREFIX = 'BENCH-ADMIN-'
+BENCH_USER_PREFIX = 'bench-admin-'
+# Lower case never appears in generated order codes
+BENCH_ORDER_PREFIX = 'ba'
+
+WORDS = ['Brake', 'Filter', 'Clutch', 'Belt', 'Pump', 'Sensor', 'Bearing', 'Gasket', 'Mirror', 'Wiper']
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large catalog with carts and orders and time the admin changelists: "
+        "first and deep pages, code and text search, filters."
+    )
+
+    def add_arguments(self, parser):
+        # Raise to --parts 1000000 --carts 100000 --orders 200000 for the full-size run
+        parser.add_argument('--parts', type=int, default=100_000)
+        parser.add_argument('--carts', type=int, default=10_000, help="One user per cart")
+        parser.add_argument('--cart-lines', type=int, default=3)
+        parser.add_argument('--orders', type=int, default=20_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded rows for the next run of the same size.")
+
+    def handle(self, *args, **options):
+        try:
+            self.run(options)
+        finally:
+            if not options['keep']:
+                self.teardown()
+
+    def run(self, options):
+        started = time.perf_counter()
+        self.seed(options)
+        self.stdout.write(f"seeded in {time.perf_counter() - started:.1f}s")
+        # The count estimates come from the planner statistics
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        staff, _ = Person.objects.get_or_create(
+            username=f'{BENCH_USER_PREFIX}staff',
+            defaults={'email': f'{BENCH_USER_PREFIX}staff@example.com', 'is_staff': True, 'is_superuser': True},
+        )
+        client = Client()
+        client.force_login(staff)
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for label, url in self.pages(options):
+                self.report(label, *self.measure(client, url, options['repeat']))
+        for label, run in self.reference_queries(options):
+            self.report(label, *self.time_query(run, options['repeat']))
+
+    def pages(self, options):
+        per_page = 100
+        parts = reverse('admin:models_partunified_changelist')
+        carts = reverse('admin:models_cart_changelist')
+        orders = reverse('admin:models_order_changelist')
+        category = PartCategory.objects.filter(title__startswith='Bench admin').values_list('id', flat=True).first()
+        cart = Cart.objects.filter(user__username__startswith=BENCH_USER_PREFIX).values_list('id', flat=True).first()
+        code = f'{BENCH_CODE_PREFIX}{options["parts"] // 2}'
+        return [
+            ('parts: first page', parts),
+            ('parts: deep page', f'{parts}?p={options["parts"] // per_page - 10}'),
+            ('parts: code prefix', f'{parts}?q={code[:-1]}'),
+            ('parts: common words', f'{parts}?q=Brake+Pump'),
+            ('parts: name and number', f'{parts}?q=Pump+{options["parts"] // 3}'),
+            ('parts: category filter', f'{parts}?category__id__exact={category}'),
+            ('parts: category filter, deep', f'{parts}?category__id__exact={category}&p=15'),
+            ('carts: first page', carts),
+            ('carts: deep page', f'{carts}?p={options["carts"] // per_page - 10}'),
+            ('carts: by total', f'{carts}?o=4'),
+            ('cart: change form', reverse('admin:models_cart_change', args=[cart])),
+            ('cart items: first page', reverse('admin:models_cartitem_changelist')),
+            ('orders: first page', orders),
+            ('orders: deep page', f'{orders}?p={options["orders"] // per_page - 10}'),
+            ('orders: status filter', f'{orders}?order_status__exact=paied'),
+            ('people: first page', reverse('admin:models_person_changelist')),
+        ]
+
+    def reference_queries(self, options):
+        """
+        The queries the changelists used to run, next to what replaces them.
+        """
+        parts = PartUnified.objects.order_by('-pk')
+        offset = options['parts'] - 2000
+        paginator = EstimatedCountPaginator(parts, 100)
+        code = f'{BENCH_CODE_PREFIX}{options["parts"] // 2}'[:-1]
+        words = ['Pump', str(options['parts'] // 3)]
+        # What the default admin search ran for each word
+        icontains = Q()
+        for word in words:
+            icontains &= Q(*[
+                Q(**{f'{column}__icontains': word})
+                for column in ('name', 'commercial_code', 'internal_code', 'category_title', 'description')
+            ], _connector=Q.OR)
+        return [
+            ('ref: COUNT(*) parts', lambda: parts.count()),
+            ('ref: estimated count', lambda: estimated_count(parts)),
+            ('ref: OFFSET deep page', lambda: list(parts[offset:offset + 100])),
+            ('ref: deferred join page', lambda: list(paginator.page(offset // 100 + 1).object_list)),
+            ('ref: icontains code', lambda: list(parts.filter(commercial_code__icontains=code)[:100])),
+            ('ref: indexed prefix', lambda: list(PartSearchService.match_code_prefix(parts, code)[:100])),
+            ('ref: icontains words', lambda: list(parts.filter(icontains)[:100])),
+            ('ref: full-text words', lambda: list(PartSearchService.match(parts, ' '.join(words))[:100])),
+        ]
+
+    def measure(self, client, url, repeat):
+        timings, queries, status = [], 0, None
+        for _ in range(repeat):
+            # The query log is capped, and seeding filled it
+            reset_queries()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append(time.perf_counter() - started)
+            queries, status = len(captured), response.status_code
+        return timings, queries, status
+
+    def time_query(self, run, repeat):
+        timings, queries = [], 0
+        for _ in range(repeat):
+            # The query log is capped, and seeding filled it
+            reset_queries()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+            queries = len(captured)
+        return timings, queries, None
+
+    def report(self, label, timings, queries, status):
+        self.stdout.write(
+            f"{label:<32} ms_p50={statistics.median(timings) * 1000:9.2f} "
+            f"ms_max={max(timings) * 1000:9.2f} queries={queries:>3}" + (f" status={status}" if status else '')
+        )
+
+    def seed(self, options):
+        """
+        Create the dataset, reusing it when a previous run left one of the same size.
+        """
+        if (
+            PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).count() == options['parts']
+            and Cart.objects.filter(user__username__startswith=BENCH_USER_PREFIX).count() == options['carts']
+            and Order.objects.filter(order_code__startswith=BENCH_ORDER_PREFIX).count() == options['orders']
+        ):
+            return
+        self.teardown()
+        rng = random.Random(25)
+        batch_size = options['batch_size']
+        categories = PartCategory.objects.bulk_create(
+            PartCategory(title=f'Bench admin category {index}', url='https://example.com/benchmark')
+            for index in range(50)
+        )
+        for start in range(0, options['parts'], batch_size):
+            PartUnified.objects.bulk_create(
+                PartUnified(
+                    name=f'{" ".join(rng.sample(WORDS, 2))} {index}',
+                    internal_code=f'{BENCH_CODE_PREFIX}I{index}',
+                    commercial_code=f'{BENCH_CODE_PREFIX}{index}',
+                    price=rng.randint(10_000, 5_000_000), cars='-',
+                    description=' '.join(rng.choices(WORDS, k=8)),
+                    category=(category := rng.choice(categories)),
+                    category_title=category.title,
+                    part_type=rng.choice(['spare', 'consumable']),
+                    turnover=rng.choice('ABCD'),
+                    inventory=rng.randint(0, 20),
+                )
+                for index in range(start, min(start + batch_size, options['parts']))
+            )
+        part_ids = list(
+            PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).values_list('id', flat=True)
+        )
+
+        now = timezone.now()
+        users = []
+        for start in range(0, options['carts'], batch_size):
+            people = Person.objects.bulk_create(
+                Person(
+                    username=f'{BENCH_USER_PREFIX}{index}', email=f'{BENCH_USER_PREFIX}{index}@example.com',
+                    full_name=f'Bench user {index}', phone_number='09120000000', password='!',
+                )
+                for index in range(start, min(start + batch_size, options['carts']))
+            )
+            users += [person.pk for person in people]
+            carts = Cart.objects.bulk_create(Cart(user=person) for person in people)
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, part_id=part_id, quantity=rng.randint(1, 5))
+                for cart in carts for part_id in rng.sample(part_ids, options['cart_lines'])
+            )
+
+        for start in range(0, options['orders'], batch_size):
+            Order.objects.bulk_create(
+                Order(
+                    user_id=rng.choice(users), total_price=rng.randint(10_000, 50_000_000),
+                    order_code=f'{BENCH_ORDER_PREFIX}{index:08d}',
+                    order_status=rng.choice(['waiting', 'paied', 'failed']),
+                    created_at=now - timedelta(minutes=rng.randrange(500_000)),
+                )
+                for index in range(start, min(start + batch_size, options['orders']))
+            )
+
+    def teardown(self):
+        Person.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+        PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).delete()
+        PartCategory.objects.filter(title__startswith='Bench admin').delete()
@@ -0,0 +1,134 @@
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from models.models import Cart, CartItem, PartUnified
+
+
+BENCH_CODE_PREFIX = 'BENCH-ASGI-'
+
+# name: (sync view URL, async view URL)
+SCENARIOS = {
+    'catalog': ('/cart/parts/?pagination=cursor&profile=compact', '/cart/async/parts/?profile=compact'),
+    'cart': ('/cart/list-cart/', '/cart/async/cart/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the catalog and cart endpoints with concurrent in-process clients and "
+        "compare requests/sec and latency of WSGI, ASGI with the sync views and ASGI "
+        "with the async views."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--parts', type=int, default=2000)
+        parser.add_argument('--cart-lines', type=int, default=10)
+        parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+
+    def handle(self, *args, **options):
+        token = self.setup(options['parts'], options['cart_lines'])
+        headers = {'Authorization': f'Token {token}'}
+
+        # The in-process clients send Host: testserver
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                self.run_scenarios(headers, options)
+        finally:
+            self.teardown()
+
+    def run_scenarios(self, headers, options):
+        for name in options['scenarios']:
+            sync_url, async_url = SCENARIOS[name]
+            runs = [
+                ('wsgi', self.run_wsgi(sync_url, headers, options)),
+                ('asgi-sync', asyncio.run(self.run_asgi(sync_url, headers, options))),
+                ('asgi-async', asyncio.run(self.run_asgi(async_url, headers, options))),
+            ]
+            for mode, (elapsed, latencies) in runs:
+                latencies.sort()
+                self.stdout.write(
+                    f"{name:<8} {mode:<10} req/s={len(latencies) / elapsed:8.1f} "
+                    f"p50_ms={statistics.median(latencies) * 1000:7.2f} "
+                    f"p99_ms={latencies[int(len(latencies) * 0.99) - 1] * 1000:7.2f}"
+                )
+
+    def run_wsgi(self, url, headers, options):
+        def worker(count):
+            client = Client()
+            latencies = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = client.get(url, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, f"{url} returned {response.status_code}"
+            connection.close()
+            return latencies
+
+        shares = self.split(options['requests'], options['concurrency'])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(shares)) as pool:
+            results = list(pool.map(worker, shares))
+        return time.perf_counter() - started, [latency for result in results for latency in result]
+
+    async def run_asgi(self, url, headers, options):
+        async def worker(count):
+            client = AsyncClient()
+            latencies = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, f"{url} returned {response.status_code}"
+            return latencies
+
+        shares = self.split(options['requests'], options['concurrency'])
+        started = time.perf_counter()
+        results = await asyncio.gather(*(worker(count) for count in shares))
+        return time.perf_counter() - started, [latency for result in results for latency in result]
+
+    @staticmethod
+    def split(total, workers):
+        workers = max(1, min(workers, total))
+        return [total // workers + (index < total % workers) for index in range(workers)]
+
+    def setup(self, part_count, cart_lines):
+        self.teardown()
+        rng = random.Random(13)
+        parts = PartUnified.objects.bulk_create(
+            PartUnified(
+                name=f'ASGI benchmark part {index}',
+                internal_code=f'{BENCH_CODE_PREFIX}I{index}',
+                commercial_code=f'{BENCH_CODE_PREFIX}{index}',
+                price=rng.randint(10_000, 5_000_000), cars='-', category_title='benchmark',
+                inventory=1000,
+            )
+            for index in range(part_count)
+        )
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(
+            username='bench-asgi', defaults={'email': 'bench-asgi@example.com'}
+        )
+        cart, _ = Cart.objects.get_or_create(user=user)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, part=part, quantity=1) for part in rng.sample(parts, min(cart_lines, len(parts)))
+        )
+        token, _ = Token.objects.get_or_create(user=user)
+        return token.key
+
+    def teardown(self):
+        # The cart and token go with the user
+        get_user_model().objects.filter(username='bench-asgi').delete()
+        PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).delete()
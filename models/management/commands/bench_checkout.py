@@ -0,0 +1,85 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from models.cart_service import CartService
+from models.models import CartItem, OutboxMessage, PartUnified, StockReservation
+
+
+BENCH_CODE_PREFIX = 'BENCH-CHK-'
+
+
+class Command(BaseCommand):
+    help = "Time checkout for carts of growing size and check the resulting orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 200])
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(
+            username='bench-checkout', defaults={'email': 'bench-checkout@example.com'}
+        )
+        parts = self.setup(max(options['sizes']))
+        try:
+            self.run(user, parts, options)
+        finally:
+            self.teardown(user)
+
+    def run(self, user, parts, options):
+        expires_at = timezone.now() + timedelta(hours=1)
+
+        for size in options['sizes']:
+            elapsed = 0.0
+            for _ in range(options['rounds']):
+                cart = CartService.get_or_create_cart(user)
+                CartItem.objects.bulk_create(
+                    CartItem(cart=cart, part=part, quantity=2) for part in parts[:size]
+                )
+                # Stock was reserved when the lines were added to the cart
+                StockReservation.objects.bulk_create(
+                    StockReservation(cart=cart, part=part, quantity=2, expires_at=expires_at)
+                    for part in parts[:size]
+                )
+
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    order = CartService.finalize_order(user)
+                    elapsed += time.perf_counter() - started
+
+                expected = sum(part.price * 2 for part in parts[:size])
+                lines = list(order.items.values_list('unit_price', 'quantity'))
+                assert order.total_price == expected, "order total does not match the cart"
+                assert sum(price * quantity for price, quantity in lines) == expected, "order lines do not match"
+                assert not cart.items.exists(), "cart was not emptied"
+
+            self.stdout.write(
+                f"lines={size:<4} ms_per_checkout={elapsed / options['rounds'] * 1000:7.2f} "
+                f"queries={len(queries)}"
+            )
+
+    def setup(self, count):
+        PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).delete()
+        return PartUnified.objects.bulk_create(
+            PartUnified(
+                name=f'Checkout benchmark part {index}',
+                internal_code=f'{BENCH_CODE_PREFIX}I{index}',
+                commercial_code=f'{BENCH_CODE_PREFIX}{index}',
+                price=1000 + index, cars='-', category_title='benchmark',
+                inventory=1000,
+            )
+            for index in range(count)
+        )
+
+    def teardown(self, user):
+        # Every checkout queued a confirmation email; the outbox worker must never send them
+        OutboxMessage.objects.filter(recipient=user.email).delete()
+        # Carts, reservations and orders go with the user
+        user.delete()
+        PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).delete()
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from models.models import Order
+from models.order_codes import RandomOrderCodeGenerator, encode, is_valid_code
+
+
+class Command(BaseCommand):
+    help = "Check order code uniqueness over millions of codes and under concurrent writers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codes', type=int, default=2_000_000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=50, help="Orders created per thread")
+
+    def handle(self, *args, **options):
+        count = options['codes']
+
+        started = time.perf_counter()
+        codes = {encode(number) for number in range(count)}
+        elapsed = time.perf_counter() - started
+        if len(codes) != count or not all(is_valid_code(code) for code in codes):
+            raise CommandError("primary-key codes are not unique or fail the checksum")
+        self.stdout.write(f"primary-key codes: {count:,} unique, {count / elapsed:,.0f} codes/s")
+
+        generator = RandomOrderCodeGenerator()
+        started = time.perf_counter()
+        codes = {generator.generate(None) for _ in range(count)}
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"random codes: {count - len(codes)} collisions in {count:,}, {count / elapsed:,.0f} codes/s"
+        )
+        del codes
+
+        self.concurrent_orders(options['threads'], options['orders'])
+
+    def concurrent_orders(self, threads, per_thread):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(
+            username='bench-order-codes', defaults={'email': 'bench-order-codes@example.com'}
+        )
+        try:
+            self.run_writers(user, threads, per_thread)
+        finally:
+            # The orders go with the user
+            user.delete()
+
+    def run_writers(self, user, threads, per_thread):
+        errors = []
+
+        def writer():
+            try:
+                for _ in range(per_thread):
+                    Order.objects.create(user=user, total_price=0)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                close_old_connections()
+
+        workers = [threading.Thread(target=writer) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        codes = list(Order.objects.filter(user=user).values_list('order_code', flat=True))
+        if errors or len(set(codes)) != threads * per_thread or None in codes:
+            raise CommandError(f"concurrent writers produced bad codes: {errors[:3]}")
+        self.stdout.write(
+            f"concurrent writers: {len(codes)} orders from {threads} threads, all codes unique, "
+            f"{len(codes) / elapsed:,.0f} orders/s"
+        )
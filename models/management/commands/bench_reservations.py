@@ -0,0 +1,118 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from models.cart_service import CartService
+from models.inventory_service import InsufficientStockError
+from models.models import Cart, CartItem, PartUnified, StockReservation
+
+
+BENCH_CODE = 'BENCH-RESERVE'
+
+
+def legacy_add(user, part_id, quantity):
+    """
+    The previous read-modify-write add-to-cart path, kept for comparison.
+    """
+    part = PartUnified.objects.get(id=part_id)
+    if part.inventory < quantity:
+        return False
+    cart, _ = Cart.objects.get_or_create(user=user)
+    item, created = CartItem.objects.get_or_create(cart=cart, part=part)
+    item.quantity = quantity if created else item.quantity + quantity
+    item.save()
+    part.inventory -= quantity
+    part.save()
+    return True
+
+
+def reservation_add(user, part_id, quantity):
+    try:
+        CartService.add_to_cart(user, PartUnified(pk=part_id), quantity=quantity)
+    except InsufficientStockError:
+        return False
+    return True
+
+
+class Command(BaseCommand):
+    help = "Hammer add-to-cart from concurrent threads and report oversells and throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--adds', type=int, default=100, help="Add attempts per thread")
+        parser.add_argument('--stock', type=int, default=400)
+        parser.add_argument('--mode', choices=['legacy', 'reservation', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        modes = ['legacy', 'reservation'] if options['mode'] == 'both' else [options['mode']]
+        try:
+            for mode in modes:
+                self.run(mode, options['threads'], options['adds'], options['stock'])
+        finally:
+            self.teardown()
+
+    def run(self, mode, threads, adds, stock):
+        add = legacy_add if mode == 'legacy' else reservation_add
+        part, users = self.setup(threads, stock)
+
+        counters = {'ok': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(user):
+            local = {'ok': 0, 'rejected': 0, 'errors': 0}
+            for _ in range(adds):
+                try:
+                    local['ok' if add(user, part.pk, 1) else 'rejected'] += 1
+                except DatabaseError:
+                    local['errors'] += 1
+            close_old_connections()
+            with lock:
+                for key, value in local.items():
+                    counters[key] += value
+
+        workers = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        part.refresh_from_db()
+        in_carts = sum(CartItem.objects.filter(part=part).values_list('quantity', flat=True))
+        oversold = max(0, in_carts - stock)
+        lost_updates = in_carts - (stock - part.inventory)
+
+        self.stdout.write(
+            f"{mode:<12} adds/s={(counters['ok'] + counters['rejected']) / elapsed:,.0f} "
+            f"accepted={counters['ok']} rejected={counters['rejected']} errors={counters['errors']} "
+            f"in_carts={in_carts} inventory_left={part.inventory} "
+            f"oversold={oversold} lost_updates={lost_updates}"
+        )
+
+    def setup(self, threads, stock):
+        User = get_user_model()
+        PartUnified.objects.filter(commercial_code=BENCH_CODE).delete()
+        part = PartUnified.objects.create(
+            name='Reservation benchmark part', internal_code=BENCH_CODE,
+            commercial_code=BENCH_CODE, price=1000, cars='-',
+            category_title='benchmark', inventory=stock,
+        )
+        users = []
+        for index in range(threads):
+            user, _ = User.objects.get_or_create(
+                username=f'bench-reserve-{index}',
+                defaults={'email': f'bench-reserve-{index}@example.com'},
+            )
+            Cart.objects.filter(user=user).delete()
+            users.append(user)
+        StockReservation.objects.filter(part=part).delete()
+        return part, users
+
+    def teardown(self):
+        # Carts and reservations go with the users
+        get_user_model().objects.filter(username__startswith='bench-reserve-').delete()
+        PartUnified.objects.filter(commercial_code=BENCH_CODE).delete()
@@ -0,0 +1,98 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from models.models import PartUnified
+from models.search_service import PartSearchService, SEARCH_COLUMNS
+
+
+BENCH_CODE_PREFIX = 'BENCH-SRCH-'
+WORDS = (
+    'brake', 'pad', 'filter', 'oil', 'air', 'clutch', 'disc', 'pump', 'belt', 'sensor',
+    'gasket', 'bearing', 'spark', 'plug', 'radiator', 'hose', 'mirror', 'lamp', 'shock', 'mount',
+)
+CARS = ('Peugeot 206', 'Peugeot 405', 'Pride', 'Samand', 'Dena', 'Tiba', 'Quick', 'Runna')
+
+
+def synthetic_part(index, rng):
+    name = ' '.join(rng.sample(WORDS, 3))
+    return PartUnified(
+        name=f'{name} {index}',
+        internal_code=f'{BENCH_CODE_PREFIX}I{index:07d}',
+        commercial_code=f'{BENCH_CODE_PREFIX}{index:07d}',
+        price=rng.randint(10_000, 5_000_000),
+        cars=', '.join(rng.sample(CARS, 2)),
+        description=' '.join(rng.choices(WORDS, k=12)),
+        category_title=f'Category {index % 200}',
+        part_type=rng.choice(('consumable', 'spare')),
+        turnover=rng.choice('ABCD'),
+        inventory=rng.randint(0, 50),
+    )
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic catalog and time indexed search against unindexed scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parts', type=int, default=500_000)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded parts for the next run.")
+
+    def handle(self, *args, **options):
+        try:
+            self.run(options)
+        finally:
+            if not options['keep']:
+                PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).delete()
+
+    def run(self, options):
+        self.seed(options['parts'], options['batch_size'])
+
+        rng = random.Random(1)
+        codes = [f'{BENCH_CODE_PREFIX}{rng.randrange(options["parts"]):07d}' for _ in range(options['repeat'])]
+        # A common word plus the part number, like a customer looking for one part
+        words = [f'{rng.choice(WORDS)} {rng.randrange(options["parts"])}' for _ in range(options['repeat'])]
+        parts = PartUnified.objects.only('id')
+
+        def scan(text):
+            queryset = parts
+            for word in text.split():
+                condition = Q()
+                for column in SEARCH_COLUMNS:
+                    condition |= Q(**{f'{column}__icontains': word})
+                queryset = queryset.filter(condition)
+            return queryset
+
+        cases = [
+            ('code (index)', lambda i: parts.filter(
+                Q(commercial_code=codes[i]) | Q(internal_code=codes[i]))),
+            ('code (icontains)', lambda i: parts.filter(
+                Q(commercial_code__icontains=codes[i]) | Q(internal_code__icontains=codes[i]))),
+            ('text (full-text)', lambda i: PartSearchService.match(parts, words[i])),
+            ('text (icontains)', lambda i: scan(words[i])),
+            ('category + price', lambda i: PartSearchService.filter_queryset(parts, {
+                'category_title': f'Category {i}', 'min_price': '100000', 'max_price': '900000',
+            })),
+        ]
+        for label, build in cases:
+            started = time.perf_counter()
+            for index in range(options['repeat']):
+                list(build(index).order_by('id')[:50])
+            per_query = (time.perf_counter() - started) / options['repeat'] * 1000
+            self.stdout.write(f"{label:<18} ms_per_query={per_query:8.2f}")
+            if options['verbosity'] > 1:
+                self.stdout.write(build(0).order_by('id')[:50].explain())
+
+    def seed(self, count, batch_size):
+        existing = PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).count()
+        if existing >= count:
+            return
+        rng = random.Random(0)
+        started = time.perf_counter()
+        for start in range(existing, count, batch_size):
+            stop = min(start + batch_size, count)
+            PartUnified.objects.bulk_create(synthetic_part(index, rng) for index in range(start, stop))
+        self.stdout.write(f"seeded {count - existing} parts in {time.perf_counter() - started:.1f}s")
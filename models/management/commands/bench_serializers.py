@@ -0,0 +1,91 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from models.models import Cart, CartItem, PartCategory, PartUnified
+from models.serializers import (
+    CartItemSerializer, PART_FIELD_PROFILES, serialize_cart_items,
+)
+
+
+BENCH_CODE_PREFIX = 'BENCH-SER-'
+
+
+class Command(BaseCommand):
+    help = "Compare payload size and serialization time of cart listings per field profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=50)
+        parser.add_argument('--rounds', type=int, default=200)
+
+    def handle(self, *args, **options):
+        cart = self.setup(options['items'])
+        try:
+            self.run(cart, options['rounds'])
+        finally:
+            self.teardown(cart.user)
+
+    def run(self, cart, rounds):
+        for profile, part_fields in PART_FIELD_PROFILES.items():
+            fields = None if profile == 'full' else part_fields
+
+            def drf():
+                items = cart.items.select_related('part__category').order_by('id')
+                return CartItemSerializer(items, many=True, part_fields=fields).data
+
+            def fast():
+                items = cart.items.with_parts(fields).order_by('id')
+                return serialize_cart_items(items, part_fields)
+
+            for name, build in (('drf', drf), ('fast', fast)):
+                with CaptureQueriesContext(connection) as queries:
+                    payload = JSONRenderer().render(build())
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    JSONRenderer().render(build())
+                per_cart = (time.perf_counter() - started) / rounds * 1000
+                self.stdout.write(
+                    f"{profile:<8} {name:<5} bytes={len(payload):>7} "
+                    f"ms_per_cart={per_cart:.2f} queries={len(queries)}"
+                )
+
+    def setup(self, count):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(
+            username='bench-serializers', defaults={'email': 'bench-serializers@example.com'}
+        )
+        PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).delete()
+        Cart.objects.filter(user=user).delete()
+        cart = Cart.objects.create(user=user)
+
+        category, _ = PartCategory.objects.update_or_create(title='Benchmark', defaults={
+            'url': 'https://example.com/category/benchmark',
+            'description': 'Category description. ' * 20,
+        })
+        parts = PartUnified.objects.bulk_create(
+            PartUnified(
+                name=f'Benchmark part {index}',
+                internal_code=f'{BENCH_CODE_PREFIX}I{index}',
+                commercial_code=f'{BENCH_CODE_PREFIX}{index}',
+                price=1000 + index,
+                cars=', '.join(f'Car model {car}' for car in range(40)),
+                description='Lorem ipsum dolor sit amet. ' * 40,
+                category_title=category.title,
+                category=category,
+                image_urls=[f'https://cdn.example.com/parts/{index}/{image}.jpg' for image in range(5)],
+                inventory=10,
+            )
+            for index in range(count)
+        )
+        CartItem.objects.bulk_create(CartItem(cart=cart, part=part, quantity=1) for part in parts)
+        return cart
+
+    def teardown(self, user):
+        # The cart goes with the user
+        user.delete()
+        PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).delete()
+        PartCategory.objects.filter(title='Benchmark').delete()
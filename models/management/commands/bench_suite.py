@@ -0,0 +1,601 @@
+import json
+import multiprocessing
+import platform
+import random
+import time
+from datetime import timedelta
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.db.models import Q
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from models import urls
+from models.authentication import CachedTokenAuthentication
+from models.cart_service import CartService
+from models.compatibility_service import CompatibilityService
+from models.metrics_service import MetricsService, install_query_wrapper
+from models.models import (
+    Car, Cart, CartItem, Order, OrderItem, OutboxMessage, PartCategory, PartUnified, Person, StockReservation,
+)
+
+
+BENCH_CODE_PREFIX = 'BENCH-SUITE-'
+BENCH_USER_PREFIX = 'bench-suite-'
+# Lower case never appears in generated order codes
+BENCH_ORDER_PREFIX = 'bs'
+BENCH_CAR_PREFIX = 'Bench car '
+
+PART_WORDS = [
+    'Brake pad', 'Oil filter', 'Air filter', 'Spark plug', 'Timing belt',
+    'Clutch disc', 'Shock absorber', 'Radiator', 'Headlight', 'Wiper blade',
+]
+
+
+class Context:
+    """
+    The seeded rows a scenario can pick from, with the random source of one worker.
+    """
+    def __init__(self, users, staff, part_ids, car_ids, seed):
+        self.users = users
+        self.staff = staff
+        self.part_ids = part_ids
+        self.car_ids = car_ids
+        self.rng = random.Random(seed)
+
+    def user(self):
+        return self.rng.choice(self.users)
+
+    def part_id(self):
+        return self.rng.choice(self.part_ids)
+
+    def order_code(self, user):
+        codes = list(Order.objects.filter(user_id=user['id']).values_list('order_code', flat=True)[:20])
+        return self.rng.choice(codes)
+
+    def cart_item_id(self, user):
+        item = CartItem.objects.filter(cart__user_id=user['id']).values_list('id', flat=True).first()
+        if item is None:
+            CartService.add_to_cart(Person(pk=user['id']), PartUnified(pk=self.part_id()), 1)
+            item = CartItem.objects.filter(cart__user_id=user['id']).values_list('id', flat=True).first()
+        return item
+
+    def fill_cart(self, user, lines=3):
+        for _ in range(lines):
+            CartService.add_to_cart(Person(pk=user['id']), PartUnified(pk=self.part_id()), 1)
+
+
+# Each scenario returns (method, path, data, user) for one request. Rows it
+# needs are prepared there, outside the measured request.
+
+def part_list(ctx):
+    page = ctx.rng.randint(1, max(1, min(200, len(ctx.part_ids) // 50)))
+    return 'get', f"{reverse('part-list')}?page={page}&profile=compact", None, ctx.user()
+
+
+def part_list_cursor(ctx):
+    return 'get', f"{reverse('part-list')}?pagination=cursor&sort=price&profile=compact", None, ctx.user()
+
+
+def part_search(ctx):
+    word = ctx.rng.choice(PART_WORDS).split()[0]
+    return 'get', f"{reverse('part-search')}?q={word}&profile=compact", None, ctx.user()
+
+
+def part_search_code(ctx):
+    code = f'{BENCH_CODE_PREFIX}{ctx.rng.randrange(len(ctx.part_ids))}'
+    return 'get', f"{reverse('part-search')}?code={code}", None, ctx.user()
+
+
+def part_detail(ctx):
+    return 'get', reverse('part-detail', args=[ctx.part_id()]), None, ctx.user()
+
+
+def category_list(ctx):
+    return 'get', reverse('category-list'), None, ctx.user()
+
+
+def part_cache_stats(ctx):
+    return 'get', reverse('part-cache-stats'), None, ctx.staff
+
+
+def metrics_endpoint(ctx):
+    return 'get', reverse('metrics'), None, ctx.staff
+
+
+def car_list(ctx):
+    return 'get', f"{reverse('car-list')}?q={BENCH_CAR_PREFIX.lower()}1", None, ctx.user()
+
+
+def car_parts(ctx):
+    return 'get', f"{reverse('car-parts', args=[ctx.rng.choice(ctx.car_ids)])}?profile=compact", None, ctx.user()
+
+
+def cart_add(ctx):
+    return 'post', reverse('cart-add'), {'part_id': ctx.part_id(), 'quantity': 1}, ctx.user()
+
+
+def cart_list(ctx):
+    return 'get', f"{reverse('cart-list')}?profile=compact", None, ctx.user()
+
+
+def cart_batch(ctx):
+    operations = [{'op': 'add', 'part_id': ctx.part_id(), 'quantity': 1} for _ in range(5)]
+    operations.append({'op': 'remove', 'part_id': ctx.part_id()})
+    return 'post', f"{reverse('cart-batch')}?profile=compact", {'operations': operations}, ctx.user()
+
+
+def delete_cart_item(ctx):
+    user = ctx.user()
+    return 'delete', reverse('delete-cart-item', args=[ctx.cart_item_id(user)]), None, user
+
+
+def clear_cart(ctx):
+    user = ctx.user()
+    ctx.fill_cart(user)
+    return 'delete', reverse('clear-cart'), None, user
+
+
+def create_order(ctx):
+    user = ctx.user()
+    ctx.fill_cart(user)
+    delivery = int((timezone.now() + timedelta(days=3)).timestamp())
+    return 'post', reverse('create-order'), {'post_type': 'post', 'delivery_date': delivery}, user
+
+
+def payment_order(ctx):
+    user = ctx.user()
+    return 'post', reverse('payment-order'), {'order_code': ctx.order_code(user)}, user
+
+
+def order_list(ctx):
+    return 'get', reverse('order-list'), None, ctx.user()
+
+
+def order_detail(ctx):
+    user = ctx.user()
+    return 'get', reverse('order-detail', args=[ctx.order_code(user)]), None, user
+
+
+def order_invoice(ctx):
+    user = ctx.user()
+    output = ctx.rng.choice(['text', 'html'])
+    return 'get', f"{reverse('order-invoice', args=[ctx.order_code(user)])}?output={output}", None, user
+
+
+def payment_webhook(ctx, route='payment-status-order'):
+    user = ctx.user()
+    order = Order.objects.create(user_id=user['id'], total_price=1000)
+    data = {'order_code': order.order_code, 'status': ctx.rng.choice(['success', 'failed'])}
+    return 'post', reverse(route), data, user
+
+
+def async_part_list(ctx):
+    return 'get', f"{reverse('async-part-list')}?sort=price&profile=compact", None, ctx.user()
+
+
+def async_cart(ctx):
+    return 'get', f"{reverse('async-cart')}?profile=compact", None, ctx.user()
+
+
+def async_cart_add(ctx):
+    return 'post', reverse('async-cart'), {'part_id': ctx.part_id(), 'quantity': 1}, ctx.user()
+
+
+def async_delete_cart_item(ctx):
+    user = ctx.user()
+    return 'delete', reverse('async-delete-cart-item', args=[ctx.cart_item_id(user)]), None, user
+
+
+def async_clear_cart(ctx):
+    user = ctx.user()
+    ctx.fill_cart(user)
+    return 'delete', reverse('async-clear-cart'), None, user
+
+
+def async_payment_webhook(ctx):
+    return payment_webhook(ctx, route='async-payment-status-order')
+
+
+# name: (scenario, route, query budget, served by the async views). Budgets are
+# the counts of the current code; raise one only with the change that needs it.
+SCENARIOS = {
+    'part-list': (part_list, 'part-list', 3, False),
+    'part-list-cursor': (part_list_cursor, 'part-list', 1, False),
+    'part-search': (part_search, 'part-search', 1, False),
+    'part-search-code': (part_search_code, 'part-search', 1, False),
+    'part-detail': (part_detail, 'part-detail', 2, False),
+    'category-list': (category_list, 'category-list', 1, False),
+    'part-cache-stats': (part_cache_stats, 'part-cache-stats', 0, False),
+    'metrics': (metrics_endpoint, 'metrics', 0, False),
+    'car-list': (car_list, 'car-list', 1, False),
+    'car-parts': (car_parts, 'car-parts', 2, False),
+    'cart-add': (cart_add, 'cart-add', 13, False),
+    'cart-list': (cart_list, 'cart-list', 4, False),
+    'cart-batch': (cart_batch, 'cart-batch', 15, False),
+    'delete-cart-item': (delete_cart_item, 'delete-cart-item', 11, False),
+    'clear-cart': (clear_cart, 'clear-cart', 11, False),
+    'create-order': (create_order, 'create-order', 19, False),
+    'payment-order': (payment_order, 'payment-order', 0, False),
+    'order-list': (order_list, 'order-list', 1, False),
+    'order-detail': (order_detail, 'order-detail', 2, False),
+    'order-invoice': (order_invoice, 'order-invoice', 2, False),
+    'payment-webhook': (payment_webhook, 'payment-status-order', 7, False),
+    'async-part-list': (async_part_list, 'async-part-list', 1, True),
+    'async-cart': (async_cart, 'async-cart', 4, True),
+    'async-cart-add': (async_cart_add, 'async-cart', 13, True),
+    'async-delete-cart-item': (async_delete_cart_item, 'async-delete-cart-item', 11, True),
+    'async-clear-cart': (async_clear_cart, 'async-clear-cart', 11, True),
+    'async-payment-webhook': (async_payment_webhook, 'async-payment-status-order', 7, True),
+}
+
+# Relative frequency of the scenarios in the load phase
+LOAD_MIX = {
+    'part-list': 20, 'part-list-cursor': 5, 'part-search': 10, 'part-search-code': 5, 'part-detail': 15,
+    'category-list': 5, 'car-parts': 5, 'cart-list': 15, 'cart-add': 8, 'delete-cart-item': 4, 'cart-batch': 2,
+    'order-list': 5, 'order-detail': 3, 'order-invoice': 2, 'create-order': 1,
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, int(round(fraction * len(ordered))) - 1)] if ordered else 0.0
+
+
+def summarize(latencies):
+    return {
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+def send(ctx, name, sync_client, async_client):
+    """
+    Prepare and send one request of ``name``; returns (seconds, status, queries).
+    """
+    scenario, _, _, is_async = SCENARIOS[name]
+    method, path, data, user = scenario(ctx)
+    kwargs = {'headers': {'Authorization': f"Token {user['token']}"}}
+    if data is not None:
+        kwargs.update(data=data, content_type='application/json')
+
+    metrics, token = MetricsService.activate()
+    try:
+        started = time.perf_counter()
+        if is_async:
+            response = async_to_sync(getattr(async_client, method))(path, **kwargs)
+        else:
+            response = getattr(sync_client, method)(path, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+    finally:
+        MetricsService.deactivate(token)
+    return elapsed, response.status_code, metrics.queries
+
+
+# Shared with the forked load workers
+_load_context = None
+
+
+def load_worker(args):
+    index, requests, users, seed = args
+    base = _load_context
+    ctx = Context(users, base.staff, base.part_ids, base.car_ids, seed + index)
+    client, names, weights = Client(raise_request_exception=False), list(LOAD_MIX), list(LOAD_MIX.values())
+    results = []
+    for _ in range(requests):
+        name = ctx.rng.choices(names, weights)[0]
+        try:
+            elapsed, code, _ = send(ctx, name, client, None)
+        except DatabaseError:
+            # Preparing the request failed, e.g. on a busy SQLite database
+            elapsed, code = 0.0, 0
+        results.append((name, elapsed, code))
+    connections.close_all()
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large synthetic catalog with users, carts and orders, drive every "
+        "endpoint of models/urls.py, check per-endpoint query budgets, run a "
+        "multi-process load phase and write latency percentiles and throughput to "
+        "a JSON baseline that later runs can be compared with."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parts', type=int, default=200_000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--cart-lines', type=int, default=5)
+        parser.add_argument('--orders-per-user', type=int, default=3)
+        parser.add_argument('--rounds', type=int, default=50, help="Measured requests per endpoint.")
+        parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+        parser.add_argument('--processes', type=int, default=4, help="Load generator processes; 0 skips the load phase.")
+        parser.add_argument('--load-requests', type=int, default=500, help="Requests per load process.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="Fail on regressions against this JSON baseline.")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95/throughput change, as a fraction.")
+        parser.add_argument('--seed', type=int, default=21)
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded rows for the next run of the same size.")
+
+    def handle(self, *args, **options):
+        try:
+            self.run(options)
+        finally:
+            self.discard_outbox()
+            if not options['keep']:
+                self.teardown()
+
+    def run(self, options):
+        self.check_coverage()
+        started = time.perf_counter()
+        ctx = self.seed(options)
+        self.stdout.write(f"seeded in {time.perf_counter() - started:.1f}s")
+
+        for alias in connections:
+            install_query_wrapper(connection=connections[alias])
+        # Budgets are for warm requests, which authenticate from the token cache
+        for user in [ctx.staff, *ctx.users]:
+            CachedTokenAuthentication.get_token(user['token'])
+        results = {'meta': self.meta(options), 'endpoints': {}, 'load': None}
+        over_budget = []
+        # The in-process clients send Host: testserver; timings are taken without the middleware
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], INSTRUMENTATION_ENABLED=False,
+        ):
+            for name in options['scenarios']:
+                stats = self.measure(ctx, name, options['rounds'])
+                results['endpoints'][name] = stats
+                marker = 'ok'
+                if stats['queries'] > stats['budget']:
+                    marker = 'OVER'
+                    over_budget.append(f"{name}: {stats['queries']} queries, budget {stats['budget']}")
+                if stats['errors']:
+                    marker = 'ERR'
+                self.stdout.write(
+                    f"{marker:<4} {name:<24} queries={stats['queries']:>3}/{stats['budget']:<3} "
+                    f"p50_ms={stats['p50_ms']:8.2f} p95_ms={stats['p95_ms']:8.2f} "
+                    f"p99_ms={stats['p99_ms']:8.2f} errors={stats['errors']}"
+                )
+            if options['processes'] > 0:
+                results['load'] = self.load(ctx, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2, sort_keys=True)
+            self.stdout.write(f"results written to {options['output']}")
+
+        problems = over_budget + [
+            f"{name}: {stats['errors']} failed requests"
+            for name, stats in results['endpoints'].items() if stats['errors']
+        ]
+        if options['compare']:
+            problems += self.compare(results, options['compare'], options['tolerance'])
+        if problems:
+            raise CommandError('\n'.join(problems))
+
+    def check_coverage(self):
+        routes = {pattern.name for pattern in urls.urlpatterns}
+        missing = routes - {SCENARIOS[name][1] for name in SCENARIOS}
+        if missing:
+            raise CommandError(f"Endpoints without a scenario: {', '.join(sorted(missing))}")
+
+    def meta(self, options):
+        return {
+            'created_at': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'parts': options['parts'],
+            'users': options['users'],
+            'rounds': options['rounds'],
+        }
+
+    def measure(self, ctx, name, rounds):
+        _, route, budget, _ = SCENARIOS[name]
+        sync_client, async_client = Client(), AsyncClient()
+        # One warm-up request for imports and per-process caches
+        send(ctx, name, sync_client, async_client)
+        latencies, queries, errors = [], [], 0
+        for _ in range(rounds):
+            elapsed, code, count = send(ctx, name, sync_client, async_client)
+            latencies.append(elapsed)
+            queries.append(count)
+            errors += not (200 <= code < 300 or code == 304)
+        return {
+            'route': route, 'requests': rounds, 'errors': errors,
+            'queries': max(queries, default=0), 'budget': budget, **summarize(latencies),
+        }
+
+    def load(self, ctx, options):
+        global _load_context
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            self.stdout.write("load phase skipped: needs the fork start method")
+            return None
+
+        processes = options['processes']
+        # Every process gets its own users so carts are not shared between them
+        tasks = [
+            (index, options['load_requests'], ctx.users[index::processes] or ctx.users, options['seed'])
+            for index in range(processes)
+        ]
+        _load_context = ctx
+        connections.close_all()
+        started = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            results = [result for share in pool.map(load_worker, tasks) for result in share]
+        elapsed = time.perf_counter() - started
+
+        latencies = [seconds for _, seconds, code in results if code]
+        errors = sum(not (200 <= code < 300 or code == 304) for _, _, code in results)
+        by_name = {}
+        for name, seconds, code in results:
+            if code:
+                by_name.setdefault(name, []).append(seconds)
+        load = {
+            'processes': processes, 'requests': len(results), 'errors': errors, 'seconds': round(elapsed, 3),
+            'throughput_rps': round(len(results) / elapsed, 1), **summarize(latencies),
+            'endpoints': {name: {'requests': len(values), **summarize(values)} for name, values in sorted(by_name.items())},
+        }
+        self.stdout.write(
+            f"load processes={processes} requests={load['requests']} errors={errors} "
+            f"req/s={load['throughput_rps']:.1f} p50_ms={load['p50_ms']:.2f} "
+            f"p95_ms={load['p95_ms']:.2f} p99_ms={load['p99_ms']:.2f}"
+        )
+        return load
+
+    def compare(self, results, path, tolerance):
+        """
+        Differences from a previous run that count as regressions.
+        """
+        with open(path) as handle:
+            baseline = json.load(handle)
+        problems = []
+        for name, stats in results['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(name)
+            if not before:
+                continue
+            change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+            self.stdout.write(
+                f"{name:<24} queries {before['queries']:>3} -> {stats['queries']:<3} "
+                f"p95_ms {before['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f} ({change:+.0%})"
+            )
+            if stats['queries'] > before['queries']:
+                problems.append(f"{name}: {before['queries']} -> {stats['queries']} queries")
+            # Sub-millisecond changes are noise
+            if change > tolerance and stats['p95_ms'] - before['p95_ms'] > 1:
+                problems.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {stats['p95_ms']:.2f}ms")
+
+        load, before = results.get('load'), baseline.get('load')
+        if load and before:
+            change = (load['throughput_rps'] - before['throughput_rps']) / before['throughput_rps']
+            self.stdout.write(
+                f"{'load':<24} req/s {before['throughput_rps']:.1f} -> {load['throughput_rps']:.1f} ({change:+.0%})"
+            )
+            if change < -tolerance:
+                problems.append(f"load: {before['throughput_rps']} -> {load['throughput_rps']} req/s")
+        return problems
+
+    def seed(self, options):
+        """
+        Create the synthetic dataset, reusing it when a previous run left one of the same size.
+        """
+        rng = random.Random(options['seed'])
+        parts = PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX)
+        if parts.count() != options['parts']:
+            self.teardown()
+            self.seed_parts(options['parts'], rng)
+        users = Person.objects.filter(username__startswith=BENCH_USER_PREFIX, is_staff=False)
+        if users.count() != options['users']:
+            Person.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+            self.seed_users(options, list(parts.values_list('id', 'price')), rng)
+
+        staff = Person.objects.get(username=f'{BENCH_USER_PREFIX}staff')
+        return Context(
+            users=[
+                {'id': pk, 'token': key}
+                for pk, key in users.order_by('id').values_list('id', 'auth_token__key')
+            ],
+            staff={'id': staff.pk, 'token': staff.auth_token.key},
+            part_ids=list(parts.values_list('id', flat=True)),
+            car_ids=list(Car.objects.filter(name__startswith=BENCH_CAR_PREFIX).values_list('id', flat=True)),
+            seed=options['seed'],
+        )
+
+    def seed_parts(self, count, rng, batch_size=5000):
+        categories = [
+            PartCategory.objects.update_or_create(
+                title=f'Bench category {index}', defaults={'url': 'https://example.com/benchmark'},
+            )[0]
+            for index in range(20)
+        ]
+        for start in range(0, count, batch_size):
+            batch = PartUnified.objects.bulk_create(
+                PartUnified(
+                    name=f'{rng.choice(PART_WORDS)} {index}',
+                    internal_code=f'{BENCH_CODE_PREFIX}I{index}',
+                    commercial_code=f'{BENCH_CODE_PREFIX}{index}',
+                    price=rng.randint(10_000, 5_000_000),
+                    cars=', '.join(f'{BENCH_CAR_PREFIX}{rng.randrange(30)}' for _ in range(2)),
+                    category=(category := rng.choice(categories)),
+                    category_title=category.title,
+                    part_type=rng.choice(['spare', 'consumable']),
+                    turnover=rng.choice('ABCD'),
+                    inventory=1_000_000,
+                )
+                for index in range(start, min(start + batch_size, count))
+            )
+            CompatibilityService.sync_parts(batch)
+
+    def seed_users(self, options, parts, rng, batch_size=1000):
+        staff = Person.objects.create(
+            username=f'{BENCH_USER_PREFIX}staff', email=f'{BENCH_USER_PREFIX}staff@example.com', is_staff=True,
+        )
+        Token.objects.create(user=staff)
+
+        code = 0
+        expires_at = timezone.now() + timedelta(days=1)
+        for start in range(0, options['users'], batch_size):
+            people = Person.objects.bulk_create(
+                Person(
+                    username=f'{BENCH_USER_PREFIX}{index}', email=f'{BENCH_USER_PREFIX}{index}@example.com',
+                    full_name=f'Bench user {index}', phone_number='09120000000', postal_code='1234567890',
+                    address='Benchmark street', password='!',
+                )
+                for index in range(start, min(start + batch_size, options['users']))
+            )
+            Token.objects.bulk_create(Token(user=person, key=Token.generate_key()) for person in people)
+            carts = Cart.objects.bulk_create(Cart(user=person) for person in people)
+            lines = [
+                (cart, part_id) for cart in carts for part_id, _ in rng.sample(parts, options['cart_lines'])
+            ]
+            CartItem.objects.bulk_create(CartItem(cart=cart, part_id=part_id, quantity=1) for cart, part_id in lines)
+            StockReservation.objects.bulk_create(
+                StockReservation(cart=cart, part_id=part_id, quantity=1, expires_at=expires_at)
+                for cart, part_id in lines
+            )
+
+            orders = []
+            for person in people:
+                for _ in range(options['orders_per_user']):
+                    orders.append(Order(
+                        user=person, total_price=0, order_code=f'{BENCH_ORDER_PREFIX}{code:08d}',
+                        order_status=rng.choice(['waiting', 'paied', 'failed']),
+                        created_at=timezone.now() - timedelta(minutes=rng.randrange(100_000)),
+                    ))
+                    code += 1
+            orders = Order.objects.bulk_create(orders)
+            lines = []
+            for order in orders:
+                for part_id, price in rng.sample(parts, 3):
+                    lines.append(OrderItem(
+                        order=order, part_id=part_id, part_name='Bench part', unit_price=price, quantity=1,
+                    ))
+                    order.total_price += price
+            OrderItem.objects.bulk_create(lines)
+            Order.objects.bulk_update(orders, ['total_price'])
+
+    def discard_outbox(self):
+        """
+        Delete the emails and SMS queued by the checkout and payment
+        scenarios, so the outbox worker never delivers them.
+        """
+        OutboxMessage.objects.filter(
+            Q(recipient__startswith=BENCH_USER_PREFIX) | Q(order__user__username__startswith=BENCH_USER_PREFIX)
+        ).delete()
+
+    def teardown(self):
+        Person.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+        PartUnified.objects.filter(commercial_code__startswith=BENCH_CODE_PREFIX).delete()
+        PartCategory.objects.filter(title__startswith='Bench category').delete()
+        Car.objects.filter(name__startswith=BENCH_CAR_PREFIX).delete()
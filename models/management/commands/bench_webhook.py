@@ -0,0 +1,124 @@
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from models.models import Order, OutboxMessage, PaymentEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay duplicate and out-of-order payment callbacks concurrently against the "
+        "webhook and check that every order changed status exactly once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--duplicates', type=int, default=3, help="Extra copies of every callback.")
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--url', default='/cart/orders/final-status/')
+        parser.add_argument('--seed', type=int, default=18)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(
+            username='bench-webhook', defaults={'email': 'bench-webhook@example.com', 'phone_number': '09120000000'}
+        )
+        token, _ = Token.objects.get_or_create(user=user)
+        Order.objects.filter(user=user).delete()
+        try:
+            self.run(user, token, rng, options)
+        finally:
+            # Orders, with the invoice SMS they queued, and the token go with the user
+            user.delete()
+
+    def run(self, user, token, rng, options):
+        orders = [Order.objects.create(user=user, total_price=1000) for _ in range(options['orders'])]
+
+        callbacks = []
+        for index, order in enumerate(orders):
+            for payment_status in ('success', 'failed'):
+                # Half the gateways send an event id, the rest rely on the default key
+                event_id = f'{order.order_code}-{payment_status}' if index % 2 else None
+                callbacks += [(order.order_code, payment_status, event_id)] * (1 + options['duplicates'])
+        rng.shuffle(callbacks)
+
+        headers = {'Authorization': f'Token {token.key}'}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            elapsed, results = self.replay(callbacks, headers, options)
+
+        latencies = sorted(latency for latency, _, _ in results)
+        failures = [code for _, code, _ in results if code != 200]
+        outcomes = Counter(outcome for _, _, outcome in results)
+        self.stdout.write(
+            f"callbacks={len(results)} per_s={len(results) / elapsed:8.1f} "
+            f"p50_ms={statistics.median(latencies) * 1000:6.2f} "
+            f"p99_ms={latencies[int(len(latencies) * 0.99) - 1] * 1000:6.2f} "
+            + ' '.join(f'{name}={count}' for name, count in sorted(outcomes.items()))
+        )
+
+        problems = self.verify(orders, failures)
+        if problems:
+            raise CommandError('\n'.join(problems))
+        self.stdout.write("every order changed status exactly once")
+
+    def replay(self, callbacks, headers, options):
+        def worker(share):
+            client = Client()
+            results = []
+            for order_code, payment_status, event_id in share:
+                data = {'order_code': order_code, 'status': payment_status}
+                if event_id:
+                    data['event_id'] = event_id
+                started = time.perf_counter()
+                response = client.post(options['url'], data, content_type='application/json', headers=headers)
+                results.append((
+                    time.perf_counter() - started,
+                    response.status_code,
+                    response.json().get('event') if response.status_code == 200 else None,
+                ))
+            connection.close()
+            return results
+
+        threads = max(1, options['threads'])
+        shares = [callbacks[index::threads] for index in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = [result for share in pool.map(worker, shares) for result in share]
+        return time.perf_counter() - started, results
+
+    def verify(self, orders, failures):
+        problems = []
+        if failures:
+            problems.append(f"{len(failures)} callbacks failed: {Counter(failures)}")
+
+        ids = [order.pk for order in orders]
+        applied = Counter(
+            PaymentEvent.objects.filter(order__in=ids, outcome='applied').values_list('order_id', flat=True)
+        )
+        if any(count != 1 for count in applied.values()) or len(applied) != len(ids):
+            problems.append("some orders were not changed exactly once")
+
+        expected = dict(
+            PaymentEvent.objects.filter(order__in=ids, outcome='applied').values_list('order_id', 'status')
+        )
+        for pk, order_status in Order.objects.filter(pk__in=ids).values_list('pk', 'order_status'):
+            if order_status != ('paied' if expected.get(pk) == 'success' else 'failed'):
+                problems.append(f"order {pk} is {order_status} but its first callback was {expected.get(pk)}")
+                break
+
+        paid = Order.objects.filter(pk__in=ids, order_status='paied').count()
+        sms = OutboxMessage.objects.filter(order__in=ids).count()
+        if sms != paid:
+            problems.append(f"{sms} invoice messages queued for {paid} paid orders")
+        return problems
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from models.compatibility_service import CompatibilityService
+
+
+class Command(BaseCommand):
+    help = "Backfill the Car / PartCompatibility index from PartUnified.cars."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = CompatibilityService.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f"indexed {rows} part/car pairs in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Min
+
+from models.models import Cart, CartItem, StockReservation
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge duplicate carts of a user and duplicate lines of a cart so the "
+        "unique_cart_per_user and unique_cart_item_per_part constraints can be added."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report duplicates without changing anything.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            carts = self.merge_carts()
+            lines = self.merge_lines()
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        verb = "Would merge" if options['dry_run'] else "Merged"
+        self.stdout.write(f"{verb} {carts} duplicate carts and {lines} duplicate cart lines.")
+
+    def merge_carts(self):
+        """
+        Move the lines and reservations of every extra cart of a user into the
+        user's oldest cart, then delete the extra carts.
+        """
+        users = (
+            Cart.objects.values('user').annotate(carts=Count('id'), keep=Min('id')).filter(carts__gt=1)
+        )
+        keep_by_user = {row['user']: row['keep'] for row in users}
+        if not keep_by_user:
+            return 0
+
+        extra = dict(
+            Cart.objects.filter(user__in=keep_by_user).exclude(id__in=keep_by_user.values())
+            .values_list('id', 'user')
+        )
+        target = {cart_id: keep_by_user[user_id] for cart_id, user_id in extra.items()}
+        # Lines are merged per part afterwards by merge_lines()
+        for cart_id, keep_id in target.items():
+            CartItem.objects.filter(cart_id=cart_id).update(cart_id=keep_id)
+
+        for reservation in StockReservation.objects.filter(cart__in=target).order_by('id'):
+            kept = StockReservation.objects.filter(cart_id=target[reservation.cart_id], part_id=reservation.part_id)
+            if kept.update(quantity=F('quantity') + reservation.quantity):
+                reservation.delete()
+            else:
+                reservation.cart_id = target[reservation.cart_id]
+                reservation.save(update_fields=['cart'])
+
+        Cart.objects.filter(id__in=target).delete()
+        return len(target)
+
+    def merge_lines(self):
+        """
+        Sum the quantities of lines for the same part into the oldest line.
+        """
+        duplicates = (
+            CartItem.objects.values('cart', 'part').annotate(lines=Count('id'), keep=Min('id')).filter(lines__gt=1)
+        )
+        merged = 0
+        for row in duplicates:
+            lines = CartItem.objects.filter(cart=row['cart'], part=row['part'])
+            total = sum(lines.values_list('quantity', flat=True))
+            lines.filter(id=row['keep']).update(quantity=total)
+            deleted, _ = lines.exclude(id=row['keep']).delete()
+            merged += deleted
+        return merged
@@ -0,0 +1,30 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from models.catalog_service import CatalogService
+
+
+class Command(BaseCommand):
+    help = "Stream every PartUnified row to a CSV or JSONL file (or stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="Output file, stdout when omitted")
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = CatalogService.detect_format(path or '', options['format'])
+        rows = CatalogService.export_rows(chunk_size=options['chunk_size'])
+
+        started = time.perf_counter()
+        if path:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                count = CatalogService.write_rows(stream, rows, format)
+        else:
+            count = CatalogService.write_rows(sys.stdout, rows, format)
+        elapsed = time.perf_counter() - started
+
+        self.stderr.write(f"exported {count} rows in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
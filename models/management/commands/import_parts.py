@@ -0,0 +1,87 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from models.catalog_service import CatalogRowError, CatalogService
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV or JSONL catalog file into PartUnified, upserting by "
+        "(commercial_code, internal_code) in batches. Progress is checkpointed "
+        "after every batch so an interrupted import can be resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--resume', action='store_true', help="Continue from the last checkpoint")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <path>.checkpoint)")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        format = CatalogService.detect_format(path, options['format'])
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        batch_size = options['batch_size']
+
+        skip = self.read_checkpoint(checkpoint) if options['resume'] else 0
+        if skip:
+            self.stdout.write(f"resuming after {skip} rows")
+
+        position = 0
+        created = updated = failed = 0
+        batch = []
+        started = time.perf_counter()
+
+        def flush():
+            nonlocal created, updated
+            batch_created, batch_updated = CatalogService.upsert_batch(batch)
+            created += batch_created
+            updated += batch_updated
+            batch.clear()
+            self.write_checkpoint(checkpoint, position)
+            elapsed = time.perf_counter() - started
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{position} rows, {(position - skip) / elapsed:,.0f} rows/s")
+
+        with open(path, newline='', encoding='utf-8') as stream:
+            for row in CatalogService.read_rows(stream, format):
+                position += 1
+                if position <= skip:
+                    continue
+                try:
+                    batch.append(CatalogService.parse_row(row))
+                except CatalogRowError as error:
+                    failed += 1
+                    self.stderr.write(f"row {position}: {error}")
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+
+        self.write_checkpoint(checkpoint, position)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"created={created} updated={updated} failed={failed} "
+            f"rows={position - skip} seconds={elapsed:.1f} rows/s={(position - skip) / max(elapsed, 1e-9):,.0f}"
+        )
+        os.remove(checkpoint)
+
+    @staticmethod
+    def read_checkpoint(checkpoint):
+        try:
+            with open(checkpoint) as stream:
+                return int(stream.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def write_checkpoint(checkpoint, position):
+        # Write then rename so a crash never leaves a half-written checkpoint
+        with open(f'{checkpoint}.tmp', 'w') as stream:
+            stream.write(str(position))
+        os.replace(f'{checkpoint}.tmp', checkpoint)
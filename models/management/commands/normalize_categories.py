@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from models.category_service import CategoryService
+from models.models import PartCategory, PartUnified
+
+
+class Command(BaseCommand):
+    help = (
+        "Create a PartCategory for every category_title of the parts that are not "
+        "linked to one (migration 0006 links the existing catalog), link the parts "
+        "to it and rebuild the category counters. Safe to run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report categories without changing anything.")
+
+    def handle(self, *args, **options):
+        # Parts not linked yet, grouped by title; whitespace variants are one category
+        titles = {}
+        unlinked = (
+            PartUnified.objects.filter(category__isnull=True).exclude(category_title='')
+            .values_list('category_title', flat=True).distinct().order_by()
+        )
+        for title in unlinked:
+            key = title.strip()
+            if key:
+                titles.setdefault(key, set()).add(title)
+
+        existing = set(PartCategory.objects.filter(title__in=titles).values_list('title', flat=True))
+        new = [PartCategory(title=title) for title in titles if title not in existing]
+        if options['dry_run']:
+            self.stdout.write(
+                f"Would create {len(new)} categories and link the parts of {len(titles)} titles."
+            )
+            return
+
+        PartCategory.objects.bulk_create(new, ignore_conflicts=True)
+        ids = dict(PartCategory.objects.filter(title__in=titles).values_list('title', 'id'))
+        linked = 0
+        for title, variants in titles.items():
+            # One short transaction per category; the (category_title, id) index finds the rows
+            with transaction.atomic():
+                linked += PartUnified.objects.filter(
+                    category__isnull=True, category_title__in=list(variants)
+                ).update(category_id=ids[title], category_title=title)
+
+        CategoryService.recount()
+        self.stdout.write(f"Created {len(new)} categories and linked {linked} parts.")
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from models.notification_service import NotificationService
+
+
+class Command(BaseCommand):
+    help = "Deliver queued order notifications from the outbox in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds to sleep when idle")
+        parser.add_argument('--once', action='store_true', help="Drain what is due and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            sent, failed = NotificationService.drain(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f"sent={sent} failed={failed}")
+            if sent + failed < options['batch_size']:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
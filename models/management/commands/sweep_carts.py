@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from models.sweeper_service import SweeperService
+
+
+class Command(BaseCommand):
+    help = (
+        "Return the stock of expired reservations and abandoned carts to inventory "
+        "and delete abandoned carts with their lines, in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows per transaction")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between sweeps")
+        parser.add_argument('--once', action='store_true', help="Sweep once and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            metrics = SweeperService.sweep(chunk_size=options['chunk_size'])
+            if metrics['chunks'] or options['once']:
+                self.stdout.write(SweeperService.describe(metrics))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from models.db_router import replica_alias
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over the replica file, standing in for "
+        "replication when trying the read replica routing locally."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0.0, help="Keep copying every N seconds (replica lag).")
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError("No replica database is configured.")
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError("Only SQLite files are copied; use the database's own replication.")
+
+        while True:
+            started = time.perf_counter()
+            self.copy(primary.settings_dict['NAME'], replica.settings_dict['NAME'])
+            self.stdout.write(f"replica refreshed in {(time.perf_counter() - started) * 1000:.1f}ms")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def copy(source, target):
+        # The backup API takes a consistent snapshot while the primary is in use
+        with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+            src.backup(dst)
+        src.close()
+        dst.close()
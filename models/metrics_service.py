@@ -0,0 +1,198 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+# Collapse "IN (%s, %s, ...)" so lookups of different sizes share one shape
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Counters of one instrumented request.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.shapes = Counter()
+        self.timing_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Time and count one query.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[IN_LIST.sub('IN (...)', sql) if 'IN (' in sql else sql] += 1
+
+    def repeated_shapes(self, threshold):
+        """
+        SQL shapes run at least ``threshold`` times, the mark of an N+1 loop.
+        """
+        return [(sql, count) for sql, count in self.shapes.most_common() if count >= threshold]
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection; counts the query for the
+    current request, if it is instrumented.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_wrapper(sender=None, connection=None, **kwargs):
+    """
+    ``connection_created`` receiver. The wrapper stays on the connection so
+    it also sees queries of async views, which run on other threads with
+    their own connections.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def current():
+    """
+    Metrics of the request being handled, or None when it is not instrumented.
+    """
+    return _current.get()
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Add the time spent in the block, less the queries it ran, to the
+    request's serializer time. Nested blocks are counted once.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.timing_depth += 1
+    started, db_before = time.perf_counter(), metrics.db_seconds
+    try:
+        yield
+    finally:
+        metrics.timing_depth -= 1
+        if not metrics.timing_depth:
+            elapsed = time.perf_counter() - started
+            metrics.serialize_seconds += elapsed - (metrics.db_seconds - db_before)
+
+
+def serialization(func):
+    """
+    Decorator form of timed_serialization().
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with timed_serialization():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class MetricsService:
+    """
+    Process-wide aggregates of the per-request metrics, by view, rendered in
+    the Prometheus text format. Every worker process keeps its own counters.
+    """
+    _lock = threading.Lock()
+    _views = {}
+
+    @staticmethod
+    def activate():
+        metrics = RequestMetrics()
+        return metrics, _current.set(metrics)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+    @staticmethod
+    def n_plus_one_threshold():
+        return getattr(settings, 'INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', 5)
+
+    @staticmethod
+    def record(view, method, metrics, latency, n_plus_one):
+        with MetricsService._lock:
+            stats = MetricsService._views.get((view, method))
+            if stats is None:
+                stats = MetricsService._views[(view, method)] = {
+                    'requests': 0, 'queries': 0, 'db_seconds': 0.0, 'serialize_seconds': 0.0,
+                    'latency_seconds': 0.0, 'n_plus_one': 0, 'buckets': [0] * len(LATENCY_BUCKETS),
+                }
+            stats['requests'] += 1
+            stats['queries'] += metrics.queries
+            stats['db_seconds'] += metrics.db_seconds
+            stats['serialize_seconds'] += metrics.serialize_seconds
+            stats['latency_seconds'] += latency
+            stats['n_plus_one'] += bool(n_plus_one)
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    stats['buckets'][index] += 1
+                    break
+
+    @staticmethod
+    def snapshot():
+        with MetricsService._lock:
+            return {key: {**stats, 'buckets': list(stats['buckets'])} for key, stats in MetricsService._views.items()}
+
+    @staticmethod
+    def reset():
+        with MetricsService._lock:
+            MetricsService._views.clear()
+
+    @staticmethod
+    def render():
+        """
+        All counters in the Prometheus text exposition format.
+        """
+        counters = [
+            ('cart_http_requests_total', 'counter', 'Instrumented requests.', 'requests'),
+            ('cart_db_queries_total', 'counter', 'SQL queries run by requests.', 'queries'),
+            ('cart_db_seconds_total', 'counter', 'Time spent in SQL queries.', 'db_seconds'),
+            ('cart_serialize_seconds_total', 'counter',
+             'Time spent serializing and rendering responses.', 'serialize_seconds'),
+            ('cart_n_plus_one_requests_total', 'counter',
+             'Requests that repeated one SQL shape past the threshold.', 'n_plus_one'),
+        ]
+        views = sorted(MetricsService.snapshot().items())
+        lines = []
+        for name, kind, help_text, field in counters:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for (view, method), stats in views:
+                lines.append(f'{name}{{{MetricsService.labels(view, method)}}} {stats[field]}')
+
+        name = 'cart_http_request_duration_seconds'
+        lines += [f'# HELP {name} Request latency.', f'# TYPE {name} histogram']
+        for (view, method), stats in views:
+            labels = MetricsService.labels(view, method)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {stats["requests"]}')
+            lines.append(f'{name}_sum{{{labels}}} {stats["latency_seconds"]}')
+            lines.append(f'{name}_count{{{labels}}} {stats["requests"]}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def labels(view, method):
+        view = view.replace('\\', '\\\\').replace('"', '\\"')
+        return f'view="{view}",method="{method}"'
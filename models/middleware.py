@@ -0,0 +1,146 @@
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import db_router
+from .metrics_service import MetricsService, current, install_query_wrapper
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationMiddleware:
+    """
+    Record query count, DB time, serializer time and latency of each request,
+    per view, for MetricsService, and report them in a ``Server-Timing``
+    header. Requests that repeat one SQL shape ``INSTRUMENTATION_N_PLUS_ONE_THRESHOLD``
+    times are logged as likely N+1 queries.
+
+    Off unless ``INSTRUMENTATION_ENABLED``; ``INSTRUMENTATION_SAMPLE_RATE``
+    limits the share of requests that are measured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 1.0)
+        self.server_timing = getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', True)
+        self.threshold = MetricsService.n_plus_one_threshold()
+        connection_created.connect(install_query_wrapper, dispatch_uid='instrumentation')
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection=connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        metrics, token = MetricsService.activate()
+        try:
+            response = self.get_response(request)
+        finally:
+            MetricsService.deactivate(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        metrics, token = MetricsService.activate()
+        try:
+            response = await self.get_response(request)
+        finally:
+            MetricsService.deactivate(token)
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered (JSON encoded) right after this hook
+        metrics = current()
+        if metrics is not None:
+            started, db_before = time.perf_counter(), metrics.db_seconds
+
+            def rendered(response):
+                elapsed = time.perf_counter() - started
+                metrics.serialize_seconds += elapsed - (metrics.db_seconds - db_before)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, metrics):
+        latency = time.perf_counter() - metrics.started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        repeated = metrics.repeated_shapes(self.threshold)
+        if repeated:
+            sql, count = repeated[0]
+            logger.warning("Possible N+1 in %s: %d queries, %d of them like %s", view, metrics.queries, count, sql)
+        MetricsService.record(view, request.method, metrics, latency, repeated)
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db_seconds * 1000:.2f};desc="{metrics.queries} queries"',
+                f'serialize;dur={metrics.serialize_seconds * 1000:.2f}',
+                f'total;dur={latency * 1000:.2f}',
+            ])
+        return response
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Tell ReplicaRouter which requests may read from the replica, and pin a
+    user who wrote to the primary for the next few seconds.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if db_router.replica_alias() is None:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.replica_views = set(getattr(settings, 'DATABASE_REPLICA_VIEWS', ()))
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = db_router.activate(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.deactivate(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = db_router.activate(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.deactivate(token)
+        return self.finish(state, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = db_router.current_state()
+        if state is not None and request.method in ('GET', 'HEAD'):
+            state.allow_replica = request.resolver_match.view_name in self.replica_views
+        return None
+
+    @staticmethod
+    def finish(state, response):
+        if state.wrote:
+            user = state.user()
+            if user is not None:
+                db_router.pin_to_primary(user)
+        return response
@@ -0,0 +1,54 @@
+from django.db import migrations
+from django.db.models import Count, F, Min
+
+
+def merge_carts(apps, schema_editor):
+    """
+    Same as the dedupe_carts command, on the historical models: move the
+    lines and reservations of every extra cart of a user into the user's
+    oldest cart, then sum duplicate lines of a cart into its oldest line.
+    """
+    Cart = apps.get_model('models', 'Cart')
+    CartItem = apps.get_model('models', 'CartItem')
+    StockReservation = apps.get_model('models', 'StockReservation')
+
+    users = Cart.objects.values('user').annotate(carts=Count('id'), keep=Min('id')).filter(carts__gt=1)
+    keep_by_user = {row['user']: row['keep'] for row in users}
+    if keep_by_user:
+        extra = dict(
+            Cart.objects.filter(user__in=keep_by_user).exclude(id__in=keep_by_user.values())
+            .values_list('id', 'user')
+        )
+        target = {cart_id: keep_by_user[user_id] for cart_id, user_id in extra.items()}
+        for cart_id, keep_id in target.items():
+            CartItem.objects.filter(cart_id=cart_id).update(cart_id=keep_id)
+        for reservation in StockReservation.objects.filter(cart__in=target).order_by('id'):
+            kept = StockReservation.objects.filter(cart_id=target[reservation.cart_id], part_id=reservation.part_id)
+            if kept.update(quantity=F('quantity') + reservation.quantity):
+                reservation.delete()
+            else:
+                reservation.cart_id = target[reservation.cart_id]
+                reservation.save(update_fields=['cart'])
+        Cart.objects.filter(id__in=target).delete()
+
+    duplicates = CartItem.objects.values('cart', 'part').annotate(lines=Count('id'), keep=Min('id')).filter(lines__gt=1)
+    for row in duplicates:
+        lines = CartItem.objects.filter(cart=row['cart'], part=row['part'])
+        total = sum(lines.values_list('quantity', flat=True))
+        lines.filter(id=row['keep']).update(quantity=total)
+        lines.exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+    """
+    Runs on its own so the merged rows are committed before 0004 alters the
+    tables (PostgreSQL refuses ALTER TABLE with pending deferred FK checks).
+    """
+
+    dependencies = [
+        ('models', '0002_order_lines_reservations_and_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_carts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('models', '0004_unique_carts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, unique=True)),
+                ('url', models.URLField(blank=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('part_count', models.IntegerField(default=0, editable=False)),
+                ('in_stock_count', models.IntegerField(default=0, editable=False)),
+            ],
+            options={
+                'verbose_name_plural': 'part categories',
+            },
+        ),
+        migrations.AddField(
+            model_name='partunified',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='parts', to='models.partcategory'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def link_categories(apps, schema_editor):
+    """
+    Create one PartCategory per distinct category_title of the parts, with
+    the URL and description of its first part, link the parts to it and
+    count them. Whitespace variants of a title are one category.
+    """
+    PartCategory = apps.get_model('models', 'PartCategory')
+    PartUnified = apps.get_model('models', 'PartUnified')
+
+    titles = {}
+    unlinked = (
+        PartUnified.objects.filter(category__isnull=True).exclude(category_title='')
+        .values('category_title').annotate(first=Min('id')).order_by()
+    )
+    for row in unlinked:
+        key = row['category_title'].strip()
+        if key:
+            variants = titles.setdefault(key, {})
+            variants[row['category_title']] = row['first']
+
+    first_ids = [min(variants.values()) for variants in titles.values()]
+    legacy = {}
+    for start in range(0, len(first_ids), 500):
+        rows = PartUnified.objects.filter(id__in=first_ids[start:start + 500]).values_list(
+            'id', 'category_url', 'category_description'
+        )
+        for part_id, url, description in rows:
+            legacy[part_id] = {'url': url or '', 'description': description or None}
+
+    existing = set(PartCategory.objects.values_list('title', flat=True))
+    PartCategory.objects.bulk_create(
+        [
+            PartCategory(title=title, **legacy.get(min(variants.values()), {}))
+            for title, variants in titles.items() if title not in existing
+        ],
+        batch_size=500,
+    )
+    ids = dict(PartCategory.objects.values_list('title', 'id'))
+    for title, variants in titles.items():
+        PartUnified.objects.filter(category__isnull=True, category_title__in=list(variants)).update(
+            category_id=ids[title], category_title=title,
+        )
+
+    # Absolute counts, whether or not the counter triggers exist yet
+    def count(condition=Q()):
+        parts = (
+            PartUnified.objects.filter(condition, category=OuterRef('pk'))
+            .order_by().values('category').annotate(total=Count('id')).values('total')
+        )
+        return Coalesce(Subquery(parts, output_field=IntegerField()), 0)
+
+    PartCategory.objects.update(part_count=count(), in_stock_count=count(Q(inventory__gt=0)))
+
+
+def restore_legacy_fields(apps, schema_editor):
+    """
+    Copy the URL and description of each category back onto its parts.
+    """
+    PartCategory = apps.get_model('models', 'PartCategory')
+    PartUnified = apps.get_model('models', 'PartUnified')
+    for category in PartCategory.objects.iterator():
+        PartUnified.objects.filter(category=category).update(
+            category_url=category.url, category_description=category.description,
+        )
+
+
+class Migration(migrations.Migration):
+    """
+    Runs between adding PartUnified.category (0005) and dropping the old flat
+    columns (0007), so the URL and description are read before they go.
+    """
+
+    dependencies = [
+        ('models', '0005_partcategory'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_categories, restore_legacy_fields),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('models', '0006_backfill_part_categories'),
+    ]
+
+    operations = [
+        # Blank first, so unapplying can add the column back to existing rows
+        migrations.AlterField(
+            model_name='partunified',
+            name='category_url',
+            field=models.URLField(blank=True),
+        ),
+        migrations.RemoveField(
+            model_name='partunified',
+            name='category_description',
+        ),
+        migrations.RemoveField(
+            model_name='partunified',
+            name='category_url',
+        ),
+    ]
@@ -0,0 +1,81 @@
+from django.db import migrations
+
+# Text columns covered by the index, as in search_service.SEARCH_COLUMNS
+COLUMNS = 'name, commercial_code, internal_code, category_title, description'
+NEW_VALUES = 'new.name, new.commercial_code, new.internal_code, new.category_title, new.description'
+OLD_VALUES = 'old.name, old.commercial_code, old.internal_code, old.category_title, old.description'
+TSVECTOR = (
+    "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(commercial_code, '') || ' ' || "
+    "coalesce(internal_code, '') || ' ' || coalesce(category_title, '') || ' ' || coalesce(description, ''))"
+)
+
+# SQLite: an external-content FTS5 table kept in sync by triggers. Only the
+# text columns fire the update trigger, so stock updates stay cheap.
+# IF NOT EXISTS, because databases migrated before this file got the index
+# from a post_migrate handler.
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS models_partunified_fts USING fts5("
+    f"{COLUMNS}, content='models_partunified', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS models_partunified_fts_ai AFTER INSERT ON models_partunified BEGIN "
+    f"INSERT INTO models_partunified_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END",
+    f"CREATE TRIGGER IF NOT EXISTS models_partunified_fts_ad AFTER DELETE ON models_partunified BEGIN "
+    f"INSERT INTO models_partunified_fts(models_partunified_fts, rowid, {COLUMNS}) "
+    f"VALUES ('delete', old.id, {OLD_VALUES}); END",
+    f"CREATE TRIGGER IF NOT EXISTS models_partunified_fts_au AFTER UPDATE OF {COLUMNS} ON models_partunified BEGIN "
+    f"INSERT INTO models_partunified_fts(models_partunified_fts, rowid, {COLUMNS}) "
+    f"VALUES ('delete', old.id, {OLD_VALUES}); "
+    f"INSERT INTO models_partunified_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END",
+    "INSERT INTO models_partunified_fts(models_partunified_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS models_partunified_fts_au",
+    "DROP TRIGGER IF EXISTS models_partunified_fts_ad",
+    "DROP TRIGGER IF EXISTS models_partunified_fts_ai",
+    "DROP TABLE IF EXISTS models_partunified_fts",
+]
+
+# PostgreSQL: a GIN index over the tsvector, and pattern_ops indexes for
+# LIKE 'prefix%' on the codes (needed unless the collation is C)
+POSTGRES_FORWARD = [
+    f"CREATE INDEX IF NOT EXISTS part_search_gin_idx ON models_partunified USING gin ({TSVECTOR})",
+    "CREATE INDEX IF NOT EXISTS part_commercial_prefix_idx "
+    "ON models_partunified (commercial_code varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS part_internal_prefix_idx "
+    "ON models_partunified (internal_code varchar_pattern_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS part_internal_prefix_idx",
+    "DROP INDEX IF EXISTS part_commercial_prefix_idx",
+    "DROP INDEX IF EXISTS part_search_gin_idx",
+]
+
+
+def run(statements):
+    """
+    A RunPython function executing the statements of the database vendor;
+    other databases search with icontains and get nothing.
+    """
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+    """
+    The full-text index of the part search.
+
+    On SQLite, a later migration that remakes models_partunified drops the
+    triggers with the old table, and has to run SQLITE_FORWARD again.
+    """
+
+    dependencies = [
+        ('models', '0008_order_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,90 @@
+from django.db import migrations
+
+
+def adjust(row, sign, cast=''):
+    return (
+        f"UPDATE models_partcategory SET part_count = part_count {sign} 1, "
+        f"in_stock_count = in_stock_count {sign} ({row}.inventory > 0){cast} WHERE id = {row}.category_id;"
+    )
+
+
+# Absolute counts, for the parts written while no trigger existed
+RECOUNT = (
+    "UPDATE models_partcategory SET "
+    "part_count = (SELECT COUNT(*) FROM models_partunified p WHERE p.category_id = models_partcategory.id), "
+    "in_stock_count = (SELECT COUNT(*) FROM models_partunified p "
+    "WHERE p.category_id = models_partcategory.id AND p.inventory > 0)"
+)
+
+# The update trigger only fires when a part changes category or its stock
+# crosses zero, so ordinary reservations never touch the category row.
+# IF NOT EXISTS / OR REPLACE, because databases migrated before this file got
+# the triggers from a post_migrate handler.
+SQLITE_FORWARD = [
+    f"CREATE TRIGGER IF NOT EXISTS part_category_counts_ai AFTER INSERT ON models_partunified "
+    f"WHEN new.category_id IS NOT NULL BEGIN {adjust('new', '+')} END",
+    f"CREATE TRIGGER IF NOT EXISTS part_category_counts_ad AFTER DELETE ON models_partunified "
+    f"WHEN old.category_id IS NOT NULL BEGIN {adjust('old', '-')} END",
+    f"CREATE TRIGGER IF NOT EXISTS part_category_counts_au AFTER UPDATE OF category_id, inventory "
+    f"ON models_partunified "
+    f"WHEN old.category_id IS NOT new.category_id OR (old.inventory > 0) != (new.inventory > 0) "
+    f"BEGIN {adjust('old', '-')} {adjust('new', '+')} END",
+    RECOUNT,
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS part_category_counts_au",
+    "DROP TRIGGER IF EXISTS part_category_counts_ad",
+    "DROP TRIGGER IF EXISTS part_category_counts_ai",
+]
+
+POSTGRES_FORWARD = [
+    f"CREATE OR REPLACE FUNCTION part_category_counts() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+    f"IF TG_OP <> 'INSERT' AND OLD.category_id IS NOT NULL THEN {adjust('OLD', '-', '::int')} END IF; "
+    f"IF TG_OP <> 'DELETE' AND NEW.category_id IS NOT NULL THEN {adjust('NEW', '+', '::int')} END IF; "
+    f"RETURN NULL; END $$",
+    "DROP TRIGGER IF EXISTS part_category_counts_aid ON models_partunified",
+    "CREATE TRIGGER part_category_counts_aid AFTER INSERT OR DELETE ON models_partunified "
+    "FOR EACH ROW EXECUTE FUNCTION part_category_counts()",
+    "DROP TRIGGER IF EXISTS part_category_counts_au ON models_partunified",
+    "CREATE TRIGGER part_category_counts_au AFTER UPDATE OF category_id, inventory ON models_partunified "
+    "FOR EACH ROW WHEN (OLD.category_id IS DISTINCT FROM NEW.category_id "
+    "OR (OLD.inventory > 0) <> (NEW.inventory > 0)) EXECUTE FUNCTION part_category_counts()",
+    RECOUNT,
+]
+POSTGRES_REVERSE = [
+    "DROP TRIGGER IF EXISTS part_category_counts_au ON models_partunified",
+    "DROP TRIGGER IF EXISTS part_category_counts_aid ON models_partunified",
+    "DROP FUNCTION IF EXISTS part_category_counts()",
+]
+
+
+def run(statements):
+    """
+    A RunPython function executing the statements of the database vendor;
+    other databases keep their counters with CategoryService.recount().
+    """
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+    """
+    Triggers on the part table that keep PartCategory.part_count and
+    in_stock_count current, including for QuerySet.update() and bulk writes.
+
+    On SQLite, a later migration that remakes models_partunified drops the
+    triggers with the old table, and has to run SQLITE_FORWARD again.
+    """
+
+    dependencies = [
+        ('models', '0009_part_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
@@ -1,10 +1,62 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User, AbstractUser
 from django.core.validators import MinValueValidator
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.conf import settings
-import random
-import string
+
+
+class PartCategory(models.Model):
+    """
+    A catalog category. ``part_count`` and ``in_stock_count`` are kept up to
+    date by database triggers on PartUnified (see CategoryService).
+    """
+    title = models.CharField(max_length=255, unique=True)
+    url = models.URLField(blank=True)
+    description = models.TextField(blank=True, null=True)
+    part_count = models.IntegerField(default=0, editable=False)
+    in_stock_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        verbose_name_plural = 'part categories'
+
+    def __str__(self):
+        return self.title
+
+    def save(self, *args, **kwargs):
+        # The counters belong to the triggers; never write back a stale copy
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = ['title', 'url', 'description']
+        return super().save(*args, **kwargs)
+
+
+# Flat category fields of the part API, as attributes of PartCategory
+CATEGORY_FIELDS = {'category_url': 'url', 'category_description': 'description'}
+
+
+def part_columns(fields, prefix=''):
+    """
+    Model paths to load for the given flat part fields; ``prefix`` is the
+    path of the part relation (e.g. ``'part__'``).
+    """
+    columns = [f'{prefix}{name}' for name in fields if name not in CATEGORY_FIELDS]
+    category = [CATEGORY_FIELDS[name] for name in fields if name in CATEGORY_FIELDS]
+    if category:
+        columns += [f'{prefix}category', *[f'{prefix}category__{name}' for name in category]]
+    return columns
+
+
+class PartUnifiedQuerySet(models.QuerySet):
+    def with_fields(self, fields):
+        """
+        Load only what is needed to emit ``fields``, joining the category
+        when one of its fields is asked for.
+        """
+        queryset = self.only(*part_columns(fields))
+        if any(name in CATEGORY_FIELDS for name in fields):
+            queryset = queryset.select_related('category')
+        return queryset
 
 
 class PartUnified(models.Model):
@@ -33,18 +85,16 @@ class PartUnified(models.Model):
     cars = models.TextField()
     description = models.TextField(blank=True, null=True)
 
-    # PartCategory fields
+    # PartCategory fields; the title is copied onto the part for the
+    # full-text index and the category_title filter
     category_title = models.CharField(max_length=255)
-    category_url = models.URLField()
-    category_description = models.TextField(blank=True, null=True)
-
-    # category = models.ForeignKey(
-    #     PartCategory,
-    #     on_delete=models.CASCADE,
-    #     related_name='parts',
-    #     null=True, 
-    #     blank=True
-    # )
+    category = models.ForeignKey(
+        PartCategory,
+        on_delete=models.SET_NULL,
+        related_name='parts',
+        null=True,
+        blank=True
+    )
 
     # PartImage fields
     image_urls = models.JSONField(blank=True, null=True, help_text="List of image URLs related to the part category")
@@ -69,20 +119,158 @@ class PartUnified(models.Model):
         help_text="Current inventory count for the part"
     )
 
+    objects = PartUnifiedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination sort keys (see KeysetPagination)
+            models.Index(fields=['price', 'id'], name='part_price_id_idx'),
+            models.Index(fields=['name', 'id'], name='part_name_id_idx'),
+            # Catalog search lookups (see PartSearchService); commercial_code
+            # lookups use the unique_part_codes index below
+            models.Index(fields=['internal_code'], name='part_internal_code_idx'),
+            models.Index(fields=['category_title', 'id'], name='part_category_id_idx'),
+            models.Index(fields=['part_type', 'turnover'], name='part_type_turnover_idx'),
+        ]
+        constraints = [
+            # Upsert key of the catalog import (see CatalogService)
+            models.UniqueConstraint(fields=['commercial_code', 'internal_code'], name='unique_part_codes'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.commercial_code} - Category: {self.category_title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # To tell a cleared category from a part that never had one
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'category' in update_fields:
+            if self.category_id is not None:
+                self.category_title = self.category.title
+            elif getattr(self, '_loaded_category_id', None) is not None:
+                # The category was cleared; titles of parts never linked are
+                # kept for normalize_categories
+                self.category_title = ''
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'category_title'}
+        super().save(*args, **kwargs)
+        self._loaded_category_id = self.category_id
+
+    @property
+    def category_url(self):
+        return self.category.url if self.category_id is not None else ''
+
+    @property
+    def category_description(self):
+        return self.category.description if self.category_id is not None else None
+
+
+class Car(models.Model):
+    """
+    A car model parts can be compatible with, parsed out of PartUnified.cars.
+    """
+    name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PartCompatibility(models.Model):
+    """
+    Normalized index of PartUnified.cars: one row per (car, part) pair.
+    """
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='compatibilities')
+    part = models.ForeignKey(PartUnified, on_delete=models.CASCADE, related_name='compatibilities')
+
+    class Meta:
+        constraints = [
+            # Also serves "parts for this car" lookups
+            models.UniqueConstraint(fields=['car', 'part'], name='unique_part_compatibility'),
+        ]
+
+    def __str__(self):
+        return f"part #{self.part_id} fits car #{self.car_id}"
+
 
 # -------------------------------------------
 
 
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate each cart with ``total_amount`` and ``item_count``
+        computed in the database. Correlated subqueries rather than a
+        join, so they only run for the rows fetched and count() skips them.
+        """
+        items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        return self.annotate(
+            total_amount=Coalesce(Subquery(
+                items.annotate(total=Sum(F('quantity') * F('part__price'))).values('total')
+            ), 0),
+            item_count=Coalesce(Subquery(items.annotate(count=Count('id')).values('count')), 0),
+        )
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_parts(self, part_fields=None):
+        """
+        Load the part in the same query and annotate ``line_total``.
+        When ``part_fields`` is given only those part columns are fetched.
+        """
+        queryset = self.annotate(line_total=F('quantity') * F('part__price'))
+        if part_fields is None:
+            return queryset.select_related('part__category')
+        queryset = queryset.only('id', 'cart', 'quantity', 'part__id', *part_columns(part_fields, 'part__'))
+        if any(name in CATEGORY_FIELDS for name in part_fields):
+            return queryset.select_related('part__category')
+        return queryset.select_related('part')
+
+    def totals(self):
+        """
+        Return ``{'total_price': ..., 'item_count': ...}`` for the items in one query.
+        """
+        return self.aggregate(
+            total_price=Coalesce(Sum(F('quantity') * F('part__price')), 0),
+            item_count=Count('id'),
+        )
+
+    async def atotals(self):
+        return await self.aaggregate(
+            total_price=Coalesce(Sum(F('quantity') * F('part__price')), 0),
+            item_count=Count('id'),
+        )
+
+
 class Cart(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Bumped by every CartService mutation; used for ETags
+    revision = models.PositiveIntegerField(default=0)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='unique_cart_per_user'),
+        ]
+        indexes = [
+            # Inactive carts, for the sweeper
+            models.Index(fields=['updated_at'], name='cart_updated_idx'),
+        ]
 
     def total_price(self):
-        return sum(item.total_price() for item in self.items.all())
+        # Use the value annotated by with_totals() when available
+        if hasattr(self, 'total_amount'):
+            return self.total_amount
+        return self.items.totals()['total_price']
 
     def __str__(self):
         return f"Cart for {self.user.username}"
@@ -93,13 +281,43 @@ class CartItem(models.Model):
     part = models.ForeignKey(PartUnified, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'part'], name='unique_cart_item_per_part'),
+        ]
+
     def total_price(self):
+        # Use the value annotated by with_parts() when available
+        if hasattr(self, 'line_total'):
+            return self.line_total
         return self.part.price * self.quantity
 
     def __str__(self):
         return f"{self.quantity} x {self.part.name}"
 
 
+class StockReservation(models.Model):
+    """
+    Inventory held by a cart for a part. Stock is taken from
+    PartUnified.inventory when the reservation is made and returned
+    when it is released or expires.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    part = models.ForeignKey(PartUnified, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'part'], name='unique_reservation_per_cart_part'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x part #{self.part_id} for cart #{self.cart_id}"
+
 
 class Order(models.Model):
     POST_TYPE_CHOICES = (
@@ -114,30 +332,137 @@ class Order(models.Model):
     )
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
-    items = models.ManyToManyField(CartItem)
     total_price = models.PositiveIntegerField()
     created_at = models.DateTimeField(default=timezone.now)
 
     post_type = models.CharField(max_length=10, choices=POST_TYPE_CHOICES, default='post')
     delivery_date = models.DateField(null=True, blank=True)
 
-    order_code = models.CharField(max_length=10, unique=True, editable=False, default=0000000000)
+    # NULL until the code is assigned; the unique index ignores NULLs
+    order_code = models.CharField(max_length=10, unique=True, editable=False, null=True, blank=True, default=None)
     order_status = models.CharField(max_length=10, choices=ORDER_STATUS, default='waiting')
 
+    # Fresh codes tried before giving up on a unique-index conflict
+    ORDER_CODE_ATTEMPTS = 5
+
+    class Meta:
+        indexes = [
+            # A user's orders, newest first
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            models.Index(fields=['order_status', 'created_at'], name='order_status_created_idx'),
+            # Newest first, the admin changelist order
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
     def generate_unique_code(self):
-        chars = string.ascii_uppercase + string.digits
-        while True:
-            code = ''.join(random.choices(chars, k=10))
-            if not Order.objects.filter(order_code=code).exists():
-                return code
+        from .order_codes import get_order_code_generator
+        return get_order_code_generator().generate(self)
 
     def save(self, *args, **kwargs):
-        if not self.order_code:
-            self.order_code = self.generate_unique_code()
-        super().save(*args, **kwargs)
+        from .order_codes import get_order_code_generator
+
+        if self.order_code:
+            return super().save(*args, **kwargs)
+
+        generator = get_order_code_generator()
+        if generator.needs_primary_key:
+            with transaction.atomic(using=kwargs.get('using')):
+                super().save(*args, **kwargs)
+                self.order_code = generator.generate(self)
+                Order.objects.using(self._state.db).filter(pk=self.pk).update(order_code=self.order_code)
+            return
+
+        # No pre-check query: the unique index on order_code is the guard
+        for attempt in range(self.ORDER_CODE_ATTEMPTS):
+            self.order_code = generator.generate(self)
+            try:
+                with transaction.atomic(using=kwargs.get('using')):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                code_taken = Order.objects.db_manager(kwargs.get('using')).filter(order_code=self.order_code).exists()
+                self.order_code = None
+                if not code_taken or attempt == self.ORDER_CODE_ATTEMPTS - 1:
+                    raise
+
+
+class OrderItem(models.Model):
+    """
+    Immutable snapshot of a cart line taken at checkout. Name and price are
+    copied so the order does not change when the part is edited or removed.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    part = models.ForeignKey(PartUnified, on_delete=models.SET_NULL, null=True, related_name='order_items')
+    part_name = models.CharField(max_length=255)
+    unit_price = models.PositiveIntegerField()
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+
+    def total_price(self):
+        return self.unit_price * self.quantity
+
+    def __str__(self):
+        return f"{self.quantity} x {self.part_name}"
+
+
+class PaymentEvent(models.Model):
+    """
+    A payment gateway callback, recorded once per idempotency key so that
+    retried or replayed callbacks are acknowledged without being re-applied.
+    """
+    OUTCOME_CHOICES = (
+        ('applied', 'applied'),
+        ('ignored', 'ignored'),
+    )
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payment_events')
+    status = models.CharField(max_length=20)
+    # applied: moved the order out of 'waiting'; ignored: the order was already final
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.idempotency_key} ({self.outcome})"
+
+
+class OutboxMessage(models.Model):
+    """
+    Notification written in the same transaction as the change that caused it
+    and delivered later by the outbox worker (see NotificationService).
+    """
+    CHANNEL_CHOICES = (
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'pending'),
+        ('sending', 'sending'),
+        ('sent', 'sent'),
+        ('failed', 'failed'),
+    )
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    # Set for invoice messages; the body is rendered by the worker at delivery
+    order = models.ForeignKey(
+        'Order', on_delete=models.CASCADE, null=True, blank=True, related_name='notifications'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
 
 
 # --------------------------------------------
@@ -154,3 +479,6 @@ class Person(AbstractUser):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='person_created_idx'),
+        ]
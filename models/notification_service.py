@@ -0,0 +1,138 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxMessage
+from .invoice_service import InvoiceService
+
+
+logger = logging.getLogger(__name__)
+
+
+def send_to_phone(phone, message):
+    print(message)
+
+
+class NotificationService:
+    """
+    Transactional outbox for order notifications.
+
+    Requests only insert OutboxMessage rows (inside their own transaction);
+    ``drain`` delivers them in batches, reusing one mail connection per batch
+    and retrying failures with exponential backoff.
+    """
+
+    # Seconds a worker may hold claimed messages before others retry them
+    claim_timeout = 5 * 60
+    # Delay before the first retry; doubled on every further attempt
+    retry_delay = 30
+    max_attempts = 6
+
+    @staticmethod
+    def enqueue_email(recipient, subject, body):
+        return OutboxMessage.objects.create(
+            channel='email', recipient=recipient, subject=subject, body=body
+        )
+
+    @staticmethod
+    def enqueue_invoice_sms(order):
+        """
+        Queue the invoice of the order by SMS without rendering it now.
+        """
+        return OutboxMessage.objects.create(channel='sms', recipient=order.user.phone_number, order=order)
+
+    @staticmethod
+    def claim(batch_size, now=None):
+        """
+        Reserve up to ``batch_size`` due messages for this worker.
+        Messages left in ``sending`` by a crashed worker become due again
+        once their claim times out.
+        """
+        now = now or timezone.now()
+        due = Q(status='pending') | Q(status='sending')
+        ids = list(
+            OutboxMessage.objects.filter(due, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        lease = now + timedelta(seconds=NotificationService.claim_timeout)
+        # Conditional update so two workers never claim the same row
+        OutboxMessage.objects.filter(id__in=ids, next_attempt_at__lte=now).filter(due).update(
+            status='sending', next_attempt_at=lease, attempts=F('attempts') + 1
+        )
+        return list(OutboxMessage.objects.filter(id__in=ids, status='sending', next_attempt_at=lease))
+
+    @staticmethod
+    def drain(batch_size=100, now=None):
+        """
+        Deliver one batch of due messages. Returns ``(sent, failed)``.
+        """
+        messages = NotificationService.claim(batch_size, now)
+        if not messages:
+            return 0, 0
+
+        sent, failed = [], []
+        for message in messages:
+            if message.order_id and not message.body:
+                try:
+                    message.body = NotificationService.render_invoice(message)
+                except Exception as error:
+                    failed.append((message, error))
+        unrendered = {message.pk for message, _ in failed}
+        messages = [message for message in messages if message.pk not in unrendered]
+
+        emails = [message for message in messages if message.channel == 'email']
+        if emails:
+            connection = get_connection()
+            try:
+                connection.open()
+                for message in emails:
+                    try:
+                        connection.send_messages([EmailMessage(
+                            message.subject, message.body, settings.DEFAULT_FROM_EMAIL, [message.recipient],
+                        )])
+                        sent.append(message)
+                    except Exception as error:
+                        failed.append((message, error))
+            except Exception as error:
+                failed.extend((message, error) for message in emails if message not in sent)
+            finally:
+                connection.close()
+
+        for message in messages:
+            if message.channel == 'sms':
+                try:
+                    send_to_phone(message.recipient, message.body)
+                    sent.append(message)
+                except Exception as error:
+                    failed.append((message, error))
+
+        OutboxMessage.objects.filter(id__in=[message.id for message in sent]).update(
+            status='sent', sent_at=timezone.now(), last_error=''
+        )
+        for message, error in failed:
+            NotificationService.schedule_retry(message, error)
+        return len(sent), len(failed)
+
+    @staticmethod
+    def render_invoice(message):
+        body = InvoiceService.render(InvoiceService.load(pk=message.order_id))
+        # Kept so a retry does not render it again
+        OutboxMessage.objects.filter(pk=message.pk).update(body=body)
+        return body
+
+    @staticmethod
+    def schedule_retry(message, error):
+        logger.warning("Delivering outbox message %s failed: %s", message.id, error)
+        if message.attempts >= NotificationService.max_attempts:
+            status, next_attempt_at = 'failed', message.next_attempt_at
+        else:
+            delay = NotificationService.retry_delay * 2 ** (message.attempts - 1)
+            status, next_attempt_at = 'pending', timezone.now() + timedelta(seconds=delay)
+        OutboxMessage.objects.filter(id=message.id).update(
+            status=status, next_attempt_at=next_attempt_at, last_error=str(error)
+        )
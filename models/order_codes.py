@@ -0,0 +1,125 @@
+import functools
+import hashlib
+import secrets
+import string
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+ALPHABET = string.ascii_uppercase + string.digits
+BASE = len(ALPHABET)
+# 9 payload characters plus 1 check character
+PAYLOAD_LENGTH = 9
+SPACE = BASE ** PAYLOAD_LENGTH
+# SPACE == HALF ** 2, so a number below SPACE splits into two halves for the Feistel rounds
+HALF = 6 ** PAYLOAD_LENGTH
+ROUNDS = 6
+
+
+def check_character(payload):
+    """
+    Weighted MOD 36 checksum over the payload characters.
+    """
+    total = sum((index + 1) * ALPHABET.index(char) for index, char in enumerate(payload))
+    return ALPHABET[total % BASE]
+
+
+def is_valid_code(code):
+    return (
+        len(code) == PAYLOAD_LENGTH + 1
+        and all(char in ALPHABET for char in code)
+        and check_character(code[:-1]) == code[-1]
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def _round_key(secret):
+    return hashlib.blake2b(secret.encode(), digest_size=32, person=b'order-codes').digest()
+
+
+def permute(number, secret):
+    """
+    Keyed permutation of 0..SPACE-1: a Feistel network over the two base-HALF
+    halves of the number, with rounds keyed by ``secret``. Without the secret,
+    the codes of other numbers cannot be computed from known ones.
+    """
+    key = _round_key(secret)
+    left, right = divmod(number % SPACE, HALF)
+    for index in range(ROUNDS):
+        digest = hashlib.blake2b(f'{index}:{right}'.encode(), digest_size=8, key=key).digest()
+        left, right = right, (left + int.from_bytes(digest, 'big')) % HALF
+    return left * HALF + right
+
+
+def encode(number, secret=None):
+    """
+    Map a number to a 10-character code. Distinct numbers below
+    SPACE always give distinct codes, and consecutive numbers do not look
+    consecutive. ``secret`` defaults to ORDER_CODE_SECRET (or SECRET_KEY).
+    """
+    if secret is None:
+        secret = getattr(settings, 'ORDER_CODE_SECRET', None) or settings.SECRET_KEY
+    value = permute(number, secret)
+    chars = []
+    for _ in range(PAYLOAD_LENGTH):
+        value, digit = divmod(value, BASE)
+        chars.append(ALPHABET[digit])
+    payload = ''.join(reversed(chars))
+    return payload + check_character(payload)
+
+
+class OrderCodeGenerator:
+    """
+    Base class for ORDER_CODE_GENERATOR implementations.
+    """
+    # When True, Order.save() inserts the row first and calls generate() with its pk
+    needs_primary_key = False
+
+    def generate(self, order):
+        raise NotImplementedError
+
+
+class RandomOrderCodeGenerator(OrderCodeGenerator):
+    """
+    Random payload from a CSPRNG. Collisions are possible but rare; the unique
+    index on Order.order_code catches them and Order.save() retries.
+    """
+
+    def generate(self, order):
+        payload = ''.join(secrets.choice(ALPHABET) for _ in range(PAYLOAD_LENGTH))
+        return payload + check_character(payload)
+
+
+class PrimaryKeyOrderCodeGenerator(OrderCodeGenerator):
+    """
+    Collision-free codes derived from the order's primary key. The code is
+    written right after the insert, in the same transaction, so it needs no
+    lookup, no retry and no shared state between processes.
+
+    The mapping is keyed by ORDER_CODE_SECRET, so order codes cannot be
+    guessed from the sequential keys. Keep the secret fixed once codes are
+    issued: under a new one, a new order can get the code of an old one and
+    fail to save.
+    """
+    needs_primary_key = True
+
+    def generate(self, order):
+        return encode(order.pk)
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_order_code_generator():
+    """
+    The process-wide generator configured by ORDER_CODE_GENERATOR.
+    """
+    global _generator
+    with _generator_lock:
+        if _generator is None:
+            path = getattr(settings, 'ORDER_CODE_GENERATOR', 'models.order_codes.PrimaryKeyOrderCodeGenerator')
+            _generator = import_string(path)()
+        return _generator
@@ -0,0 +1,68 @@
+from django.db import IntegrityError, transaction
+
+from .models import Order, PaymentEvent
+from .notification_service import NotificationService
+
+
+class PaymentService:
+    """
+    Idempotent handling of payment gateway callbacks.
+
+    Every callback costs a fixed handful of queries: the order is read once,
+    its status changes only through a conditional UPDATE from 'waiting', and
+    the invoice SMS is queued for the outbox worker instead of being built in
+    the request. A callback seen before (same idempotency key) changes nothing.
+    """
+    # Gateway payment status -> order status
+    STATUSES = {'success': 'paied', 'failed': 'failed'}
+
+    @staticmethod
+    def idempotency_key(order_code, payment_status, key=None):
+        # Gateways that send no event id are deduplicated per (order, status)
+        return key or f'{order_code}:{payment_status}'
+
+    @staticmethod
+    def handle_callback(order_code, payment_status, key=None):
+        """
+        Apply a callback. Returns ``(order, outcome)`` where outcome is
+        'applied', 'ignored' (the order was already paid or failed) or
+        'duplicate', and ``order`` holds the status after the callback.
+        Raises ValueError for a status not in STATUSES and Order.DoesNotExist
+        for an unknown order code.
+        """
+        if payment_status not in PaymentService.STATUSES:
+            raise ValueError(f"Unknown payment status: {payment_status!r}")
+        order = Order.objects.only('id', 'order_code', 'order_status', 'user__phone_number').select_related(
+            'user'
+        ).get(order_code=order_code)
+        new_status = PaymentService.STATUSES[payment_status]
+        key = PaymentService.idempotency_key(order_code, payment_status, key)
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    # Only 'waiting' orders move, so late or out-of-order callbacks cannot flip a final status
+                    applied = Order.objects.filter(pk=order.pk, order_status='waiting').update(
+                        order_status=new_status
+                    )
+                    PaymentEvent.objects.create(
+                        idempotency_key=key, order_id=order.pk, status=payment_status,
+                        outcome='applied' if applied else 'ignored',
+                    )
+            except IntegrityError:
+                # Only a replayed idempotency key is a duplicate
+                if not PaymentEvent.objects.filter(idempotency_key=key).exists():
+                    raise
+                applied, outcome = 0, 'duplicate'
+            else:
+                outcome = 'applied' if applied else 'ignored'
+
+            if applied:
+                order.order_status = new_status
+                if new_status == 'paied':
+                    NotificationService.enqueue_invoice_sms(order)
+
+        if not applied and order.order_status == 'waiting':
+            # Another callback finished the order after it was read
+            order.refresh_from_db(fields=['order_status'])
+        return order, outcome
@@ -0,0 +1,132 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .compatibility_service import CompatibilityService
+
+
+# Text columns covered by the full-text index (migration 0009)
+SEARCH_COLUMNS = ('name', 'commercial_code', 'internal_code', 'category_title', 'description')
+
+SQLITE_FTS_TABLE = 'models_partunified_fts'
+# Must stay the expression of part_search_gin_idx for PostgreSQL to use it
+POSTGRES_TSVECTOR = "to_tsvector('simple', {})".format(
+    " || ' ' || ".join(f"coalesce({column}, '')" for column in SEARCH_COLUMNS)
+)
+
+
+class PartSearchService:
+    """
+    Catalog search over PartUnified.
+
+    Free text goes through the full-text index created by migration 0009
+    (an FTS5 table on SQLite, a GIN index on PostgreSQL); structured filters
+    hit the B-tree indexes declared on the model. Other databases fall back
+    to ``icontains``.
+    """
+
+    # alias -> whether the full-text index exists, resolved once per process
+    _installed = {}
+
+    @staticmethod
+    def has_index(using=DEFAULT_DB_ALIAS):
+        if using not in PartSearchService._installed:
+            connection = connections[using]
+            if connection.vendor == 'sqlite':
+                installed = SQLITE_FTS_TABLE in connection.introspection.table_names()
+            else:
+                installed = connection.vendor == 'postgresql'
+            PartSearchService._installed[using] = installed
+        return PartSearchService._installed[using]
+
+    @staticmethod
+    def match(queryset, text):
+        """
+        Restrict the queryset to parts whose text columns contain every word of ``text``.
+        """
+        words = text.split()
+        if not words:
+            return queryset
+
+        using = queryset.db
+        vendor = connections[using].vendor
+        if PartSearchService.has_index(using):
+            if vendor == 'sqlite':
+                # Quote each word so user input is never parsed as FTS5 syntax
+                terms = ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+                return queryset.filter(pk__in=RawSQL(
+                    f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s", [terms]
+                ))
+            if vendor == 'postgresql':
+                prefix_query = ' & '.join(
+                    "{}:*".format(''.join(ch for ch in word if ch.isalnum())) for word in words
+                    if any(ch.isalnum() for ch in word)
+                )
+                if prefix_query:
+                    return queryset.alias(search_match=RawSQL(
+                        f"{POSTGRES_TSVECTOR} @@ to_tsquery('simple', %s)", [prefix_query],
+                        output_field=BooleanField(),
+                    )).filter(search_match=True)
+
+        for word in words:
+            condition = Q()
+            for column in SEARCH_COLUMNS:
+                condition |= Q(**{f'{column}__icontains': word})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    @staticmethod
+    def match_code_prefix(queryset, prefix):
+        """
+        Restrict the queryset to parts whose commercial or internal code
+        starts with ``prefix`` (case-sensitive), in a form the code indexes serve.
+        """
+        if connections[queryset.db].vendor == 'postgresql':
+            return queryset.filter(Q(commercial_code__startswith=prefix) | Q(internal_code__startswith=prefix))
+        # A range on the column, because SQLite's LIKE is case-insensitive and skips the index
+        end = prefix + '\U0010ffff'
+        return queryset.filter(
+            Q(commercial_code__gte=prefix, commercial_code__lt=end)
+            | Q(internal_code__gte=prefix, internal_code__lt=end)
+        )
+
+    @staticmethod
+    def filter_queryset(queryset, params):
+        """
+        Apply the catalog search filters from a query-parameter mapping.
+        Raises ValueError for malformed values.
+        """
+        code = params.get('code')
+        if code:
+            queryset = queryset.filter(Q(commercial_code=code) | Q(internal_code=code))
+
+        for name in ('part_type', 'turnover', 'category_title'):
+            value = params.get(name)
+            if value:
+                queryset = queryset.filter(**{name: value})
+
+        if params.get('min_price'):
+            queryset = queryset.filter(price__gte=int(params['min_price']))
+        if params.get('max_price'):
+            queryset = queryset.filter(price__lte=int(params['max_price']))
+
+        in_stock = params.get('in_stock')
+        if in_stock in ('1', 'true', 'True'):
+            queryset = queryset.filter(inventory__gt=0)
+        elif in_stock in ('0', 'false', 'False'):
+            queryset = queryset.filter(inventory__lte=0)
+
+        # ?car= is a Car id when numeric; ?car_name= for names like '206'
+        car = params.get('car')
+        if car:
+            queryset = CompatibilityService.filter_parts(queryset, int(car) if car.isdigit() else car)
+        car_name = params.get('car_name')
+        if car_name:
+            queryset = CompatibilityService.filter_parts(queryset, car_name)
+
+        text = params.get('q')
+        if text:
+            queryset = PartSearchService.match(queryset, text)
+
+        return queryset
+
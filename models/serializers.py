@@ -1,37 +1,141 @@
 from rest_framework import serializers
-from .models import PartUnified, CartItem, Person, Order
+from .models import PartUnified, CartItem, Person, Order, OrderItem
+from .metrics_service import serialization, timed_serialization
+
+
+PART_FIELDS = [
+    'id', 'name', 'internal_code', 'commercial_code', 'price',
+    'cars', 'description', 'category_title', 'category_url',
+    'category_description', 'image_urls', 'part_type',
+    'turnover', 'inventory'
+]
+
+# Named field sets clients can ask for with ?profile=<name>
+PART_FIELD_PROFILES = {
+    'full': PART_FIELDS,
+    'compact': ['id', 'name', 'commercial_code', 'price', 'part_type', 'inventory'],
+}
+
+
+class TimedRepresentationMixin:
+    """
+    Count to_representation() as serializer time of the current request.
+    """
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+class PartUnifiedSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    """
+    Accepts an optional ``fields`` argument to emit only a subset of the part fields.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
-class PartUnifiedSerializer(serializers.ModelSerializer):
     class Meta:
         model = PartUnified
-        fields = [
-            'id', 'name', 'internal_code', 'commercial_code', 'price',
-            'cars', 'description', 'category_title', 'category_url',
-            'category_description', 'image_urls', 'part_type',
-            'turnover', 'inventory'
-        ]
-
-class CartItemSerializer(serializers.ModelSerializer):
+        fields = PART_FIELDS
+
+class CartItemSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     part = PartUnifiedSerializer()
 
+    def __init__(self, *args, **kwargs):
+        part_fields = kwargs.pop('part_fields', None)
+        super().__init__(*args, **kwargs)
+        if part_fields is not None:
+            self.fields['part'] = PartUnifiedSerializer(fields=part_fields)
+
     class Meta:
         model = CartItem
         fields = ['id', 'part', 'quantity']
 
-class OrderSerializer(serializers.ModelSerializer):
-    items = serializers.PrimaryKeyRelatedField(many=True, queryset=CartItem.objects.all())
+
+@serialization
+def serialize_parts(parts, fields=PART_FIELDS):
+    """
+    Fast path for list endpoints: same output as PartUnifiedSerializer,
+    built with plain attribute access instead of DRF fields per object.
+    """
+    return [{name: getattr(part, name) for name in fields} for part in parts]
+
+
+@serialization
+def serialize_cart_items(items, part_fields=PART_FIELDS):
+    """
+    Fast path equivalent of CartItemSerializer(items, many=True).data.
+    """
+    return [
+        {
+            'id': item.id,
+            'part': {name: getattr(item.part, name) for name in part_fields},
+            'quantity': item.quantity,
+        }
+        for item in items
+    ]
+
+class CartChangeSerializer(serializers.Serializer):
+    """
+    One operation of a batch cart update.
+    """
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'])
+    part_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] == 'add':
+            attrs.setdefault('quantity', 1)
+            if attrs['quantity'] < 1:
+                raise serializers.ValidationError({'quantity': 'Quantity must be at least 1.'})
+        elif attrs['op'] == 'set' and 'quantity' not in attrs:
+            raise serializers.ValidationError({'quantity': 'This field is required.'})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartChangeSerializer(many=True, allow_empty=False, max_length=200)
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'part', 'part_name', 'unit_price', 'quantity']
+
+class OrderSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Order
         fields = ['user', 'post_type', 'delivery_date', 'total_price', 'items', 'order_code', 'order_status']
-        read_only_fields = ['order_code']
-
-    def create(self, validated_data):
-        items = validated_data.pop('items', [])
-        order = Order.objects.create(**validated_data)
-        order.items.set(items)
-        return order
+        read_only_fields = ['user', 'total_price', 'order_code', 'order_status']
     
+class OrderSummarySerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ['order_code', 'created_at', 'post_type', 'delivery_date', 'total_price', 'order_status']
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    # None once the part has been deleted from the catalog
+    part = PartUnifiedSerializer(read_only=True, allow_null=True, fields=PART_FIELD_PROFILES['compact'])
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'part', 'part_name', 'unit_price', 'quantity']
+
+
+class OrderDetailSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    items = OrderLineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['order_code', 'created_at', 'post_type', 'delivery_date', 'total_price', 'order_status', 'items']
+
+
 class PersonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Person
@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .inventory_service import InventoryService
+from .models import Cart, CartItem, StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+class SweeperService:
+    """
+    Periodic cleanup of abandoned carts.
+
+    Expired reservations and the reservations of carts idle for longer than
+    ``CART_ABANDON_AFTER`` are returned to inventory. The lines of those idle
+    carts are deleted once their stock is back, and then the carts
+    themselves. Work is done in chunks of
+    ``SWEEPER_CHUNK_SIZE`` rows, each in its own short transaction, so the
+    cart and part tables are never locked for long.
+    """
+    _scheduler = None
+    _scheduler_lock = threading.Lock()
+
+    @staticmethod
+    def chunk_size():
+        return getattr(settings, 'SWEEPER_CHUNK_SIZE', 1000)
+
+    @staticmethod
+    def cutoff(now=None):
+        now = now or timezone.now()
+        return now - timedelta(seconds=getattr(settings, 'CART_ABANDON_AFTER', 24 * 60 * 60))
+
+    @staticmethod
+    def sweep(now=None, chunk_size=None):
+        """
+        Run one sweep and return its metrics as a dict.
+        """
+        now = now or timezone.now()
+        chunk_size = chunk_size or SweeperService.chunk_size()
+        cutoff = SweeperService.cutoff(now)
+        started = time.perf_counter()
+        metrics = {'reservations': 0, 'units': 0, 'lines': 0, 'carts': 0, 'chunks': 0}
+
+        for reservations in (
+            StockReservation.objects.filter(expires_at__lte=now).order_by('expires_at'),
+            StockReservation.objects.filter(cart__updated_at__lt=cutoff).order_by('pk'),
+        ):
+            while True:
+                released, units = InventoryService.release_chunk(reservations, chunk_size)
+                metrics['reservations'] += released
+                metrics['units'] += units
+                metrics['chunks'] += bool(released)
+                if released < chunk_size:
+                    break
+
+        for delete, metric in (
+            (SweeperService.delete_abandoned_lines, 'lines'),
+            (SweeperService.delete_empty_carts, 'carts'),
+        ):
+            while True:
+                deleted = delete(cutoff, chunk_size)
+                metrics[metric] += deleted
+                metrics['chunks'] += bool(deleted)
+                if deleted < chunk_size:
+                    break
+
+        metrics['seconds'] = time.perf_counter() - started
+        rows = metrics['reservations'] + metrics['lines'] + metrics['carts']
+        metrics['rows_per_second'] = rows / metrics['seconds'] if metrics['seconds'] else 0.0
+        return metrics
+
+    @staticmethod
+    def delete_abandoned_lines(cutoff, chunk_size):
+        """
+        Delete up to ``chunk_size`` lines of carts idle since before ``cutoff``
+        whose reservation has been released. Returns the number of lines deleted.
+        """
+        abandoned = CartItem.objects.filter(
+            ~Exists(StockReservation.objects.filter(cart=OuterRef('cart'), part=OuterRef('part'))),
+            cart__updated_at__lt=cutoff,
+        )
+        pks = list(abandoned.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return 0
+        # Conditions are checked again so a cart touched meanwhile keeps its lines
+        _, deleted = abandoned.filter(pk__in=pks).delete()
+        return deleted.get(CartItem._meta.label, 0)
+
+    @staticmethod
+    def delete_empty_carts(cutoff, chunk_size):
+        """
+        Delete up to ``chunk_size`` carts idle since before ``cutoff`` that have
+        no lines or reservations. Returns the number of carts deleted.
+        """
+        empty = Cart.objects.filter(
+            ~Exists(CartItem.objects.filter(cart=OuterRef('pk'))),
+            ~Exists(StockReservation.objects.filter(cart=OuterRef('pk'))),
+            updated_at__lt=cutoff,
+        )
+        pks = list(empty.order_by('updated_at').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return 0
+        # Conditions are checked again so a cart touched meanwhile survives
+        _, deleted = empty.filter(pk__in=pks).delete()
+        return deleted.get(Cart._meta.label, 0)
+
+    @staticmethod
+    def start_scheduler(interval=None):
+        """
+        Sweep every ``interval`` seconds on a daemon thread of this process.
+        Only one scheduler is started per process.
+        """
+        interval = interval or getattr(settings, 'CART_SWEEPER_INTERVAL', 5 * 60)
+        with SweeperService._scheduler_lock:
+            if SweeperService._scheduler is not None:
+                return SweeperService._scheduler
+            thread = threading.Thread(
+                target=SweeperService._run, args=(interval,), name='cart-sweeper', daemon=True
+            )
+            thread.start()
+            SweeperService._scheduler = thread
+            return thread
+
+    @staticmethod
+    def _run(interval):
+        while True:
+            time.sleep(interval)
+            close_old_connections()
+            try:
+                metrics = SweeperService.sweep()
+            except Exception:
+                logger.exception("Cart sweep failed")
+            else:
+                if metrics['chunks']:
+                    logger.info("Cart sweep: %s", SweeperService.describe(metrics))
+            finally:
+                close_old_connections()
+
+    @staticmethod
+    def describe(metrics):
+        return (
+            f"reservations={metrics['reservations']} units={metrics['units']} lines={metrics['lines']} "
+            f"carts={metrics['carts']} "
+            f"chunks={metrics['chunks']} seconds={metrics['seconds']:.3f} "
+            f"rows_per_s={metrics['rows_per_second']:.1f}"
+        )
@@ -1,3 +1,1268 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import threading
+import warnings
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import IntegrityError, connection, reset_queries, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import db_router, order_codes
+from .admin import EstimatedCountPaginator, estimated_count
+from .authentication import CachedTokenAuthentication, check_token_cache
+from .cache_service import CatalogCacheService
+from .cart_service import CartService
+from .catalog_service import CatalogService
+from .inventory_service import InsufficientStockError, InventoryService
+from .invoice_service import InvoiceService
+from .metrics_service import MetricsService, RequestMetrics
+from .notification_service import NotificationService
+from .payment_service import PaymentService
+from .search_service import SQLITE_FTS_TABLE, PartSearchService
+from .sweeper_service import SweeperService
+from .models import (
+    Car, Cart, CartItem, Order, OrderItem, OutboxMessage, PartCategory, PartUnified, PaymentEvent, Person,
+    StockReservation,
+)
+
+
+def hot_queries():
+    """
+    The lookups on the cart and checkout paths, as (name, queryset) pairs.
+    """
+    now = timezone.now()
+    return [
+        ('cart of a user', Cart.objects.filter(user_id=1)),
+        ('cart line of a part', CartItem.objects.filter(cart_id=1, part_id=1)),
+        ('lines of a cart', CartItem.objects.filter(cart_id=1)),
+        ('reservation of a cart line', StockReservation.objects.filter(cart_id=1, part_id=1)),
+        ('expired reservations', StockReservation.objects.filter(expires_at__lte=now)),
+        ('inactive carts', Cart.objects.filter(updated_at__lt=now).order_by('updated_at')[:1000]),
+        ('orders of a user, newest first', Order.objects.filter(user_id=1).order_by('-created_at')[:20]),
+        ('orders by status', Order.objects.filter(order_status='waiting').order_by('created_at')[:100]),
+        ('order by code', Order.objects.filter(order_code='AAAAAAAAAA')),
+        ('newest people', Person.objects.order_by('-created_at')[:50]),
+        ('catalog page by price', PartUnified.objects.filter(price__gt=1000).order_by('price', 'id')[:50]),
+    ]
+
+
+class HotQueryPlanTests(TestCase):
+    """
+    The hot cart and order queries read an index in order instead of
+    scanning a whole table or sorting.
+    """
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f"Plans of {connection.vendor} are not checked.")
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny tables make sequential scans cheapest; ask whether an index *can* be used
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                return queryset.explain()
+        return queryset.explain()
+
+    @staticmethod
+    def problem(plan):
+        for line in plan.splitlines():
+            line = line.strip()
+            if connection.vendor == 'sqlite':
+                if line.startswith('SCAN') and ' USING ' not in line:
+                    return "full table scan"
+                if 'TEMP B-TREE' in line:
+                    return "sort in a temporary b-tree"
+            else:
+                if 'Seq Scan' in line:
+                    return "sequential scan"
+                if line.lstrip('-> ').startswith('Sort'):
+                    return "explicit sort"
+        return None
+
+    def test_hot_queries_use_an_index(self):
+        for name, queryset in hot_queries():
+            with self.subTest(name):
+                plan = self.explain(queryset)
+                self.assertIsNone(self.problem(plan), plan)
+                if connection.vendor == 'sqlite':
+                    self.assertRegex(plan, r'(SEARCH|SCAN) \S+ USING (COVERING |INTEGER PRIMARY KEY|INDEX)')
+
+
+class CartFixtures:
+    """
+    Users, parts and carts shared by the test cases below.
+    """
+
+    @staticmethod
+    def make_user(username='buyer', **extra):
+        return Person.objects.create(username=username, email=f'{username}@example.com', **extra)
+
+    @staticmethod
+    def make_parts(count, inventory=100, start=0):
+        return [
+            PartUnified.objects.create(
+                name=f'Part {index}', commercial_code=f'C{index}', internal_code=f'I{index}',
+                price=1000 * (index + 1), cars='-', inventory=inventory,
+            )
+            for index in range(start, start + count)
+        ]
+
+    @staticmethod
+    def fill_cart(user, parts, quantity=2):
+        for part in parts:
+            CartService.add_to_cart(user, part, quantity=quantity)
+        return CartService.get_or_create_cart(user)
+
+
+class CartQueryCountTests(CartFixtures, TestCase):
+    """
+    Loading a cart costs the same number of queries whatever its size.
+    """
+
+    def test_cart_summary(self):
+        user = self.make_user()
+        cart = self.fill_cart(user, self.make_parts(3))
+        with self.assertNumQueries(2):
+            summary = CartService.get_cart_summary(user, cart=cart)
+        self.assertEqual(summary['item_count'], 3)
+        self.assertEqual(summary['total_price'], 2 * (1000 + 2000 + 3000))
+
+        self.fill_cart(user, self.make_parts(5, start=3))
+        with self.assertNumQueries(2):
+            summary = CartService.get_cart_summary(user, cart=cart)
+        self.assertEqual(len(summary['items']), 8)
+        with self.assertNumQueries(0):
+            [item.total_price() for item in summary['items']]
+
+    def test_cart_total_price(self):
+        user = self.make_user()
+        self.fill_cart(user, self.make_parts(3))
+        cart = Cart.objects.with_totals().get(user=user)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.total_price(), 12000)
+        cart = Cart.objects.get(user=user)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.total_price(), 12000)
+
+    def test_cart_admin_changelist(self):
+        admin = self.make_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        parts = self.make_parts(3)
+        url = reverse('admin:models_cart_changelist')
+
+        self.fill_cart(self.make_user('first'), parts[:1])
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for index in range(5):
+            self.fill_cart(self.make_user(f'buyer{index}'), parts)
+        with self.assertNumQueries(len(captured)):
+            response = self.client.get(url)
+        self.assertContains(response, '6 carts')
+
+
+
+class ReservationTests(CartFixtures, TestCase):
+    """
+    Stock is taken when a line is added and given back when it is removed.
+    """
+
+    def setUp(self):
+        self.user = self.make_user()
+        self.parts = self.make_parts(2, inventory=5)
+        self.cart = self.fill_cart(self.user, self.parts, quantity=2)
+        self.client.force_login(self.user)
+
+    def inventory(self):
+        return list(
+            PartUnified.objects.filter(pk__in=[part.pk for part in self.parts]).order_by('pk')
+            .values_list('inventory', flat=True)
+        )
+
+    def test_add_takes_stock(self):
+        self.assertEqual(self.inventory(), [3, 3])
+        with self.assertRaises(InsufficientStockError):
+            CartService.add_to_cart(self.user, self.parts[0], quantity=4)
+        self.assertEqual(self.inventory(), [3, 3])
+        self.assertEqual(CartItem.objects.get(cart=self.cart, part=self.parts[0]).quantity, 2)
+
+    def test_remove_from_cart(self):
+        CartService.remove_from_cart(self.user, self.parts[0])
+        self.assertEqual(self.inventory(), [5, 3])
+        self.assertFalse(StockReservation.objects.filter(cart=self.cart, part=self.parts[0]).exists())
+
+    def test_delete_cart_item_view(self):
+        item = CartItem.objects.get(cart=self.cart, part=self.parts[1])
+        response = self.client.delete(reverse('delete-cart-item', args=[item.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.inventory(), [3, 5])
+        self.assertFalse(StockReservation.objects.filter(cart=self.cart, part=self.parts[1]).exists())
+
+    def test_clear_cart_view(self):
+        response = self.client.delete(reverse('clear-cart'))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.inventory(), [5, 5])
+        self.assertFalse(StockReservation.objects.filter(cart=self.cart).exists())
+        self.assertFalse(self.cart.items.exists())
+
+
+class ConcurrentReservationTests(CartFixtures, TransactionTestCase):
+    """
+    Concurrent adds never reserve more than the stock.
+    """
+
+    def test_no_oversell(self):
+        stock, threads, adds = 30, 4, 15
+        part = self.make_parts(1, inventory=stock)[0]
+        users = [self.make_user(f'buyer-{index}') for index in range(threads)]
+        accepted, errors = [], []
+
+        def buyer(user):
+            try:
+                for _ in range(adds):
+                    try:
+                        CartService.add_to_cart(user, part, quantity=1)
+                    except InsufficientStockError:
+                        continue
+                    accepted.append(user.pk)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buyer, args=(user,)) for user in users]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        part.refresh_from_db()
+        in_carts = CartItem.objects.filter(part=part).aggregate(total=Sum('quantity'))['total']
+        reserved = StockReservation.objects.filter(part=part).aggregate(total=Sum('quantity'))['total']
+        self.assertEqual(len(accepted), stock)
+        self.assertEqual(in_carts, stock)
+        self.assertEqual(reserved, stock)
+        self.assertEqual(part.inventory, 0)
+
+class CheckoutTests(CartFixtures, TestCase):
+    """
+    finalize_order snapshots the cart into an order exactly once.
+    """
+
+    def test_checkout_query_count(self):
+        small, large = self.make_user('small'), self.make_user('large')
+        parts = self.make_parts(8)
+        self.fill_cart(small, parts[:2])
+        self.fill_cart(large, parts)
+        with CaptureQueriesContext(connection) as captured:
+            CartService.finalize_order(small)
+        with self.assertNumQueries(len(captured)):
+            CartService.finalize_order(large)
+
+    def test_checkout_snapshots_the_cart(self):
+        user = self.make_user()
+        parts = self.make_parts(3, inventory=5)
+        cart = self.fill_cart(user, parts, quantity=2)
+
+        order = CartService.finalize_order(user)
+
+        self.assertEqual(order.total_price, 2 * (1000 + 2000 + 3000))
+        self.assertEqual(
+            list(OrderItem.objects.filter(order=order).order_by('part_id').values_list('part_id', 'unit_price', 'quantity')),
+            [(part.pk, part.price, 2) for part in parts],
+        )
+        self.assertFalse(cart.items.exists())
+        self.assertFalse(StockReservation.objects.filter(cart=cart).exists())
+        # Taken once, when the lines were added
+        self.assertEqual(
+            list(PartUnified.objects.filter(pk__in=[part.pk for part in parts]).values_list('inventory', flat=True)),
+            [3, 3, 3],
+        )
+        self.assertEqual(OutboxMessage.objects.filter(recipient=user.email, channel='email').count(), 1)
+
+    def test_second_checkout_finds_the_cart_empty(self):
+        user = self.make_user()
+        parts = self.make_parts(2, inventory=5)
+        self.fill_cart(user, parts)
+        CartService.finalize_order(user)
+
+        with self.assertRaisesMessage(ValueError, "Cart is empty."):
+            CartService.finalize_order(user)
+        self.assertEqual(Order.objects.filter(user=user).count(), 1)
+        self.assertEqual(
+            list(PartUnified.objects.filter(pk__in=[part.pk for part in parts]).values_list('inventory', flat=True)),
+            [3, 3],
+        )
+
+
+
+
+class InvoiceTests(CartFixtures, TestCase):
+    """
+    Invoices are rendered from the order snapshot taken at checkout.
+    """
+
+    def setUp(self):
+        InvoiceService.cache().clear()
+        self.user = self.make_user(phone_number='09120000000')
+        self.parts = self.make_parts(2)
+        self.fill_cart(self.user, self.parts[:1], quantity=3)
+        self.fill_cart(self.user, self.parts[1:], quantity=1)
+        self.order = CartService.finalize_order(self.user)
+        # Later catalog edits do not change the invoice
+        PartUnified.objects.filter(pk=self.parts[0].pk).update(name='Renamed', price=99_999)
+
+    def test_text_invoice(self):
+        invoice = InvoiceService.render(InvoiceService.load(pk=self.order.pk))
+        self.assertIn(self.order.order_code, invoice)
+        self.assertIn("- Part 0 | تعداد: 3 | قیمت واحد: 1,000 | قیمت کل: 3,000", invoice)
+        self.assertIn("- Part 1 | تعداد: 1 | قیمت واحد: 2,000 | قیمت کل: 2,000", invoice)
+        self.assertIn("مجموع قیمت: 5,000 تومان", invoice)
+        self.assertNotIn('Renamed', invoice)
+
+    def test_html_invoice_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('order-invoice', args=[self.order.order_code]), {'output': 'html'})
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        html = b''.join(response.streaming_content).decode()
+        self.assertIn('<tr><td>Part 0</td><td>3</td><td>1,000</td><td>3,000</td></tr>', html)
+        self.assertIn('<dd>5,000 تومان</dd>', html)
+
+    def test_paid_order_invoice_is_sent_and_cached(self):
+        PaymentService.handle_callback(self.order.order_code, 'success')
+        with mock.patch('models.notification_service.send_to_phone') as send:
+            self.assertEqual(NotificationService.drain(), (2, 0))
+        phone, body = send.call_args.args
+        self.assertEqual(phone, '09120000000')
+        self.assertIn("مجموع قیمت: 5,000 تومان", body)
+
+        order = Order.objects.select_related('user').get(pk=self.order.pk)
+        # Served from the cache: no query for the lines
+        with self.assertNumQueries(0):
+            self.assertEqual(InvoiceService.render(order), body)
+
+class OutboxTests(CartFixtures, TestCase):
+    """
+    Notifications are only queued by requests and delivered by drain().
+    """
+
+    def setUp(self):
+        self.user = self.make_user()
+        self.fill_cart(self.user, self.make_parts(1))
+
+    def test_checkout_email_is_delivered_by_drain(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = CartService.finalize_order(self.user)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(NotificationService.drain(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertEqual(mail.outbox[0].subject, f"Order Confirmation #{order.id}")
+        self.assertEqual(OutboxMessage.objects.get().status, 'sent')
+        # Nothing is due any more
+        self.assertEqual(NotificationService.drain(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_send_is_retried(self):
+        CartService.finalize_order(self.user)
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=OSError('connection refused')), \
+                self.assertLogs('models.notification_service', 'WARNING'):
+            self.assertEqual(NotificationService.drain(), (0, 1))
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts, message.last_error), ('pending', 1, 'connection refused'))
+        self.assertEqual(mail.outbox, [])
+        # Not due before the backoff has passed
+        self.assertEqual(NotificationService.drain(), (0, 0))
+
+        self.assertEqual(NotificationService.drain(now=message.next_attempt_at), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.last_error), ('sent', 2, ''))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        CartService.finalize_order(self.user)
+        now = timezone.now()
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=OSError('connection refused')), \
+                self.assertLogs('models.notification_service', 'WARNING'):
+            for _ in range(NotificationService.max_attempts):
+                NotificationService.drain(now=now)
+                now = OutboxMessage.objects.get().next_attempt_at
+        self.assertEqual(OutboxMessage.objects.get().status, 'failed')
+        self.assertEqual(NotificationService.drain(now=now + timedelta(days=1)), (0, 0))
+
+
+class SweeperTests(CartFixtures, TestCase):
+    """
+    The sweeper returns the stock of expired reservations and abandoned carts
+    and deletes the abandoned carts.
+    """
+
+    def setUp(self):
+        self.parts = self.make_parts(2, inventory=10)
+        self.now = timezone.now()
+
+    def inventory(self):
+        return list(
+            PartUnified.objects.filter(pk__in=[part.pk for part in self.parts]).order_by('pk')
+            .values_list('inventory', flat=True)
+        )
+
+    def test_expired_reservations(self):
+        cart = self.fill_cart(self.make_user(), self.parts, quantity=3)
+        StockReservation.objects.filter(cart=cart, part=self.parts[0]).update(expires_at=self.now - timedelta(seconds=1))
+
+        metrics = SweeperService.sweep(now=self.now)
+
+        self.assertEqual((metrics['reservations'], metrics['units']), (1, 3))
+        self.assertEqual(self.inventory(), [10, 7])
+        self.assertEqual(list(StockReservation.objects.values_list('part_id', flat=True)), [self.parts[1].pk])
+        # The cart is still in use, so it keeps its lines
+        self.assertEqual(cart.items.count(), 2)
+        self.assertEqual((metrics['lines'], metrics['carts']), (0, 0))
+
+    def test_abandoned_carts(self):
+        abandoned = self.fill_cart(self.make_user('abandoned'), self.parts, quantity=2)
+        empty = CartService.get_or_create_cart(self.make_user('empty'))
+        active = self.fill_cart(self.make_user('active'), self.parts[:1], quantity=1)
+        Cart.objects.filter(pk__in=[abandoned.pk, empty.pk]).update(
+            updated_at=SweeperService.cutoff(self.now) - timedelta(seconds=1)
+        )
+
+        metrics = SweeperService.sweep(now=self.now, chunk_size=1)
+
+        self.assertEqual(
+            {key: metrics[key] for key in ('reservations', 'units', 'lines', 'carts')},
+            {'reservations': 2, 'units': 4, 'lines': 2, 'carts': 2},
+        )
+        self.assertEqual(self.inventory(), [9, 10])
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [active.pk])
+        self.assertEqual(active.items.count(), 1)
+        self.assertEqual(StockReservation.objects.get().cart_id, active.pk)
+
+class OrderCodeTests(CartFixtures, TestCase):
+    """
+    Order codes are unique and carry a valid check character.
+    """
+
+    def test_encode_is_collision_free(self):
+        codes = {order_codes.encode(number) for number in range(100_000)}
+        self.assertEqual(len(codes), 100_000)
+        self.assertTrue(all(order_codes.is_valid_code(code) for code in codes))
+
+    def test_primary_key_codes(self):
+        user = self.make_user()
+        with mock.patch.object(order_codes, '_generator', order_codes.PrimaryKeyOrderCodeGenerator()):
+            # INSERT and UPDATE of the code, in a savepoint; no lookup of existing codes
+            with self.assertNumQueries(4):
+                order = Order.objects.create(user=user, total_price=1)
+            orders = [order] + [Order.objects.create(user=user, total_price=1) for _ in range(49)]
+        codes = [order.order_code for order in orders]
+        self.assertEqual(len(set(codes)), 50)
+        self.assertEqual(codes, list(Order.objects.order_by('id').values_list('order_code', flat=True)))
+        self.assertTrue(all(order_codes.is_valid_code(code) for code in codes))
+
+    def test_random_code_collision_is_retried(self):
+        user = self.make_user()
+        taken = Order.objects.create(user=user, total_price=1).order_code
+        generator = order_codes.RandomOrderCodeGenerator()
+        fresh = generator.generate(None)
+        with mock.patch.object(order_codes, '_generator', generator), \
+                mock.patch.object(generator, 'generate', side_effect=[taken, fresh]):
+            order = Order.objects.create(user=user, total_price=1)
+        self.assertEqual(order.order_code, fresh)
+        self.assertEqual(Order.objects.filter(order_code=taken).count(), 1)
+
+    def test_codes_depend_on_the_secret(self):
+        codes = [order_codes.encode(number) for number in range(100)]
+        with self.settings(ORDER_CODE_SECRET='another secret'):
+            other = [order_codes.encode(number) for number in range(100)]
+        self.assertEqual(len(set(codes) & set(other)), 0)
+        self.assertEqual(codes, [order_codes.encode(number, settings.SECRET_KEY) for number in range(100)])
+
+
+class ConcurrentOrderCodeTests(CartFixtures, TransactionTestCase):
+    """
+    Writers in several threads get unique codes without a pre-check query.
+    """
+
+    def test_concurrent_writers(self):
+        user = self.make_user()
+        errors = []
+
+        def writer():
+            try:
+                for _ in range(25):
+                    Order.objects.create(user=user, total_price=1)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        codes = list(Order.objects.values_list('order_code', flat=True))
+        self.assertEqual(len(codes), 100)
+        self.assertEqual(len(set(codes)), 100)
+        self.assertTrue(all(order_codes.is_valid_code(code) for code in codes))
+
+
+
+class PaymentWebhookTests(CartFixtures, TestCase):
+    """
+    Payment callbacks are validated, applied once and never reopen a final order.
+    """
+
+    def setUp(self):
+        self.user = self.make_user(phone_number='09120000000')
+        self.order = Order.objects.create(user=self.user, total_price=1000)
+        self.client.force_login(self.user)
+        self.url = reverse('payment-status-order')
+
+    def callback(self, payment_status, key=None, **extra):
+        data = {'order_code': self.order.order_code, **extra}
+        if payment_status is not None:
+            data['status'] = payment_status
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(self.url, data, content_type='application/json', **headers)
+
+    def test_replayed_key(self):
+        self.assertEqual(self.callback('success', key='evt-1').json()['event'], 'applied')
+        self.assertEqual(self.callback('success', key='evt-1').json()['event'], 'duplicate')
+        self.assertEqual(PaymentEvent.objects.filter(order=self.order).count(), 1)
+        self.assertEqual(OutboxMessage.objects.filter(order=self.order, channel='sms').count(), 1)
+
+    def test_out_of_order_callback(self):
+        self.callback('success', key='evt-1')
+        response = self.callback('failed', key='evt-2')
+        self.assertEqual(response.json()['event'], 'ignored')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.order_status, 'paied')
+        self.assertEqual(
+            list(PaymentEvent.objects.order_by('id').values_list('idempotency_key', 'outcome')),
+            [('evt-1', 'applied'), ('evt-2', 'ignored')],
+        )
+
+    def test_missing_or_unknown_status(self):
+        for payment_status in (None, '', 'pending', 'SUCCESS'):
+            with self.subTest(status=payment_status):
+                response = self.callback(payment_status)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('status', response.json())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.order_status, 'waiting')
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_other_integrity_errors_are_raised(self):
+        with mock.patch.object(PaymentEvent.objects, 'create', side_effect=IntegrityError('order_id')):
+            with self.assertRaises(IntegrityError):
+                PaymentService.handle_callback(self.order.order_code, 'success', 'evt-1')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.order_status, 'waiting')
+
+class TokenAuthenticationTests(CartFixtures, TestCase):
+    """
+    A warm token authenticates without a query until it is revoked or its
+    user changes.
+    """
+
+    def setUp(self):
+        CachedTokenAuthentication.cache().clear()
+        self.user = self.make_user()
+        self.user.set_password('password')
+        self.user.save()
+        self.token = Token.objects.create(user=self.user)
+
+    def test_warm_token_runs_no_query(self):
+        authentication = CachedTokenAuthentication()
+        with self.assertNumQueries(1):
+            user, _ = authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, _ = authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_cache_holds_no_password(self):
+        CachedTokenAuthentication.get_token(self.token.key)
+        entry = CachedTokenAuthentication.cache().get(CachedTokenAuthentication.cache_key(self.token.key))
+        self.assertNotIn(self.user.password, repr(entry))
+        self.assertNotIn(self.token.key, repr(entry))
+        token = CachedTokenAuthentication.get_token(self.token.key)
+        self.assertEqual((token.key, token.user.username), (self.token.key, self.user.username))
+        # The rest of the user is loaded on first access
+        with self.assertNumQueries(1):
+            self.assertTrue(token.user.check_password('password'))
+
+    def test_async_warm_token_runs_no_query(self):
+        async_to_sync(CachedTokenAuthentication.aget_token)(self.token.key)
+        with self.assertNumQueries(0):
+            token = async_to_sync(CachedTokenAuthentication.aget_token)(self.token.key)
+        self.assertEqual(token.user.pk, self.user.pk)
+        self.assertIsNone(async_to_sync(CachedTokenAuthentication.aget_token)('missing'))
+
+    def test_warm_request_skips_the_auth_query(self):
+        url = reverse('cart-list')
+        headers = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        CartService.get_or_create_cart(self.user)
+        with CaptureQueriesContext(connection) as cold:
+            self.assertEqual(self.client.get(url, **headers).status_code, 200)
+        with self.assertNumQueries(len(cold) - 1):
+            self.assertEqual(self.client.get(url, **headers).status_code, 200)
+
+    def test_deactivated_user(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(self.token.key)
+
+    def test_revoked_token(self):
+        authentication = CachedTokenAuthentication()
+        key = self.token.key
+        authentication.authenticate_credentials(key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(key)
+
+    def test_deploy_check_warns_about_a_local_cache(self):
+        self.assertEqual([warning.id for warning in check_token_cache(None)], ['models.W001'])
+        with self.settings(AUTH_TOKEN_CACHE_TIMEOUT=0):
+            self.assertEqual(check_token_cache(None), [])
+
+
+
+class InstrumentationTests(CartFixtures, TestCase):
+    """
+    The instrumentation middleware reports what each request cost, and
+    nothing when it is off.
+    """
+
+    def setUp(self):
+        MetricsService.reset()
+        self.addCleanup(MetricsService.reset)
+        self.user = self.make_user()
+        self.fill_cart(self.user, self.make_parts(2))
+
+    def test_request_is_measured(self):
+        # The middleware is set up by the first request of a client
+        with self.settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SAMPLE_RATE=1.0):
+            client = Client()
+            client.force_login(self.user)
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(reverse('cart-list'))
+
+        names = [entry.split(';')[0].strip() for entry in response['Server-Timing'].split(',')]
+        self.assertEqual(names, ['db', 'serialize', 'total'])
+        self.assertIn(f'desc="{len(captured)} queries"', response['Server-Timing'])
+        stats = MetricsService.snapshot()[('cart-list', 'GET')]
+        self.assertEqual((stats['requests'], stats['queries'], stats['n_plus_one']), (1, len(captured), 0))
+        self.assertGreater(stats['latency_seconds'], 0)
+        self.assertIn(
+            f'cart_db_queries_total{{view="cart-list",method="GET"}} {len(captured)}', MetricsService.render()
+        )
+
+    def test_repeated_queries_are_flagged(self):
+        metrics = RequestMetrics()
+        for size in (1, 2, 3):
+            metrics(lambda *args: None, f'SELECT 1 WHERE id IN ({", ".join(["%s"] * size)})', (), False, {})
+        metrics(lambda *args: None, 'SELECT 2', (), False, {})
+        self.assertEqual(metrics.repeated_shapes(3), [('SELECT 1 WHERE id IN (...)', 3)])
+        self.assertEqual(metrics.queries, 4)
+
+    def test_disabled(self):
+        with self.settings(INSTRUMENTATION_ENABLED=False):
+            client = Client()
+            client.force_login(self.user)
+            response = client.get(reverse('cart-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(MetricsService.snapshot(), {})
+
+
+class AsyncCartViewTests(CartFixtures, TestCase):
+    """
+    The ASGI cart views behave like their sync counterparts.
+    """
+
+    def setUp(self):
+        self.user = self.make_user()
+        self.parts = self.make_parts(2, inventory=5)
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=self.user).key}'}
+
+    async def add(self, part, quantity):
+        return await self.async_client.post(
+            reverse('async-cart'), {'part_id': part.pk, 'quantity': quantity},
+            content_type='application/json', headers=self.headers,
+        )
+
+    async def test_read_and_add(self):
+        response = await self.async_client.get(reverse('async-cart'), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_price'], 0)
+
+        self.assertEqual((await self.add(self.parts[0], 2)).status_code, 201)
+        self.assertEqual((await self.add(self.parts[1], 1)).status_code, 201)
+        response = await self.async_client.get(reverse('async-cart'), headers=self.headers)
+        self.assertEqual(response.json()['total_price'], 2 * 1000 + 2000)
+        self.assertEqual(len(response.json()['items']), 2)
+        part = await PartUnified.objects.aget(pk=self.parts[0].pk)
+        self.assertEqual(part.inventory, 3)
+
+    async def test_add_rejects_bad_quantities_and_short_stock(self):
+        for quantity in ('two', 0, None):
+            with self.subTest(quantity=quantity):
+                self.assertEqual((await self.add(self.parts[0], quantity)).status_code, 400)
+        self.assertEqual((await self.add(self.parts[0], 6)).status_code, 400)
+        self.assertFalse(await CartItem.objects.filter(cart__user=self.user).aexists())
+
+    async def test_remove_and_clear(self):
+        await self.add(self.parts[0], 2)
+        await self.add(self.parts[1], 2)
+        item = await CartItem.objects.aget(cart__user=self.user, part=self.parts[0])
+
+        response = await self.async_client.delete(reverse('async-delete-cart-item', args=[item.pk]), headers=self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual((await PartUnified.objects.aget(pk=self.parts[0].pk)).inventory, 5)
+
+        response = await self.async_client.delete(reverse('async-clear-cart'), headers=self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual((await PartUnified.objects.aget(pk=self.parts[1].pk)).inventory, 5)
+        self.assertFalse(await CartItem.objects.filter(cart__user=self.user).aexists())
+        self.assertFalse(await StockReservation.objects.filter(cart__user=self.user).aexists())
+
+    async def test_anonymous_and_foreign_items(self):
+        self.assertEqual((await self.async_client.get(reverse('async-cart'))).status_code, 403)
+        other = await sync_to_async(self.make_user)('other')
+        cart = await sync_to_async(self.fill_cart)(other, self.parts[:1])
+        item = await cart.items.afirst()
+        response = await self.async_client.delete(reverse('async-delete-cart-item', args=[item.pk]), headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+class CartETagTests(CartFixtures, TestCase):
+    """
+    The cart ETag changes with the cart and with the parts in it.
+    """
+
+    def setUp(self):
+        CatalogCacheService.cache().clear()
+        self.user = self.make_user()
+        self.parts = self.make_parts(2)
+        self.fill_cart(self.user, self.parts)
+        self.client.force_login(self.user)
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        # Without inventory, so stock is not part of the ETag
+        return self.client.get(reverse('cart-list'), {'fields': 'name,price'}, **headers)
+
+    def test_unchanged_cart_is_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_part_edit_changes_the_etag(self):
+        etag = self.get()['ETag']
+        part = PartUnified.objects.get(pk=self.parts[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            part.name = 'Renamed'
+            part.save()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Renamed')
+
+    def test_part_delete_changes_the_etag(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.parts[0].delete()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['items']), 1)
+
+
+
+class CartBatchViewTests(CartFixtures, TestCase):
+    """
+    A batch of cart operations is applied at once, or not at all.
+    """
+
+    def setUp(self):
+        self.user = self.make_user()
+        self.client.force_login(self.user)
+        self.url = reverse('cart-batch')
+
+    def batch(self, operations):
+        return self.client.post(self.url, {'operations': operations}, content_type='application/json')
+
+    def test_mixed_batch(self):
+        parts = self.make_parts(3, inventory=10)
+        self.fill_cart(self.user, parts[1:], quantity=2)
+
+        response = self.batch([
+            {'op': 'add', 'part_id': parts[0].pk, 'quantity': 3},
+            {'op': 'set', 'part_id': parts[1].pk, 'quantity': 5},
+            {'op': 'remove', 'part_id': parts[2].pk},
+            {'op': 'add', 'part_id': parts[0].pk},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        lines = {item['part']['id']: item['quantity'] for item in response.json()['items']}
+        self.assertEqual(lines, {parts[0].pk: 4, parts[1].pk: 5})
+        self.assertEqual(response.json()['total_price'], 4 * 1000 + 5 * 2000)
+        self.assertEqual(
+            list(PartUnified.objects.filter(pk__in=[part.pk for part in parts]).order_by('pk').values_list('inventory', flat=True)),
+            [6, 5, 10],
+        )
+        self.assertEqual(
+            dict(StockReservation.objects.values_list('part_id', 'quantity')), {parts[0].pk: 4, parts[1].pk: 5}
+        )
+
+    def test_short_part_rolls_back_the_batch(self):
+        parts = self.make_parts(3, inventory=3)
+        self.fill_cart(self.user, parts[2:], quantity=1)
+
+        response = self.batch([
+            {'op': 'add', 'part_id': parts[0].pk, 'quantity': 2},
+            {'op': 'set', 'part_id': parts[1].pk, 'quantity': 4},
+            {'op': 'remove', 'part_id': parts[2].pk},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['part_ids'], [parts[1].pk])
+        self.assertEqual(
+            list(PartUnified.objects.filter(pk__in=[part.pk for part in parts]).order_by('pk').values_list('inventory', flat=True)),
+            [3, 3, 2],
+        )
+        self.assertEqual(list(CartItem.objects.values_list('part_id', 'quantity')), [(parts[2].pk, 1)])
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        parts = self.make_parts(30)
+        CartService.get_or_create_cart(self.user)
+        # Every request empties the query log, which the capture reads from
+        reset_queries()
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.batch([{'op': 'add', 'part_id': part.pk} for part in parts[:2]]).status_code, 200)
+        expected = len(small)
+        self.client.delete(reverse('clear-cart'))
+        with self.assertNumQueries(expected):
+            self.assertEqual(self.batch([{'op': 'add', 'part_id': part.pk} for part in parts]).status_code, 200)
+
+class InventoryAdjustTests(CartFixtures, TestCase):
+    """
+    adjust() changes every reservation of the cart or none of them.
+    """
+
+    def test_only_short_parts_are_reported(self):
+        cart = CartService.get_or_create_cart(self.make_user())
+        plenty, scarce = self.make_parts(2, inventory=5)
+        PartUnified.objects.filter(pk=scarce.pk).update(inventory=1)
+
+        with self.assertRaises(InsufficientStockError) as raised:
+            InventoryService.adjust(cart, {plenty.pk: 3, scarce.pk: 2})
+
+        self.assertEqual(raised.exception.part_ids, [scarce.pk])
+        self.assertEqual(
+            dict(PartUnified.objects.filter(pk__in=[plenty.pk, scarce.pk]).values_list('id', 'inventory')),
+            {plenty.pk: 5, scarce.pk: 1},
+        )
+        self.assertFalse(StockReservation.objects.filter(cart=cart).exists())
+
+    def test_increase_and_decrease(self):
+        cart = CartService.get_or_create_cart(self.make_user())
+        first, second = self.make_parts(2, inventory=5)
+        InventoryService.adjust(cart, {first.pk: 3, second.pk: 2})
+        InventoryService.adjust(cart, {first.pk: -1, second.pk: -5})
+
+        self.assertEqual(
+            dict(StockReservation.objects.filter(cart=cart).values_list('part_id', 'quantity')), {first.pk: 2}
+        )
+        self.assertEqual(
+            dict(PartUnified.objects.filter(pk__in=[first.pk, second.pk]).values_list('id', 'inventory')),
+            {first.pk: 3, second.pk: 5},
+        )
+
+
+class CatalogImportTests(CartFixtures, TestCase):
+    """
+    The inventory of an import file is stock on hand; carts keep what they hold.
+    """
+
+    def load(self, text):
+        rows = [CatalogService.parse_row(row) for row in CatalogService.read_rows(io.StringIO(text), 'csv')]
+        return CatalogService.upsert_batch(rows)
+
+    def inventory(self, commercial_code):
+        return PartUnified.objects.get(commercial_code=commercial_code).inventory
+
+    def test_rows_without_inventory_keep_the_stock(self):
+        self.load("commercial_code,internal_code,name,price,inventory\nA,1,Pump,100,7\n")
+        self.assertEqual(self.load("commercial_code,internal_code,name,price\nA,1,Pump v2,120\nB,1,Belt,50\n"), (1, 1))
+        self.assertEqual(self.inventory('A'), 7)
+        self.assertEqual(self.inventory('B'), 0)
+        self.assertEqual(PartUnified.objects.get(commercial_code='A').name, 'Pump v2')
+
+    def test_reserved_stock_is_subtracted_and_exported(self):
+        self.load("commercial_code,internal_code,name,price,inventory\nA,1,Pump,100,7\n")
+        part = PartUnified.objects.get(commercial_code='A')
+        CartService.add_to_cart(self.make_user(), part, quantity=2)
+        self.assertEqual(self.inventory('A'), 5)
+
+        self.load("commercial_code,internal_code,name,price,inventory\nA,1,Pump,100,10\n")
+        self.assertEqual(self.inventory('A'), 8)
+
+        exported = io.StringIO()
+        CatalogService.write_rows(exported, CatalogService.export_rows(), 'csv')
+        self.load(exported.getvalue())
+        self.assertEqual(self.inventory('A'), 8)
+
+
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+class PartSearchFilterTests(CartFixtures, TestCase):
+    """
+    ?car= takes a Car id or a car name; ?car_name= is always a name.
+    """
+
+    def setUp(self):
+        self.pride, self.peugeot = self.make_parts(2)
+        self.pride.cars = 'Pride'
+        self.pride.save()
+        self.car_id = Car.objects.get(name='Pride').pk
+        # A car whose name contains the id of the other one
+        self.peugeot.cars = f'Peugeot {self.car_id}'
+        self.peugeot.save()
+
+    def search(self, **params):
+        return list(PartSearchService.filter_queryset(PartUnified.objects.order_by('id'), params))
+
+    def test_car(self):
+        self.assertEqual(self.search(car=str(self.car_id)), [self.pride])
+        self.assertEqual(self.search(car='pri'), [self.pride])
+        self.assertEqual(self.search(car_name=str(self.car_id)), [self.peugeot])
+
+    def test_view(self):
+        response = self.client.get(reverse('part-search'), {'car': self.car_id})
+        self.assertEqual([part['id'] for part in response.json()['results']], [self.pride.pk])
+
+
+class KeysetCursorTests(CartFixtures, TestCase):
+    """
+    Cursors that do not fit the sort are rejected with a 404, never a 500.
+    """
+
+    def setUp(self):
+        CatalogCacheService.cache().clear()
+        self.make_parts(5)
+        self.client.force_login(self.make_user())
+
+    def get(self, sort, cursor):
+        return self.client.get(
+            reverse('part-list'), {'pagination': 'cursor', 'sort': sort, 'cursor': encode_cursor(cursor)}
+        )
+
+    def test_next_link_round_trips(self):
+        response = self.client.get(reverse('part-list'), {'pagination': 'cursor', 'sort': 'price', 'page_size': 2})
+        following = self.client.get(response.json()['next'])
+        self.assertEqual(following.status_code, 200)
+        self.assertEqual([part['price'] for part in following.json()['results']], [3000, 4000])
+
+    def test_invalid_cursors(self):
+        cases = {
+            'wrong type': ('price', {'v': 'cheap', 'id': 1}),
+            'other sort': ('price', {'v': 1000, 'id': 1, 's': 'name'}),
+            'null value': ('name', {'v': None, 'id': 1}),
+            'not an object': ('price', [1000, 1]),
+            'no id': ('price', {'v': 1000}),
+        }
+        for name, (sort, cursor) in cases.items():
+            with self.subTest(name):
+                self.assertEqual(self.get(sort, cursor).status_code, 404)
+
+    def test_not_base64(self):
+        response = self.client.get(reverse('part-list'), {'pagination': 'cursor', 'cursor': '%%%'})
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderCursorTests(CartFixtures, TestCase):
+    """
+    Order history cursors carry a created_at that must parse as a date.
+    """
+
+    def setUp(self):
+        self.user = self.make_user()
+        for _ in range(3):
+            Order.objects.create(user=self.user, total_price=1)
+        self.client.force_login(self.user)
+
+    def get(self, value):
+        return self.client.get(reverse('order-list'), {'cursor': encode_cursor({'v': value, 'id': 1})})
+
+    def test_next_link_round_trips(self):
+        response = self.client.get(reverse('order-list'), {'page_size': 2})
+        following = self.client.get(response.json()['next'])
+        self.assertEqual(following.status_code, 200)
+        self.assertEqual(len(following.json()['results']), 1)
+
+    def test_invalid_dates(self):
+        for value in ('yesterday', '2024-13-01', 20240101):
+            with self.subTest(value):
+                self.assertEqual(self.get(value).status_code, 404)
+
+    def test_naive_date_is_read_in_the_current_time_zone(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            self.assertEqual(self.get('2024-01-01T10:00:00').status_code, 200)
+
+
+class CategoryCacheTests(CartFixtures, TestCase):
+    """
+    Cached part payloads follow their category.
+    """
+
+    def setUp(self):
+        CatalogCacheService.cache().clear()
+        self.category = PartCategory.objects.create(title='Brakes', url='https://example.com/old')
+        self.part = self.make_parts(1)[0]
+        self.part.category = self.category
+        self.part.save()
+        self.url = reverse('part-detail', args=[self.part.pk])
+
+    def test_category_edit(self):
+        self.assertEqual(self.client.get(self.url).json()['category_url'], 'https://example.com/old')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.url = 'https://example.com/new'
+            self.category.save()
+        self.assertEqual(self.client.get(self.url).json()['category_url'], 'https://example.com/new')
+
+    def test_category_delete(self):
+        self.assertEqual(self.client.get(self.url).json()['category_url'], 'https://example.com/old')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertEqual(self.client.get(self.url).json()['category_url'], '')
+        self.part.refresh_from_db()
+        self.assertEqual(self.part.category_title, '')
+
+    def test_category_cleared(self):
+        part = PartUnified.objects.get(pk=self.part.pk)
+        self.assertEqual(part.category_title, 'Brakes')
+        part.category = None
+        part.save()
+        part.refresh_from_db()
+        self.assertEqual(part.category_title, '')
+        self.assertFalse(PartUnified.objects.filter(category_title='Brakes').exists())
+
+    def test_category_cleared_with_update_fields(self):
+        part = PartUnified.objects.get(pk=self.part.pk)
+        part.category = None
+        part.save(update_fields=['category'])
+        part.refresh_from_db()
+        self.assertEqual(part.category_title, '')
+
+    def test_unlinked_title_kept(self):
+        # Imported titles wait for normalize_categories
+        part = self.make_parts(1, start=1)[0]
+        PartUnified.objects.filter(pk=part.pk).update(category_title='Filters')
+        part = PartUnified.objects.get(pk=part.pk)
+        part.save()
+        part.refresh_from_db()
+        self.assertEqual(part.category_title, 'Filters')
+
+
+class CatalogCacheReplicaTests(TestCase):
+    """
+    Cache misses are rebuilt from the primary, even in replica views.
+    """
+
+    def setUp(self):
+        CatalogCacheService.cache().clear()
+        self.request = RequestFactory().get('/cart/parts/')
+        state, token = db_router.activate(self.request)
+        state.allow_replica = True
+        self.addCleanup(db_router.deactivate, token)
+        patcher = mock.patch.object(db_router, 'replica_alias', return_value='replica')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def build(self):
+        return {'results': [{'id': 0, 'db': db_router.ReplicaRouter().db_for_read(PartUnified)}]}
+
+    def test_miss_reads_primary(self):
+        self.assertEqual(CatalogCacheService.get_page(self.request, self.build)['results'][0]['db'], 'default')
+        self.assertEqual(CatalogCacheService.get_part(0, self.build)['results'][0]['db'], 'default')
+        # The rest of the view still reads the replica
+        self.assertEqual(db_router.ReplicaRouter().db_for_read(PartUnified), 'replica')
+
+    def test_async_miss_reads_primary(self):
+        async def build():
+            return self.build()
+
+        data = async_to_sync(CatalogCacheService.aget_page)(self.request, build)
+        self.assertEqual(data['results'][0]['db'], 'default')
+        self.assertEqual(db_router.ReplicaRouter().db_for_read(PartUnified), 'replica')
+
+
+
+class AdminChangelistTests(CartFixtures, TestCase):
+    """
+    Changelists of large tables read their counts from the planner statistics.
+    """
+
+    def setUp(self):
+        self.client.force_login(self.make_user('admin', is_staff=True, is_superuser=True))
+        self.parts = self.make_parts(12)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            # As if the table had grown since
+            cursor.execute(
+                "UPDATE sqlite_stat1 SET stat = '50000' || substr(stat, instr(stat, ' ')) WHERE tbl = %s",
+                [PartUnified._meta.db_table],
+            )
+
+    def test_estimated_count(self):
+        self.assertEqual(estimated_count(PartUnified.objects.all()), 50000)
+        # Filtered querysets have no estimate on SQLite and are counted
+        self.assertIsNone(estimated_count(PartUnified.objects.filter(inventory__gt=0)))
+
+    def test_part_changelist(self):
+        # Session, user, category filter choices, the estimate and the page
+        with self.assertNumQueries(5) as captured:
+            response = self.client.get(reverse('admin:models_partunified_changelist'))
+        self.assertContains(response, '50000 part')
+        self.assertFalse([query for query in captured.captured_queries if 'COUNT(' in query['sql']])
+
+    def test_deep_page(self):
+        paginator = EstimatedCountPaginator(PartUnified.objects.order_by('pk'), 5)
+        paginator.deferred_join_offset = 5
+        # The estimate, the keys of the page, then its rows
+        with self.assertNumQueries(3):
+            rows = list(paginator.page(2).object_list)
+        self.assertEqual(rows, self.parts[5:10])
+
+class CategoryMigrationTests(TransactionTestCase):
+    """
+    Migrations 0005-0007 move the flat category columns into PartCategory.
+    """
+    before = [('models', '0005_partcategory')]
+
+    def setUp(self):
+        call_command('migrate', 'models', self.before[0][1], verbosity=0)
+
+    def tearDown(self):
+        # Back to the latest schema, triggers included
+        call_command('migrate', 'models', verbosity=0)
+
+    def test_backfill(self):
+        apps = MigrationExecutor(connection).loader.project_state(self.before).apps
+        Part = apps.get_model('models', 'PartUnified')
+        for index, (title, url, inventory) in enumerate([
+            ('Brakes', 'https://example.com/brakes', 1), (' Brakes ', 'https://example.com/other', 0),
+            ('Filters', 'https://example.com/filters', 0), ('', '', 1),
+        ]):
+            Part.objects.create(
+                name=f'Part {index}', commercial_code=f'C{index}', internal_code='I', price=1, cars='-',
+                inventory=inventory, category_title=title, category_url=url, category_description=f'About {index}',
+            )
+
+        call_command('migrate', 'models', verbosity=0)
+
+        self.assertEqual(
+            list(PartCategory.objects.order_by('title').values_list('title', 'url', 'description', 'part_count', 'in_stock_count')),
+            [('Brakes', 'https://example.com/brakes', 'About 0', 2, 1), ('Filters', 'https://example.com/filters', 'About 2', 1, 0)],
+        )
+        self.assertEqual(
+            list(PartUnified.objects.order_by('id').values_list('category__title', 'category_title')),
+            [('Brakes', 'Brakes'), ('Brakes', 'Brakes'), ('Filters', 'Filters'), (None, '')],
+        )
+
+
+class SearchIndexMigrationTests(CartFixtures, TransactionTestCase):
+    """
+    Migration 0009 creates the full-text index over the existing parts and
+    drops it when reversed.
+    """
+
+    def setUp(self):
+        PartSearchService._installed.clear()
+        self.addCleanup(PartSearchService._installed.clear)
+        call_command('migrate', 'models', '0008_order_created_idx', verbosity=0)
+
+    def tearDown(self):
+        call_command('migrate', 'models', verbosity=0)
+
+    def test_index_is_built_and_dropped(self):
+        self.assertNotIn(SQLITE_FTS_TABLE, connection.introspection.table_names())
+        self.assertFalse(PartSearchService.has_index())
+        part = self.make_parts(1)[0]
+
+        call_command('migrate', 'models', '0009_part_search_index', verbosity=0)
+        PartSearchService._installed.clear()
+
+        self.assertTrue(PartSearchService.has_index())
+        parts = PartUnified.objects.all()
+        self.assertEqual(list(PartSearchService.match(parts, 'part 0')), [part])
+        # Later writes reach the index through the triggers
+        PartUnified.objects.filter(pk=part.pk).update(name='Brake disc')
+        self.assertEqual(list(PartSearchService.match(parts, 'disc')), [part])
+        self.assertEqual(list(PartSearchService.match(parts, 'part')), [])
+
+
+class CategoryCounterMigrationTests(CartFixtures, TransactionTestCase):
+    """
+    Migration 0010 counts the existing parts and keeps the counters current
+    from then on; reversing it drops the triggers.
+    """
+
+    def setUp(self):
+        call_command('migrate', 'models', '0009_part_search_index', verbosity=0)
+
+    def tearDown(self):
+        call_command('migrate', 'models', verbosity=0)
+
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'part_category%'")
+            return sorted(name for name, in cursor.fetchall())
+
+    def test_counters(self):
+        self.assertEqual(self.triggers(), [])
+        category = PartCategory.objects.create(title='Brakes')
+        parts = self.make_parts(2)
+        PartUnified.objects.filter(pk__in=[part.pk for part in parts]).update(category=category)
+        PartUnified.objects.filter(pk=parts[0].pk).update(inventory=0)
+
+        call_command('migrate', 'models', '0010_category_counters', verbosity=0)
+        self.assertEqual(len(self.triggers()), 3)
+        category.refresh_from_db()
+        self.assertEqual((category.part_count, category.in_stock_count), (2, 1))
+
+        PartUnified.objects.filter(pk=parts[0].pk).update(inventory=5)
+        PartUnified.objects.filter(pk=parts[1].pk).delete()
+        category.refresh_from_db()
+        self.assertEqual((category.part_count, category.in_stock_count), (1, 1))
+
+        call_command('migrate', 'models', '0009_part_search_index', verbosity=0)
+        self.assertEqual(self.triggers(), [])
@@ -1,18 +1,37 @@
 from django.urls import path
 from .views import *
+from .async_views import *
 
 
 urlpatterns = [
     # Product API
     path('parts/', PartUnifiedListView.as_view(), name='part-list'),
+    path('parts/search/', PartSearchView.as_view(), name='part-search'),
+    path('parts/<int:part_id>/', PartDetailView.as_view(), name='part-detail'),
+    path('parts/cache-stats/', CatalogCacheStatsView.as_view(), name='part-cache-stats'),
+    path('categories/', CategoryListView.as_view(), name='category-list'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('cars/', CarListView.as_view(), name='car-list'),
+    path('cars/<int:car_id>/parts/', CompatiblePartsView.as_view(), name='car-parts'),
 
     # Cart API
     path('add/', AddItemToCartView.as_view(), name='cart-add'),
     path('list-cart/', AddItemToCartView.as_view(), name='cart-list'),
+    path('batch/', CartBatchView.as_view(), name='cart-batch'),
     path('orders/create/', CreateOrderView.as_view(), name='create-order'),
     path('orders/payment/', PaymentGatewayView.as_view(), name='payment-order'),
+    path('orders/', OrderHistoryView.as_view(), name='order-list'),
     path('orders/final-status/', PaymentWebhookAPIView.as_view(), name='payment-status-order'),
+    path('orders/<str:order_code>/', OrderDetailView.as_view(), name='order-detail'),
+    path('orders/<str:order_code>/invoice/', OrderInvoiceView.as_view(), name='order-invoice'),
     path('delete/<int:item_id>/', DeleteCartItemView.as_view(), name='delete-cart-item'),
     path('clear/', ClearCartView.as_view(), name='clear-cart'),
 
+    # Async (ASGI) versions of the hot endpoints
+    path('async/parts/', AsyncPartUnifiedListView.as_view(), name='async-part-list'),
+    path('async/cart/', AsyncCartView.as_view(), name='async-cart'),
+    path('async/delete/<int:item_id>/', AsyncDeleteCartItemView.as_view(), name='async-delete-cart-item'),
+    path('async/clear/', AsyncClearCartView.as_view(), name='async-clear-cart'),
+    path('async/orders/final-status/', AsyncPaymentWebhookView.as_view(), name='async-payment-status-order'),
+
 ]
@@ -2,48 +2,108 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from django.shortcuts import get_object_or_404
-from .models import PartUnified, CartItem, Person, Order
-from .serializers import PartUnifiedSerializer, CartItemSerializer, OrderSerializer
+from .models import PartUnified, CartItem, Order, OrderItem, Car
+from .serializers import (
+    OrderSerializer, OrderSummarySerializer, OrderDetailSerializer, CartBatchSerializer,
+    PART_FIELDS, PART_FIELD_PROFILES, serialize_parts, serialize_cart_items,
+)
+from rest_framework.exceptions import ValidationError
 from .cart_service import CartService
-from rest_framework.pagination import PageNumberPagination
+from .inventory_service import InsufficientStockError
+from .search_service import PartSearchService
+from .compatibility_service import CompatibilityService
+from .cache_service import CatalogCacheService
+from .category_service import CategoryService
+from .invoice_service import InvoiceService
+from .payment_service import PaymentService
+from .metrics_service import MetricsService
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.renderers import BaseRenderer
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Prefetch, Q
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import parse_etags
+from django.utils import timezone
+import base64
 import datetime
+import hashlib
+import json
 
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
 
-def generate_invoice(order: Order) -> str:
+def payment_gateway(phone):
+    return True
+
+def get_part_fields(request):
+    """
+    Resolve the part fields requested with ?fields=a,b or ?profile=compact.
+    Defaults to every field so existing clients get the same payload.
+    """
+    fields = request.query_params.get('fields')
+    if fields:
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in PART_FIELDS]
+        if unknown:
+            raise ValidationError({'fields': [f"Unknown field: {name}" for name in unknown]})
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        return fields
+
+    profile = request.query_params.get('profile', 'full')
+    if profile not in PART_FIELD_PROFILES:
+        raise ValidationError({'profile': [f"Unknown profile: {profile}"]})
+    return PART_FIELD_PROFILES[profile]
+
+
+def make_etag(*parts):
+    """
+    Weak ETag built from cheap version stamps rather than the response body.
+    """
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request, etag):
     """
-    Generate a simple invoice text for the given order.
+    Weak comparison of ``etag`` against the request's If-None-Match header.
     """
-    lines = []
-    lines.append(f"فاکتور سفارش")
-    lines.append(f"کد سفارش: {order.order_code}")
-    lines.append(f"نام کاربر: {order.user.username}")
-    lines.append(f"تاریخ ایجاد سفارش: {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}")
-    lines.append(f"نوع ارسال: {order.get_post_type_display()}")
-    lines.append(f"تاریخ تحویل: {order.delivery_date if order.delivery_date else 'تعریف نشده'}")
-    lines.append(f"مجموع قیمت: {order.total_price:,} تومان")
-    lines.append("")
-    lines.append("آیتم‌ها:")
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in parse_etags(header)]
 
-    for item in order.items.all():
-        part_name = item.part.name if hasattr(item, 'part') else "نامشخص"
-        quantity = item.quantity
-        price = item.part.price if hasattr(item, 'part') else 0
-        total_item_price = price * quantity
-        lines.append(f"- {part_name} | تعداد: {quantity} | قیمت واحد: {price:,} | قیمت کل: {total_item_price:,}")
 
-    lines.append("")
-    lines.append("با تشکر از خرید شما.")
+def conditional_response(request, etag, build):
+    """
+    Answer 304 when the client already has ``etag``, otherwise ``build()`` the data.
+    """
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(build(), headers={'ETag': etag})
 
-    return "\n".join(lines)
 
-def send_to_phone(phone, message):
-    print(message)
+def cart_payload(summary, part_fields):
+    """
+    Response body of the cart endpoints for a CartService.get_cart_summary().
+    """
+    response_data = {
+        'items': serialize_cart_items(summary['items'], part_fields),
+        'total_price': summary['total_price'],
+    }
+
+    if summary['item_count'] < 20:
+        response_data['message'] = 'برای مشاوره با شماره +989386678858 تماس بگیرید.'
+
+    return response_data
 
-def payment_gateway(phone):
-    return True
 
 class StandardResultsSetPagination(PageNumberPagination):
     # Default page size
@@ -56,26 +116,316 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_query_param = 'page'
 
 
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on (sort key, id) that costs O(page size) at any depth.
+    Accepts ?cursor=..., ?sort=id|-id|price|-price|name|-name and
+    ?count=none|approx|exact (no COUNT(*) is issued by default).
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    sort_query_param = 'sort'
+    count_query_param = 'count'
+    sort_keys = ('id', '-id', 'price', '-price', 'name', '-name')
+    default_sort = 'id'
+    # Seconds an approximate count is served from cache
+    approximate_count_timeout = 300
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.prepare(queryset, request)
+        self.count = self.get_count(queryset, request)
+        return self.finish(list(self.page_queryset(queryset)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async paginate_queryset for the ASGI views.
+        """
+        queryset = self.prepare(queryset, request)
+        self.count = await self.aget_count(queryset, request)
+        return self.finish([obj async for obj in self.page_queryset(queryset)])
+
+    def prepare(self, queryset, request):
+        """
+        Read the page size, sort and cursor and apply the cursor filter.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.sort = request.query_params.get(self.sort_query_param, self.default_sort)
+        if self.sort not in self.sort_keys:
+            raise ValidationError({self.sort_query_param: [f"Unknown sort key: {self.sort}"]})
+        self.cursor = self.decode_cursor(request, queryset.model)
+        return queryset
+
+    def page_queryset(self, queryset):
+        field = self.sort.lstrip('-')
+        descending = self.sort.startswith('-')
+        ordering = [self.sort] if field == 'id' else [self.sort, '-id' if descending else 'id']
+
+        cursor = self.cursor
+        if cursor:
+            lookup = 'gt' if descending == cursor['r'] else 'lt'
+            if field == 'id':
+                condition = Q(**{f'id__{lookup}': cursor['id']})
+            else:
+                condition = Q(**{f'{field}__{lookup}': cursor['v']}) | Q(
+                    **{field: cursor['v'], f'id__{lookup}': cursor['id']}
+                )
+            queryset = queryset.filter(condition)
+        if cursor and cursor['r']:
+            ordering = [key[1:] if key.startswith('-') else f'-{key}' for key in ordering]
+
+        # The sort value is annotated so it never triggers a deferred field load
+        queryset = queryset.annotate(cursor_value=F(field)).order_by(*ordering)
+        return queryset[:self.page_size + 1]
+
+    def finish(self, results):
+        reverse = bool(self.cursor and self.cursor['r'])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else self.cursor is not None
+        self.next_position = self.position(results[-1]) if has_next and results else None
+        self.previous_position = self.position(results[0]) if has_previous and results else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param, 'none')
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'approx':
+            sql = str(queryset.order_by().query)
+            key = 'keyset-count:' + hashlib.md5(sql.encode()).hexdigest()
+            return cache.get_or_set(key, queryset.count, self.approximate_count_timeout)
+        return None
+
+    async def aget_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param, 'none')
+        if mode == 'exact':
+            return await queryset.acount()
+        if mode == 'approx':
+            sql = str(queryset.order_by().query)
+            key = 'keyset-count:' + hashlib.md5(sql.encode()).hexdigest()
+            count = await cache.aget(key)
+            if count is None:
+                count = await queryset.acount()
+                await cache.aset(key, count, self.approximate_count_timeout)
+            return count
+        return None
+
+    @staticmethod
+    def position(obj):
+        value = obj.cursor_value
+        # Dates travel as ISO strings; decode_cursor parses them back with the field
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        return {'v': value, 'id': obj.pk}
+
+    def decode_cursor(self, request, model):
+        """
+        Decode the cursor and convert its sort value with the sort field.
+        A cursor that is malformed or was made for another sort is a 404.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if cursor.get('s', self.sort) != self.sort or cursor['v'] is None:
+                raise NotFound(self.invalid_cursor_message)
+            value = model._meta.get_field(self.sort.lstrip('-')).to_python(cursor['v'])
+            return {'v': value, 'id': int(cursor['id']), 'r': bool(cursor.get('r'))}
+        except (TypeError, ValueError, KeyError, AttributeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse):
+        cursor = dict(position, s=self.sort, r=int(reverse))
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        content = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            content['count'] = self.count
+        return Response(content)
+
+
 class PartUnifiedListView(APIView):
     """
     Return a paginated list of products (PartUnified)
     Accepts query parameters: ?page=1&page_size=50
+    and ?fields=id,name,price or ?profile=compact to limit the part fields.
+    ?pagination=cursor (or a ?cursor=...) switches to KeysetPagination.
     """
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
-        # Load only necessary fields to reduce DB load
-        queryset = PartUnified.objects.only(
-            'id', 'name', 'commercial_code', 'price',
-            'part_type', 'inventory'
-        ).order_by('id')
+        fields = get_part_fields(request)
+        key = CatalogCacheService.page_key(request)
+        data = CatalogCacheService.get_page(request, lambda: self.build_page(request, fields))
+
+        # Catalog version plus the fresh stock of the page
+        etag = make_etag(key, [(row['id'], row.get('inventory')) for row in data['results']])
+        return conditional_response(request, etag, lambda: data)
+
+    def build_page(self, request, fields):
+        # Load only the requested fields to reduce DB load
+        queryset = PartUnified.objects.with_fields(fields).order_by('id')
 
         # Apply pagination based on client input
-        paginator = StandardResultsSetPagination()
+        if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+            paginator = KeysetPagination()
+        else:
+            paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(queryset, request)
+
+        return paginator.get_paginated_response(serialize_parts(page, fields)).data
+
+
+class PartDetailView(APIView):
+    """
+    Return a single part, served from the catalog cache.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, part_id):
+        def build():
+            part = PartUnified.objects.select_related('category').filter(id=part_id).first()
+            return serialize_parts([part])[0] if part else None
+
+        data = CatalogCacheService.get_part(part_id, build)
+        if data is None:
+            raise NotFound()
+        return Response(data)
+
+
+class CategoryListView(APIView):
+    """
+    Return every part category with its part and in-stock counts.
+    Served from the catalog cache; counts may lag by CATEGORY_LIST_CACHE_TIMEOUT.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        categories = CategoryService.listing()
+        return Response({'count': len(categories), 'results': categories})
+
+
+class CatalogCacheStatsView(APIView):
+    """
+    Hit/miss counters of the catalog cache, for staff.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(CatalogCacheService.stats())
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data.encode(self.charset) if isinstance(data, str) else b''
+
+
+class MetricsView(APIView):
+    """
+    Per-view request metrics of this process in the Prometheus text format,
+    for staff (scrape with a staff user's token). Empty unless
+    INSTRUMENTATION_ENABLED is set.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request):
+        return Response(MetricsService.render())
+
+class PartSearchView(APIView):
+    """
+    Search the catalog with indexed filters.
+    Accepts ?q= (full text), ?code= (commercial or internal code), ?part_type=,
+    ?turnover=, ?category_title=, ?min_price=, ?max_price=, ?in_stock=true|false
+    ?car= (a Car id, or part of a car name) and ?car_name=, plus the
+    KeysetPagination and field selection parameters.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        fields = get_part_fields(request)
+        queryset = PartUnified.objects.with_fields(fields)
+        try:
+            queryset = PartSearchService.filter_queryset(queryset, request.query_params)
+        except ValueError:
+            return Response({'error': 'Invalid price range.'}, status=400)
+
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request)
+
+        return paginator.get_paginated_response(serialize_parts(page, fields))
+
+class CarPagination(KeysetPagination):
+    sort_keys = ('id', '-id', 'name', '-name')
+
+
+class CarListView(APIView):
+    """
+    List the car models known to the compatibility index.
+    Accepts ?q= to match part of the car name.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        text = request.query_params.get('q', '')
+        cars = CompatibilityService.matching_cars(text) if text else Car.objects.all()
+        paginator = CarPagination()
+        page = paginator.paginate_queryset(cars.only('id', 'name'), request)
+        return paginator.get_paginated_response([{'id': car.id, 'name': car.name} for car in page])
+
+
+class CompatiblePartsView(APIView):
+    """
+    Return the parts compatible with a car, through the compatibility index.
+    Accepts the KeysetPagination and field selection parameters.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, car_id):
+        get_object_or_404(Car, id=car_id)
+        fields = get_part_fields(request)
+        queryset = CompatibilityService.filter_parts(PartUnified.objects.with_fields(fields), car_id)
+
+        paginator = KeysetPagination()
         page = paginator.paginate_queryset(queryset, request)
-        serializer = PartUnifiedSerializer(page, many=True)
 
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(serialize_parts(page, fields))
+
 
 class AddItemToCartView(APIView):
     """
@@ -84,42 +434,62 @@ class AddItemToCartView(APIView):
 
     def post(self, request):
         part_id = request.data.get('part_id')
-        quantity = int(request.data.get('quantity', 1))  
         user = request.user
-        part = get_object_or_404(PartUnified, id=part_id)
+        part = get_object_or_404(PartUnified.objects.only('id'), id=part_id)
 
         quantity = int(request.data.get('quantity', 1))  
 
         if quantity < 1:
             return Response({'error': 'Quantity must be at least 1.'}, status=400)
 
-        if part.inventory < quantity:
+        # Stock is checked and taken atomically by the reservation
+        try:
+            CartService.add_to_cart(user, part, quantity=quantity)
+        except InsufficientStockError:
             return Response({'error': 'Not enough stock available.'}, status=400)
 
-        CartService.add_to_cart(user, part, quantity=quantity)
-
-        part.inventory -= quantity
-        part.save()
-
         return Response({'message': f'{quantity} عدد از محصول به سبد خرید اضافه شد.'}, status=status.HTTP_201_CREATED)
 
     def get(self, request):
         user = request.user
+        part_fields = get_part_fields(request)
         cart = CartService.get_or_create_cart(user)
-        items = cart.items.all()
-        serializer = CartItemSerializer(items, many=True)
 
-        total_price = sum(item.part.price * item.quantity for item in items)
+        # The cart revision changes on every mutation and the catalog version
+        # on every part edit or delete; stock of the parts in the cart is added
+        # only when the client asked for it
+        stock = None
+        if 'inventory' in part_fields:
+            stock = list(cart.items.order_by('id').values_list('part_id', 'part__inventory'))
+        etag = make_etag('cart', cart.pk, cart.revision, CatalogCacheService.version(), part_fields, stock)
+        return conditional_response(request, etag, lambda: self.build_cart(user, cart, part_fields))
+
+    def build_cart(self, user, cart, part_fields):
+        summary = CartService.get_cart_summary(user, part_fields, cart=cart)
+        return cart_payload(summary, part_fields)
 
-        response_data = {
-            'items': serializer.data,
-            'total_price': total_price,
-        }
 
-        if items.count() < 20:
-            response_data['message'] = 'برای مشاوره با شماره +989386678858 تماس بگیرید.'
+class CartBatchView(APIView):
+    """
+    Apply many cart operations at once, e.g. to restore a saved cart.
+    Body: {"operations": [{"op": "add"|"set"|"remove", "part_id": 1, "quantity": 2}, ...]}
+    Returns the resulting cart like list-cart/.
+    """
+
+    def post(self, request):
+        part_fields = get_part_fields(request)
+        serializer = CartBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            summary = CartService.apply_changes(
+                request.user, serializer.validated_data['operations'], part_fields
+            )
+        except InsufficientStockError as error:
+            return Response({'error': 'Not enough stock available.', 'part_ids': error.part_ids}, status=400)
 
-        return Response(response_data, status=200)
+        return Response(cart_payload(summary, part_fields))
 
 
 
@@ -130,59 +500,126 @@ class CreateOrderView(APIView):
 
     def post(self, request):
         user = request.user
+        # Users authenticated from the token cache only carry their flags
+        deferred = user.get_deferred_fields() & {'postal_code', 'address'}
+        if deferred:
+            user.refresh_from_db(fields=sorted(deferred))
 
-        # 1. Check if user has a saved Person info
-        person = Person.objects.filter(email=user.email).order_by('-created_at').first()
-        if not person:
-            return Response({'error': 'User info not found. Please complete your profile.'}, status=400)
-
-        # 2. Validate required fields
+        # 1. Validate required fields; the user (AUTH_USER_MODEL) is the Person profile
         missing_fields = []
-        if not person.postal_code:
+        if not user.postal_code:
             missing_fields.append("کد پستی ثبت نشده")
-        if not person.address:
+        if not user.address:
             missing_fields.append("آدرس ثبت نشده")
-        if not person.email:
+        if not user.email:
             missing_fields.append("ایمیل ثبت نشده")
 
         if missing_fields:
             return Response({'error': missing_fields}, status=400)
 
-        # 3. Get cart items
-        cart = CartService.get_or_create_cart(user)
-        items = cart.items.all()
-
-        if not items.exists():
-            return Response({'error': 'Your cart is empty.'}, status=400)
-
-        # 4. Parse delivery timestamp
+        # 2. Parse delivery timestamp
         try:
             timestamp = int(request.data.get("delivery_date"))
             delivery_date = datetime.datetime.fromtimestamp(timestamp).date()
         except (TypeError, ValueError):
             return Response({'error': 'Invalid delivery_date timestamp.'}, status=400)
 
-        # 5. Calculate total price
-        total_price = sum(item.part.price * item.quantity for item in items)
-
-        # 6. Prepare data for serializer (بدون ارسال items)
+        # 3. Validate order options
         serializer = OrderSerializer(data={
-            'user': user.id,
             'post_type': request.data.get('post_type'),
             'delivery_date': delivery_date,
-            'total_price': total_price,
-            'items': [item.pk for item in items],
-            'order_status': 'waiting'
         })
-          
-        if serializer.is_valid():
-            serializer.save()
-            cart.items.all().delete()
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # 4. Snapshot the cart into the order in one transaction
+        try:
+            order = CartService.finalize_order(user, **serializer.validated_data)
+        except InsufficientStockError:
+            return Response({'error': 'Not enough stock available.'}, status=400)
+        except ValueError:
+            return Response({'error': 'Your cart is empty.'}, status=400)
+
+        return Response({
+            'order': OrderSerializer(order).data,
+        }, status=status.HTTP_201_CREATED)
+
+class OrderPagination(KeysetPagination):
+    sort_keys = ('-created_at', 'created_at')
+    default_sort = '-created_at'
+    page_size = 20
+    max_page_size = 100
+
+    def decode_cursor(self, request, model):
+        cursor = super().decode_cursor(request, model)
+        # Cursors built by position() carry an offset; one without is read in the current time zone
+        if cursor and timezone.is_naive(cursor['v']):
+            try:
+                cursor['v'] = timezone.make_aware(cursor['v'])
+            except (ValueError, OverflowError):
+                raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+
+class OrderHistoryView(APIView):
+    """
+    List the user's orders, newest first, without their lines.
+    Accepts ?order_status= and ?post_type= plus the OrderPagination parameters.
+    """
+
+    def get(self, request):
+        orders = Order.objects.filter(user=request.user)
+        for name, choices in (('order_status', Order.ORDER_STATUS), ('post_type', Order.POST_TYPE_CHOICES)):
+            value = request.query_params.get(name)
+            if value is None:
+                continue
+            if value not in dict(choices):
+                raise ValidationError({name: [f"Unknown {name}: {value}"]})
+            orders = orders.filter(**{name: value})
+
+        paginator = OrderPagination()
+        page = paginator.paginate_queryset(orders, request)
+        return paginator.get_paginated_response(OrderSummarySerializer(page, many=True).data)
+
+
+class OrderDetailView(APIView):
+    """
+    Return one of the user's orders with its lines and their parts.
+    """
+
+    def get(self, request, order_code):
+        lines = OrderItem.objects.select_related('part').only(
+            'id', 'order', 'part_name', 'unit_price', 'quantity',
+            *[f'part__{name}' for name in PART_FIELD_PROFILES['compact']],
+        )
+        order = get_object_or_404(
+            Order.objects.prefetch_related(Prefetch('items', queryset=lines.order_by('id'))),
+            order_code=order_code, user=request.user,
+        )
+        return Response(OrderDetailSerializer(order).data)
+
+
+class OrderInvoiceView(APIView):
+    """
+    Stream the invoice of one of the user's orders.
+    Accepts ?output=text (default) or ?output=html for a printable page
+    (not ?format=, which DRF reserves for content negotiation).
+    """
+
+    def get(self, request, order_code):
+        invoice_format = request.query_params.get('output', 'text')
+        if invoice_format not in InvoiceService.formats:
+            raise ValidationError({'output': [f"Unknown format: {invoice_format}"]})
+
+        order = get_object_or_404(Order.objects.select_related('user'), order_code=order_code, user=request.user)
+        response = StreamingHttpResponse(
+            InvoiceService.stream(order, invoice_format),
+            content_type=InvoiceService.content_types[invoice_format],
+        )
+        extension = 'html' if invoice_format == 'html' else 'txt'
+        response['Content-Disposition'] = f'inline; filename="invoice-{order.order_code}.{extension}"'
+        return response
 
-            return Response({
-                'order': serializer.data,
-            }, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class PaymentGatewayView(APIView):
     def post(self, request):
@@ -202,33 +639,41 @@ class PaymentWebhookAPIView(APIView):
         return super().dispatch(*args, **kwargs)
 
     def post(self, request):
-        user = request.user
         # Get the order ID from POST data sent by the payment gateway
         order_code = request.data.get('order_code')
         # Get the payment status from POST data, e.g. "success" or "failed"
         payment_status = request.data.get('status')
+        # Retried callbacks carry the same key and are acknowledged without effect
+        key = request.headers.get('Idempotency-Key') or request.data.get('event_id')
+        validate_payment_status(payment_status)
+
+        try:
+            order, outcome = PaymentService.handle_callback(order_code, payment_status, key)
+        except Order.DoesNotExist:
+            raise NotFound()
 
-        # Retrieve the order object or return 404 if not found
-        order = get_object_or_404(Order, order_code=order_code)
-
-        # Update order status based on payment result
-        if payment_status == "success":
-            order.order_status = "paied"  # Note: spelling as per your choices
-            order.save()
-            # TODO: send confirmation email or SMS to the user 
-            invoice_text = generate_invoice(order)
-            # send_to_phone(user.phone_number, invoice_text)
-            content = {
-                'invoice': invoice_text
-            }
-        else:
-            order.order_status = "failed"
-            order.save()
-            content = {
-                'Message': 'Your payment is failed'
-            }
         # Return simple HTTP 200 OK response to acknowledge webhook receipt
-        return Response(content, status=status.HTTP_200_OK)
+        return Response(webhook_payload(request, order, outcome), status=status.HTTP_200_OK)
+
+
+def validate_payment_status(payment_status):
+    """
+    Reject a callback whose status is missing or unknown, shared by the sync and async webhooks.
+    """
+    if payment_status not in PaymentService.STATUSES:
+        raise ValidationError({'status': [f"Unknown status: {payment_status}"]})
+
+
+def webhook_payload(request, order, outcome):
+    """
+    Acknowledgement of a payment callback, shared by the sync and async webhooks.
+    """
+    if order.order_status == 'paied':
+        content = {'invoice_url': request.build_absolute_uri(reverse('order-invoice', args=[order.order_code]))}
+    else:
+        content = {'Message': 'Your payment is failed'}
+    content['event'] = outcome
+    return content
 
 class DeleteCartItemView(APIView):
     """
@@ -238,7 +683,7 @@ class DeleteCartItemView(APIView):
     def delete(self, request, item_id):
         user = request.user
         item = get_object_or_404(CartItem, id=item_id, cart__user=user)
-        item.delete()
+        CartService.delete_item(item)
         return Response({'message': 'آیتم با موفقیت حذف شد.'}, status=status.HTTP_204_NO_CONTENT)
     
 class ClearCartView(APIView):
@@ -248,6 +693,5 @@ class ClearCartView(APIView):
 
     def delete(self, request):
         user = request.user
-        cart = CartService.get_or_create_cart(user)
-        cart.items.all().delete()
+        CartService.clear_cart(user)
         return Response({'message': 'سبد خرید با موفقیت پاک شد.'}, status=status.HTTP_204_NO_CONTENT)